@@ -0,0 +1,117 @@
+"""
+Benchmarks how ``build_zip()`` scales with the number of entries in an archive.
+
+For each archive size, this measures:
+    - ``build``: Time to append N new entries to an empty archive.
+    - ``no-op``: Time to re-run ``build_zip()`` against the resulting archive,
+        when every entry named in the metadata is already present.
+    - ``namelist scan``: Time spent on the same duplicate checks when membership
+        is tested with ``ZipFile.namelist()`` for every row (the former behavior),
+        which grows quadratically with archive size. To keep runs short, this is
+        measured over at most ``SCAN_SAMPLE_ROWS`` rows and extrapolated.
+
+Usage:
+    ``python -m benchmarks.build_zip_scaling [--sizes 1000 10000 50000]``
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+import uuid
+import zipfile
+
+# Worker configuration must be present before importing the worker module
+_DATA_DIR = tempfile.TemporaryDirectory(prefix="arpa-exporter-bench-")
+os.environ["DATA_DIR"] = _DATA_DIR.name
+os.environ.setdefault("DD_TRACE_ENABLED", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("TASK_QUEUE_URL", "https://example.com/queue")
+os.environ.setdefault("API_DOMAIN", "https://api.example.org")
+os.environ.setdefault("NOTIFICATIONS_EMAIL", "benchmark@example.org")
+
+from src import worker  # noqa: E402
+
+DEFAULT_SIZES = (1_000, 10_000, 50_000)
+SCAN_SAMPLE_ROWS = 2_000
+
+
+def make_source_uploads(count: int) -> list[worker.UploadInfo]:
+    """Writes ``count`` small source files to ``DATA_DIR`` and returns
+    corresponding ``UploadInfo`` instances.
+    """
+    uploads = []
+    for _ in range(count):
+        upload_id = str(uuid.uuid4())
+        with open(os.path.join(worker.DATA_DIR, f"{upload_id}.xlsm"), "wb") as fh:
+            fh.write(upload_id.encode())
+        uploads.append(
+            worker.UploadInfo(
+                upload_id=upload_id,
+                path_in_zip=f"Quarterly 1/Final Treasury/workbook--{upload_id}.xlsm",
+            )
+        )
+    return uploads
+
+
+def time_namelist_scan(archive_path: str, uploads: list[worker.UploadInfo]) -> float:
+    """Times duplicate checks that scan ``ZipFile.namelist()`` once per row,
+    extrapolated from a sample of at most ``SCAN_SAMPLE_ROWS`` rows.
+    """
+    sample = uploads[:SCAN_SAMPLE_ROWS]
+    with zipfile.ZipFile(archive_path, "r") as archive:
+        start = time.perf_counter()
+        for upload in sample:
+            _ = upload.path_in_zip in archive.namelist()
+        elapsed = time.perf_counter() - start
+    return elapsed * len(uploads) / max(len(sample), 1)
+
+
+def run(sizes: list[int]) -> None:
+    print(f"{'entries':>10} {'build':>10} {'no-op':>10} {'namelist scan':>15}")
+    for size in sizes:
+        uploads = make_source_uploads(size)
+        with tempfile.NamedTemporaryFile() as tmp:
+            start = time.perf_counter()
+            worker.build_zip(tmp, iter(uploads))
+            build_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            worker.build_zip(tmp, iter(uploads))
+            noop_seconds = time.perf_counter() - start
+
+            tmp.flush()
+            scan_seconds = time_namelist_scan(tmp.name, uploads)
+
+        print(
+            f"{size:>10} {build_seconds:>9.2f}s {noop_seconds:>9.2f}s "
+            f"{scan_seconds:>14.2f}s"
+        )
+        for name in os.listdir(worker.DATA_DIR):
+            os.remove(os.path.join(worker.DATA_DIR, name))
+
+
+def _main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.build_zip_scaling",
+        description="Benchmarks build_zip() across archive sizes.",
+    )
+    parser.add_argument(
+        "--sizes",
+        help="Numbers of archive entries to benchmark (default: %(default)s)",
+        nargs="+",
+        type=int,
+        default=list(DEFAULT_SIZES),
+    )
+    args = parser.parse_args()
+    try:
+        run(args.sizes)
+    finally:
+        _DATA_DIR.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(_main())
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import collections
+import contextlib
+import dataclasses
+import os
+import shutil
+import tempfile
+import threading
+import typing
+import uuid
+
+import botocore.exceptions
+
+from src.lib.logging import get_logger
+from src.lib.s3_transfer import TransferSettings, download_fileobj
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_s3 import S3Client
+
+COPY_BUFFER_SIZE = 16 * 1024**2
+
+
+@dataclasses.dataclass
+class CacheEntry:
+    path: str
+    etag: str
+    size: int
+
+
+class ArchiveCache:
+    """Least-recently-used cache of S3 objects (i.e. zip archives) stored on local
+    disk, so that repeat requests for the same object can skip downloading it.
+
+    Cached copies are validated against S3 with a conditional request
+    (``IfNoneMatch`` on the cached ETag) before they are used. The total size of
+    cached copies is kept within ``max_bytes`` by evicting the least-recently-used
+    entries; objects larger than ``max_bytes`` are never cached.
+
+    Instances are safe to share between threads. Cached copies are stored in a new
+    subdirectory of ``directory`` (which may be shared with other processes),
+    which is removed by ``close()``. Nothing else in ``directory`` is modified.
+
+    Args:
+        directory: Local directory in which cached copies are stored
+        max_bytes: Maximum total size of cached copies
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="archive-cache-", dir=directory)
+        self.max_bytes = max_bytes
+        self.logger = get_logger(
+            archive_cache_directory=self.directory, archive_cache_max_bytes=max_bytes
+        )
+        self._entries: collections.OrderedDict[tuple[str, str], CacheEntry] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Total size of all cached copies, in bytes."""
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def fetch(
+        self,
+        s3: S3Client,
+        bucket: str,
+        key: str,
+        fh: typing.IO[bytes],
+        transfer_settings: TransferSettings | None = None,
+        size: int | None = None,
+        etag: str | None = None,
+    ) -> str:
+        """Writes the current contents of an S3 object to ``fh``, from the cache
+        when the cached copy is still current, or else by downloading it.
+
+        When the ``size`` and ``etag`` of the current object version are already
+        known (e.g. from an earlier ``HeadObject`` request), they are used instead
+        of validating the cached copy with S3, and the object is only downloaded
+        if it is still that version.
+
+        Args:
+            s3: S3 client used to validate and download the object
+            bucket: Name of the S3 bucket containing the object
+            key: S3 key of the object
+            fh: Writeable binary file-like object for the object contents
+            transfer_settings: (Optional) Settings for downloading the object
+            size: (Optional) Size of the current object version
+            etag: (Optional) ETag of the current object version
+
+        Returns:
+            The ETag of the object contents written to ``fh``.
+
+        Raises:
+            botocore.exceptions.ClientError: When the object does not exist
+                (with a ``404`` error code) or cannot be retrieved.
+        """
+        logger = self.logger.bind(s3_bucket=bucket, s3_key=key)
+        with self._lock:
+            entry = self._entries.get((bucket, key))
+
+        if size is not None and etag is not None:
+            if entry is not None and entry.etag == etag:
+                if self._copy_from_cache(bucket, key, entry, fh):
+                    logger.info("using cached copy of s3 object", etag=etag)
+                    return etag
+            elif entry is not None:
+                logger.info("cached copy of s3 object is stale", etag=entry.etag)
+                self.discard(bucket, key)
+            download_fileobj(s3, bucket, key, fh, size, transfer_settings, etag=etag)
+            logger.info("downloaded s3 object not found in cache", etag=etag)
+            return etag
+
+        if entry is not None:
+            try:
+                response = s3.head_object(
+                    Bucket=bucket, Key=key, IfNoneMatch=entry.etag
+                )
+            except botocore.exceptions.ClientError as e:
+                if e.response["Error"]["Code"] != "304":
+                    raise
+                if self._copy_from_cache(bucket, key, entry, fh):
+                    logger.info("using cached copy of s3 object", etag=entry.etag)
+                    return entry.etag
+                response = s3.head_object(Bucket=bucket, Key=key)
+            else:
+                logger.info("cached copy of s3 object is stale", etag=entry.etag)
+                self.discard(bucket, key)
+        else:
+            response = s3.head_object(Bucket=bucket, Key=key)
+
+        download_fileobj(
+            s3,
+            bucket,
+            key,
+            fh,
+            response["ContentLength"],
+            transfer_settings,
+            etag=response["ETag"],
+        )
+        logger.info("downloaded s3 object not found in cache", etag=response["ETag"])
+        return response["ETag"]
+
+    def store(self, bucket: str, key: str, etag: str, fh: typing.IO[bytes]) -> bool:
+        """Caches the contents of ``fh`` as the S3 object version identified
+        by ``etag``. See ``storing()`` for details.
+
+        Returns:
+            bool indicating whether the contents were cached. False when they are
+            larger than the entire cache.
+        """
+        with self.storing(bucket, key, fh) as set_etag:
+            set_etag(etag)
+        with self._lock:
+            return (bucket, key) in self._entries
+
+    @contextlib.contextmanager
+    def storing(
+        self, bucket: str, key: str, fh: typing.IO[bytes]
+    ) -> typing.Iterator[typing.Callable[[str], None]]:
+        """Context manager that takes a copy of the contents of ``fh`` on entry,
+        which is cached on exit as the S3 object version whose ETag is passed to the
+        yielded callable. This allows ``fh`` to be copied before it is uploaded
+        (which may close it), when the ETag it will have is not yet known.
+
+        The copy is discarded if no ETag was provided or an exception was raised.
+        Least-recently-used entries are evicted as needed to stay within the cache
+        size limit; contents larger than the entire cache are never copied.
+
+        When ``fh`` is a named file on the same filesystem as the cache directory,
+        it is hard-linked into the cache rather than copied. The contents of ``fh``
+        must therefore not be modified after the context is entered.
+
+        Args:
+            bucket: Name of the S3 bucket containing the object
+            key: S3 key of the object
+            fh: Seekable binary file-like object containing the object contents
+        """
+        fh.flush()
+        size = fh.seek(0, os.SEEK_END)
+        self.discard(bucket, key)
+        if size > self.max_bytes:
+            self.logger.info(
+                "s3 object is too large to cache",
+                s3_bucket=bucket,
+                s3_key=key,
+                size=size,
+            )
+            yield lambda etag: None
+            return
+
+        path = os.path.join(self.directory, f"{uuid.uuid4().hex}.zip")
+        source_path = getattr(fh, "name", None)
+        try:
+            if not isinstance(source_path, str):
+                raise OSError("file object has no path to link")
+            os.link(source_path, path)
+        except OSError:
+            fh.seek(0)
+            with open(path, "wb") as cache_fh:
+                shutil.copyfileobj(fh, cache_fh, COPY_BUFFER_SIZE)
+
+        etags: list[str] = []
+        try:
+            yield etags.append
+        except:
+            os.remove(path)
+            raise
+        if not etags:
+            os.remove(path)
+            return
+        self._add(bucket, key, CacheEntry(path=path, etag=etags[-1], size=size))
+
+    def close(self) -> None:
+        """Removes every cached copy, along with the subdirectory of this cache."""
+        with self._lock:
+            self._entries.clear()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def discard(self, bucket: str, key: str) -> None:
+        """Removes any cached copy of an S3 object."""
+        with self._lock:
+            entry = self._entries.pop((bucket, key), None)
+            if entry is not None:
+                os.remove(entry.path)
+
+    def _add(self, bucket: str, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            if (replaced := self._entries.pop((bucket, key), None)) is not None:
+                os.remove(replaced.path)
+            self._entries[(bucket, key)] = entry
+            total_size = sum(cached.size for cached in self._entries.values())
+            while total_size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                os.remove(evicted.path)
+                total_size -= evicted.size
+        self.logger.info(
+            "stored s3 object in cache",
+            s3_bucket=bucket,
+            s3_key=key,
+            etag=entry.etag,
+            size=entry.size,
+            archive_cache_size=total_size,
+        )
+
+    def _copy_from_cache(
+        self, bucket: str, key: str, entry: CacheEntry, fh: typing.IO[bytes]
+    ) -> bool:
+        with self._lock:
+            # The entry may have been evicted or replaced since it was validated
+            if self._entries.get((bucket, key)) is not entry:
+                return False
+            self._entries.move_to_end((bucket, key))
+            # Once open, the copy remains readable even if evicted concurrently
+            cache_fh = open(entry.path, "rb")
+        with cache_fh:
+            shutil.copyfileobj(cache_fh, fh, COPY_BUFFER_SIZE)
+        return True
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import dataclasses
+import logging
+import threading
+import typing
+
+import boto3
+import botocore.config
+from ddtrace import tracer
+
+from src.lib.logging import get_logger
+from src.lib.metrics import get_statsd
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_s3 import S3Client
+    from mypy_boto3_ses import SESClient
+    from mypy_boto3_sqs import SQSClient
+
+# Default of botocore.config.Config
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+# Logger (and message) used by urllib3 when a connection is discarded because
+# its pool already holds max_pool_connections connections.
+URLLIB3_CONNECTION_POOL_LOGGER = "urllib3.connectionpool"
+CONNECTION_POOL_FULL_MESSAGE = "Connection pool is full"
+CONNECTION_POOL_FULL_METRIC = "aws.connection_pool_full"
+
+
+@dataclasses.dataclass(frozen=True)
+class ClientSettings:
+    """Connection settings for AWS service clients created with ``create_client()``.
+
+    Args:
+        max_pool_connections: Maximum number of connections to keep open to each
+            host. Should be at least the number of threads that use the client
+            concurrently.
+        connect_timeout: Seconds to wait when opening a connection
+        read_timeout: Seconds to wait when reading from a connection. Must exceed
+            the wait time of any long-polling requests (e.g. ``ReceiveMessage``).
+        max_attempts: Maximum number of attempts for each request, including retries
+        retry_mode: botocore retry mode (``"standard"`` or ``"adaptive"``, which
+            also rate-limits requests on the client after throttling errors)
+        tcp_keepalive: Whether to enable TCP keepalive on connections
+    """
+
+    max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS
+    connect_timeout: float = 10
+    read_timeout: float = 60
+    max_attempts: int = 5
+    retry_mode: typing.Literal["legacy", "standard", "adaptive"] = "adaptive"
+    tcp_keepalive: bool = True
+
+    def to_config(self) -> botocore.config.Config:
+        """Returns the equivalent botocore client ``Config``."""
+        return botocore.config.Config(
+            max_pool_connections=max(self.max_pool_connections, 1),
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+            retries={"mode": self.retry_mode, "total_max_attempts": self.max_attempts},
+            tcp_keepalive=self.tcp_keepalive,
+        )
+
+
+class ConnectionPoolMonitor(logging.Handler):
+    """Logging handler that reports when urllib3 discards a connection because
+    a client's connection pool is full, i.e. more threads are using the client
+    than it has ``max_pool_connections``. Each occurrence is logged, counted in
+    ``count``, and added to the ``aws.connection_pool_full`` metric of the
+    current trace and of DogStatsD.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(logging.WARNING)
+        self.count = 0
+        self._count_lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not record.getMessage().startswith(CONNECTION_POOL_FULL_MESSAGE):
+            return
+        with self._count_lock:
+            self.count += 1
+            count = self.count
+        args = record.args if isinstance(record.args, tuple) else ()
+        host, pool_size = (args + (None, None))[:2]
+        get_logger().warning(
+            "aws client connection pool is full; increase max_pool_connections",
+            connection_pool_host=host,
+            connection_pool_size=pool_size,
+            connection_pool_full_count=count,
+        )
+        get_statsd().increment(CONNECTION_POOL_FULL_METRIC)
+        if (span := tracer.current_root_span()) is not None:
+            span.set_metric(
+                CONNECTION_POOL_FULL_METRIC,
+                (span.get_metric(CONNECTION_POOL_FULL_METRIC) or 0) + 1,
+            )
+
+
+connection_pool_monitor = ConnectionPoolMonitor()
+
+
+def install_connection_pool_monitor() -> None:
+    """Attaches ``connection_pool_monitor`` to urllib3's connection pool logger
+    (once), so that full connection pools are reported.
+    """
+    pool_logger = logging.getLogger(URLLIB3_CONNECTION_POOL_LOGGER)
+    if connection_pool_monitor not in pool_logger.handlers:
+        pool_logger.addHandler(connection_pool_monitor)
+
+
+@typing.overload
+def create_client(
+    service_name: typing.Literal["s3"], settings: ClientSettings
+) -> S3Client: ...
+
+
+@typing.overload
+def create_client(
+    service_name: typing.Literal["ses"], settings: ClientSettings
+) -> SESClient: ...
+
+
+@typing.overload
+def create_client(
+    service_name: typing.Literal["sqs"], settings: ClientSettings
+) -> SQSClient: ...
+
+
+def create_client(service_name: str, settings: ClientSettings) -> typing.Any:
+    """Creates an AWS service client (e.g. for ``"s3"``) with the connection
+    pool, timeouts, retries and keepalive configured by ``settings``, and reports
+    when its connection pool is full (see ``ConnectionPoolMonitor``).
+
+    Clients are thread-safe, so each should be created once and shared.
+    """
+    install_connection_pool_monitor()
+    get_logger().info(
+        "creating aws client",
+        aws_service=service_name,
+        **dataclasses.asdict(settings),
+    )
+    return boto3.client(service_name, config=settings.to_config())  # type: ignore[call-overload]
@@ -13,6 +13,11 @@ Each inner level is rendered and provided as a parameter ("partial") of its oute
 Arguably, levels 1 & 2 should be combined in the arpa-exporter project, but we are
 deferring to conventions established elsewhere.
 
+Templates are read and tokenized once (see ``load_templates()``), and generated
+content is cached by its inputs, so repeated notifications do no file I/O or template
+parsing. Call ``clear_template_cache()`` after changing ``TEMPLATES_DIR`` or the
+templates it contains.
+
 Note:
     This module provides a CLI interface for testing email generation.
     When run, it will generate sample email content and, depending on the provided options,
@@ -21,12 +26,18 @@ Note:
 
 from __future__ import annotations
 
+import functools
 import os
 import typing
 
+import botocore.exceptions
 import chevron
+import chevron.tokenizer
 from ddtrace import tracer
 
+from src.lib.logging import get_logger
+from src.lib.rate_limiter import TokenBucket
+
 if typing.TYPE_CHECKING:  # pragma: nocover
     from mypy_boto3_ses import SESClient
     from mypy_boto3_ses.type_defs import SendEmailRequestTypeDef
@@ -41,8 +52,51 @@ NOTIFICATIONS_EMAIL_DISPLAY_NAME = os.getenv(
 NOTIFICATIONS_EMAIL_SENDER = (
     f"{NOTIFICATIONS_EMAIL_DISPLAY_NAME} <{NOTIFICATIONS_EMAIL}>"
 )
+# Maximum number of emails to send per second, shared by all threads.
+# "auto" uses the maximum send rate of the SES account; 0 disables the limit.
+SES_MAX_SEND_RATE = os.getenv("SES_MAX_SEND_RATE", "auto").lower()
+SES_MAX_SEND_BURST = int(os.getenv("SES_MAX_SEND_BURST", 1))
+# Limits the rate of send_email() once configured by configure_send_rate_limiter()
+send_rate_limiter: TokenBucket | None = None
+# Paths of templates (relative to TEMPLATES_DIR), by name
+TEMPLATE_FILES = {
+    "base": "base.html",
+    "formatted_body": "formatted_body.html",
+    "full_file_export_html": os.path.join("messages", "full_file_export.html"),
+    "full_file_export_text": os.path.join("messages", "full_file_export.txt"),
+}
+# Number of distinct (archive_download_url, metadata_download_url) pairs
+# for which generated email content is cached
+GENERATED_EMAIL_CACHE_SIZE = 32
+
+Template: typing.TypeAlias = list[tuple[str, str]]
+
+
+@functools.cache
+def load_templates() -> dict[str, Template]:
+    """Reads and tokenizes each template in ``TEMPLATE_FILES`` from ``TEMPLATES_DIR``.
+    Templates are only read once; subsequent calls return the cached result
+    (until ``clear_template_cache()`` is called).
+
+    Returns:
+        Tokenized templates (which can be passed to ``chevron.render()``), by name
+    """
+    templates = {}
+    for name, path in TEMPLATE_FILES.items():
+        with open(os.path.join(TEMPLATES_DIR, path)) as tpl:
+            templates[name] = list(chevron.tokenizer.tokenize(tpl.read()))
+    return templates
 
 
+def clear_template_cache() -> None:
+    """Discards loaded templates and generated email content, so that templates are
+    read again from ``TEMPLATES_DIR`` when next needed.
+    """
+    load_templates.cache_clear()
+    generate_email.cache_clear()
+
+
+@functools.lru_cache(maxsize=GENERATED_EMAIL_CACHE_SIZE)
 def generate_email(
     archive_download_url: str,
     metadata_download_url: str,
@@ -56,6 +110,8 @@ def generate_email(
         metadata_download_url: The URL where a downloadable file providing a manifest
             of the contents of the file available at ``archive_download_url``
 
+    Content is cached by ``archive_download_url`` and ``metadata_download_url``.
+
     Returns:
         A 3-tuple containing (email_html, email_plaintext, subject), where:
             email_html: Generated HTML content for the email body
@@ -63,43 +119,42 @@ def generate_email(
                 clients that do not support HTML
             subject: Subject line to use when sending the email
     """
+    templates = load_templates()
+
     # Level 3:
-    with open(os.path.join(TEMPLATES_DIR, "messages", "full_file_export.html")) as tpl:
-        message_html = chevron.render(
-            tpl,
-            {
-                "zip_url": archive_download_url,
-                "csv_url": metadata_download_url,
-            },
-        )
+    message_html = chevron.render(
+        templates["full_file_export_html"],
+        {
+            "zip_url": archive_download_url,
+            "csv_url": metadata_download_url,
+        },
+    )
 
     # Level 2:
-    with open(os.path.join(TEMPLATES_DIR, "formatted_body.html")) as tpl:
-        formatted_body_html = chevron.render(
-            tpl, {"body_title": "Hello,", "body_detail": message_html}
-        )
+    formatted_body_html = chevron.render(
+        templates["formatted_body"],
+        {"body_title": "Hello,", "body_detail": message_html},
+    )
 
     # Level 1:
-    with open(os.path.join(TEMPLATES_DIR, "base.html")) as tpl:
-        email_html = chevron.render(
-            tpl,
-            {
-                "tool_name": "ARPA Reporter",
-                "title": "Full File Export",
-                "usdr_logo_url": "https://grants.usdigitalresponse.org/usdr_logo_transparent.png",
-            },
-            partials_dict={"email_body": formatted_body_html},
-        )
+    email_html = chevron.render(
+        templates["base"],
+        {
+            "tool_name": "ARPA Reporter",
+            "title": "Full File Export",
+            "usdr_logo_url": "https://grants.usdigitalresponse.org/usdr_logo_transparent.png",
+        },
+        partials_dict={"email_body": formatted_body_html},
+    )
 
     # Alternate plaintext content
-    with open(os.path.join(TEMPLATES_DIR, "messages", "full_file_export.txt")) as tpl:
-        email_plaintext = chevron.render(
-            tpl,
-            {
-                "zip_url": archive_download_url,
-                "csv_url": metadata_download_url,
-            },
-        )
+    email_plaintext = chevron.render(
+        templates["full_file_export_text"],
+        {
+            "zip_url": archive_download_url,
+            "csv_url": metadata_download_url,
+        },
+    )
 
     subject = "USDR Full File Export"
     return email_html, email_plaintext, subject
@@ -160,6 +215,43 @@ def tag_ses_message(
     return message
 
 
+def configure_send_rate_limiter(email_client: SESClient) -> TokenBucket | None:
+    """Configures the rate limiter that is shared by every call to ``send_email()``,
+    according to ``SES_MAX_SEND_RATE`` and ``SES_MAX_SEND_BURST``. When the rate is
+    ``"auto"``, the maximum send rate of the SES account is used (or no limit,
+    if it cannot be determined).
+
+    Args:
+        email_client: SES client used to determine the account's maximum send rate
+
+    Returns:
+        The configured rate limiter, or ``None`` when sending is not rate-limited.
+    """
+    global send_rate_limiter
+    logger = get_logger()
+    if SES_MAX_SEND_RATE == "auto":
+        try:
+            max_send_rate = email_client.get_send_quota()["MaxSendRate"]
+        except botocore.exceptions.ClientError:
+            logger.warning(
+                "could not determine SES maximum send rate; sending without a limit",
+                exc_info=True,
+            )
+            max_send_rate = 0
+    else:
+        max_send_rate = float(SES_MAX_SEND_RATE)
+
+    send_rate_limiter = None
+    if max_send_rate > 0:
+        send_rate_limiter = TokenBucket(max_send_rate, SES_MAX_SEND_BURST)
+    logger.info(
+        "configured SES send rate limit",
+        ses_max_send_rate=max_send_rate or None,
+        ses_max_send_burst=SES_MAX_SEND_BURST if max_send_rate > 0 else None,
+    )
+    return send_rate_limiter
+
+
 def send_email(
     email_client: SESClient,
     dest_email: str,
@@ -168,7 +260,9 @@ def send_email(
     subject: str,
     additional_tags: typing.Optional[dict[str, typing.Any]] = None,
 ) -> str:
-    """Sends an email to a single recipient via SES.
+    """Sends an email to a single recipient via SES. When ``send_rate_limiter`` is
+    configured, this waits as necessary so that emails are sent no faster than
+    the allowed rate.
 
     Args:
         email_client: SES client for sending the email.
@@ -206,6 +300,12 @@ def send_email(
     if DEFAULT_CONFIGURATION_SET_NAME:
         message["ConfigurationSetName"] = DEFAULT_CONFIGURATION_SET_NAME
 
+    if send_rate_limiter is not None:
+        if (wait_seconds := send_rate_limiter.acquire()) > 0:
+            get_logger().debug(
+                "waited for SES send rate limit",
+                rate_limit_wait_seconds=round(wait_seconds, 3),
+            )
     response = email_client.send_email(
         **tag_ses_message(message, "full_file_export", **additional_tags or {})
     )
@@ -218,13 +318,13 @@ def _main():  # pragma: nocover
     Returns:
         Exit code for the process. ``1`` if any error(s) occurred, else ``0``.
     """
+    global TEMPLATES_DIR
+
     import argparse
     import smtplib
     from email.mime.multipart import MIMEMultipart
     from email.mime.text import MIMEText
 
-    from src.lib.logging import get_logger
-
     parser = argparse.ArgumentParser(
         prog=f"python -m {__loader__.name}",  # type: ignore[name-defined]
         description="CLI tool for debugging email content generation.",
@@ -246,6 +346,11 @@ def _main():  # pragma: nocover
         help="URL for the csv file download link to include in generated email content (default: %(default)s)",
         default="https://example.com/path/to/metadata.csv",
     )
+    parser.add_argument(
+        "--templates-dir",
+        help="Directory containing email templates (default: %(default)s)",
+        default=TEMPLATES_DIR,
+    )
     parser.add_argument(
         "--host",
         help="Hostname (e.g. for mailpit) where SMTP will connect when sending (default: %(default)s)",
@@ -280,6 +385,9 @@ def _main():  # pragma: nocover
     if args.verbose:
         log_fn = get_logger().exception
 
+    TEMPLATES_DIR = os.path.abspath(args.templates_dir)
+    clear_template_cache()
+
     try:
         html, plaintext, subject = generate_email(args.zip_url, args.csv_url)
     except:  # noqa: E722
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    import ddtrace.trace
+    import structlog
+    from ddtrace.vendor.dogstatsd import DogStatsd
+
+    from src.lib.metrics import NullStatsdClient
+
+T = typing.TypeVar("T")
+
+# Prefix of the span metrics set by JobMetrics.set_span_metrics()
+SPAN_METRIC_PREFIX = "arpa_exporter.stage"
+
+
+@dataclasses.dataclass
+class StageMetrics:
+    """Wall time, bytes transferred and item counts accumulated by one stage
+    of an export job.
+    """
+
+    seconds: float = 0
+    bytes: int = 0
+    counts: dict[str, int] = dataclasses.field(default_factory=dict)
+
+    def add(self, seconds: float = 0, bytes: int = 0, **counts: int) -> None:
+        """Adds to the stage's wall time, bytes and (named) item counts."""
+        self.seconds += seconds
+        self.bytes += bytes
+        for name, count in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+
+    @property
+    def bytes_per_second(self) -> int | None:
+        """Throughput of the stage, when it transferred bytes over measurable time."""
+        if self.bytes <= 0 or self.seconds <= 0:
+            return None
+        return round(self.bytes / self.seconds)
+
+
+class JobMetrics:
+    """Per-stage breakdown of where an export job spends its time and bytes
+    (e.g. ``"preflight"``, ``"csv_stream"``, ``"plan"``, ``"download"``,
+    ``"diff"``, ``"entry_writes"``, ``"upload"`` and ``"notify"``), reported as
+    span metrics, a summary log and DogStatsD metrics.
+
+    Stages that run concurrently (e.g. streaming uploads while entries are
+    written) are timed independently, so their times may overlap.
+    """
+
+    def __init__(self) -> None:
+        self.stages: dict[str, StageMetrics] = {}
+        # Name of the (innermost) stage that raised an error, if any
+        self.failed_stage: str | None = None
+        self._lock = threading.Lock()
+
+    def record_failure(self, name: str) -> None:
+        """Records that a stage raised an error, unless another stage already did."""
+        with self._lock:
+            if self.failed_stage is None:
+                self.failed_stage = name
+
+    def get(self, name: str) -> StageMetrics:
+        """Returns the metrics of a stage, which is added if necessary."""
+        with self._lock:
+            return self.stages.setdefault(name, StageMetrics())
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> typing.Iterator[StageMetrics]:
+        """Context manager that adds the wall time of its block to a stage, whose
+        metrics it provides so that bytes and counts can be added as well.
+        """
+        stage = self.get(name)
+        started = time.perf_counter()
+        try:
+            yield stage
+        except BaseException:
+            self.record_failure(name)
+            raise
+        finally:
+            stage.add(seconds=time.perf_counter() - started)
+
+    def timed_iter(
+        self, name: str, iterable: typing.Iterable[T], count_name: str = "items"
+    ) -> typing.Iterator[T]:
+        """Yields from ``iterable``, adding the time spent waiting for each item
+        (e.g. while streaming and parsing a file) and the number of items
+        to a stage.
+        """
+        stage = self.get(name)
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stage.add(seconds=time.perf_counter() - started)
+                return
+            except BaseException:
+                self.record_failure(name)
+                raise
+            stage.add(seconds=time.perf_counter() - started, **{count_name: 1})
+            yield item
+
+    def summary(self) -> dict[str, float | int]:
+        """Returns the metrics of every stage as a flat mapping with keys like
+        ``download_seconds``, ``download_bytes``, ``download_bytes_per_second``
+        and ``entry_writes_entries_added``.
+        """
+        summary: dict[str, float | int] = {}
+        with self._lock:
+            stages = list(self.stages.items())
+        for name, stage in stages:
+            summary[f"{name}_seconds"] = round(stage.seconds, 3)
+            if stage.bytes:
+                summary[f"{name}_bytes"] = stage.bytes
+            if (bytes_per_second := stage.bytes_per_second) is not None:
+                summary[f"{name}_bytes_per_second"] = bytes_per_second
+            for count_name, count in stage.counts.items():
+                summary[f"{name}_{count_name}"] = count
+        return summary
+
+    def set_span_metrics(self, span: ddtrace.trace.Span | None) -> None:
+        """Sets each metric of ``summary()`` on a trace span
+        (as ``arpa_exporter.stage.<key>``).
+        """
+        if span is None:
+            return
+        for key, value in self.summary().items():
+            span.set_metric(f"{SPAN_METRIC_PREFIX}.{key}", value)
+
+    def emit(
+        self,
+        statsd: DogStatsd | NullStatsdClient,
+        tags: typing.Sequence[str] = (),
+    ) -> None:
+        """Sends the metrics of each stage to DogStatsD, tagged with ``stage``:
+
+        - ``stage.duration``: wall time of the stage (distribution, in seconds)
+        - ``stage.bytes``: bytes transferred by the stage (count)
+        - ``stage.<count name>``: each item count of the stage (count)
+        """
+        with self._lock:
+            stages = list(self.stages.items())
+        for name, stage in stages:
+            stage_tags = [*tags, f"stage:{name}"]
+            statsd.distribution("stage.duration", stage.seconds, tags=stage_tags)
+            if stage.bytes:
+                statsd.increment("stage.bytes", stage.bytes, tags=stage_tags)
+            for count_name, count in stage.counts.items():
+                statsd.increment(f"stage.{count_name}", count, tags=stage_tags)
+
+    def log_summary(self, logger: structlog.stdlib.BoundLogger, **kwargs: typing.Any):
+        """Logs ``summary()`` as a single event, with any additional context."""
+        if self.failed_stage is not None:
+            kwargs.setdefault("failed_stage", self.failed_stage)
+        logger.info("export job stage metrics", **kwargs, **self.summary())
@@ -0,0 +1,90 @@
+"""
+DogStatsD metrics for the worker, sent to the Datadog agent over UDP with the
+DogStatsD client vendored by ``ddtrace``.
+
+Metric calls only add to an in-memory buffer, which is sent whenever it fills up,
+and periodically from a background thread, so that sending metrics does not slow
+down the worker.
+
+Metrics are sent unless ``DOGSTATSD_ENABLED`` is false, in which case
+``get_statsd()`` returns a client that discards them (e.g. for tests).
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import typing
+
+from ddtrace.vendor.dogstatsd import DogStatsd
+
+from src.lib.logging import get_logger
+
+DOGSTATSD_ENABLED = os.getenv("DOGSTATSD_ENABLED", "true").lower() == "true"
+DOGSTATSD_HOST = os.getenv("DD_AGENT_HOST", "localhost")
+DOGSTATSD_PORT = int(os.getenv("DD_DOGSTATSD_PORT", 8125))
+DOGSTATSD_FLUSH_INTERVAL_SECONDS = float(
+    os.getenv("DOGSTATSD_FLUSH_INTERVAL_SECONDS", 1)
+)
+METRIC_NAMESPACE = "arpa_exporter"
+
+Tags: typing.TypeAlias = typing.Sequence[str] | None
+
+
+class NullStatsdClient:
+    """Client with the same interface as ``DogStatsd`` that discards metrics."""
+
+    def increment(self, metric: str, value: int = 1, tags: Tags = None) -> None:
+        pass
+
+    def gauge(self, metric: str, value: float, tags: Tags = None) -> None:
+        pass
+
+    def histogram(self, metric: str, value: float, tags: Tags = None) -> None:
+        pass
+
+    def distribution(self, metric: str, value: float, tags: Tags = None) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def close_socket(self) -> None:
+        pass
+
+
+@functools.cache
+def get_statsd() -> DogStatsd | NullStatsdClient:
+    """Returns the client shared by the process for sending metrics, which is
+    created when first needed. Metrics are tagged with the ``service``, ``env``
+    and ``version`` from ``DD_SERVICE``, ``DD_ENV`` and ``DD_VERSION``
+    (when defined), which ``DogStatsd`` reads from the environment.
+    """
+    if not DOGSTATSD_ENABLED:
+        return NullStatsdClient()
+    get_logger().info(
+        "sending dogstatsd metrics",
+        dogstatsd_host=DOGSTATSD_HOST,
+        dogstatsd_port=DOGSTATSD_PORT,
+    )
+    return DogStatsd(
+        host=DOGSTATSD_HOST,
+        port=DOGSTATSD_PORT,
+        namespace=METRIC_NAMESPACE,
+        disable_buffering=False,
+        flush_interval=DOGSTATSD_FLUSH_INTERVAL_SECONDS,
+    )
+
+
+def close_statsd() -> None:
+    """Sends every buffered metric and closes the client's socket
+    (e.g. on shutdown).
+    """
+    statsd = get_statsd()
+    statsd.flush()
+    statsd.close_socket()
+
+
+def organization_tags(organization_id: int | str, *tags: str) -> list[str]:
+    """Returns metric tags for an organization, along with any other ``tags``."""
+    return [f"organization_id:{organization_id}", *tags]
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import concurrent.futures
+import contextvars
+import queue
+import random
+import threading
+import time
+import typing
+
+import botocore.exceptions
+
+from src.lib.logging import get_logger
+
+# Error codes with which AWS services (including SES, e.g. when the maximum
+# sending rate is exceeded) reject requests that may succeed later.
+RETRYABLE_ERROR_CODES = frozenset(
+    {
+        "Throttling",
+        "ThrottlingException",
+        "TooManyRequestsException",
+        "RequestTimeout",
+        "ServiceUnavailable",
+        "InternalFailure",
+    }
+)
+RETRYABLE_CONNECTION_ERRORS = (
+    botocore.exceptions.ConnectionError,
+    botocore.exceptions.HTTPClientError,
+)
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Determines whether a failed notification may succeed if it is retried,
+    i.e. whether it was throttled or failed due to a transient error.
+    """
+    if isinstance(error, botocore.exceptions.ClientError):
+        return error.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES
+    return isinstance(error, RETRYABLE_CONNECTION_ERRORS)
+
+
+class _Notification(typing.NamedTuple):
+    context: contextvars.Context
+    future: concurrent.futures.Future
+    fn: typing.Callable[..., typing.Any]
+    args: tuple[typing.Any, ...]
+    kwargs: dict[str, typing.Any]
+
+
+class BackgroundNotifier:
+    """Sends notifications (e.g. emails) from background threads, so that callers
+    do not wait for delivery while it is slow or throttled.
+
+    Notifications are queued by ``submit()``, which blocks while ``max_pending``
+    notifications are already waiting to be sent. Each notification is attempted
+    up to ``max_attempts`` times, waiting with (jittered) exponential backoff
+    between attempts that fail with a retryable error.
+
+    When closed (e.g. on shutdown), every notification that was already submitted
+    is sent before ``close()`` returns.
+
+    Args:
+        max_pending: Maximum number of notifications waiting to be sent
+        workers: Number of threads sending notifications
+        max_attempts: Maximum number of times to attempt each notification
+        backoff_seconds: Maximum time to wait before the first retry, which
+            doubles with each subsequent retry
+        max_backoff_seconds: Maximum time to wait before any retry
+        is_retryable: Determines whether a notification that raised an error
+            should be retried
+    """
+
+    def __init__(
+        self,
+        max_pending: int = 100,
+        workers: int = 1,
+        max_attempts: int = 5,
+        backoff_seconds: float = 1,
+        max_backoff_seconds: float = 60,
+        is_retryable: typing.Callable[[BaseException], bool] = is_retryable_error,
+    ):
+        self.workers = max(workers, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.is_retryable = is_retryable
+        self.logger = get_logger(notifier_workers=self.workers)
+        self._queue: queue.Queue[_Notification | None] = queue.Queue(
+            maxsize=max(max_pending, 1)
+        )
+        self._lock = threading.Lock()
+        self._closed = False
+        self._threads: list[threading.Thread] = []
+
+    def __enter__(self) -> BackgroundNotifier:
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Starts the threads that send notifications."""
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, name=f"notifier-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(
+        self,
+        fn: typing.Callable[..., typing.Any],
+        *args: typing.Any,
+        **kwargs: typing.Any,
+    ) -> concurrent.futures.Future:
+        """Queues a call to ``fn(*args, **kwargs)``, which sends a notification.
+        The call is made in a copy of the current context, so that its logs share
+        the caller's context values.
+
+        Returns:
+            A future that resolves to the result of ``fn`` once the notification is
+            sent, or to the error from its last attempt if it could not be sent.
+
+        Raises:
+            RuntimeError: When the notifier has been closed.
+        """
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        notification = _Notification(
+            contextvars.copy_context(), future, fn, args, kwargs
+        )
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot submit notifications after close()")
+            self._queue.put(notification)
+        return future
+
+    def close(self) -> None:
+        """Stops accepting notifications, and waits for those that were already
+        submitted to be sent.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self.logger.info(
+                "draining pending notifications",
+                notifications_pending=self._queue.qsize(),
+            )
+            for _ in self._threads:
+                self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def get_backoff_seconds(self, attempt: int) -> float:
+        """Returns the time to wait before retrying after the given attempt
+        (starting at 1) failed.
+        """
+        backoff = min(
+            self.backoff_seconds * 2 ** (attempt - 1), self.max_backoff_seconds
+        )
+        return random.uniform(0, backoff)
+
+    def _run(self) -> None:
+        while (notification := self._queue.get()) is not None:
+            notification.context.run(self._send, notification)
+
+    def _send(self, notification: _Notification) -> None:
+        if not notification.future.set_running_or_notify_cancel():
+            return
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = notification.fn(*notification.args, **notification.kwargs)
+            except BaseException as error:
+                if attempt >= self.max_attempts or not self.is_retryable(error):
+                    notification.future.set_exception(error)
+                    return
+                backoff = self.get_backoff_seconds(attempt)
+                self.logger.warning(
+                    "retrying notification after error",
+                    notification_attempt=attempt,
+                    notification_backoff_seconds=round(backoff, 3),
+                    error=str(error),
+                )
+                time.sleep(backoff)
+            else:
+                notification.future.set_result(result)
+                return
+
+
+def when_all_done(
+    futures: typing.Sequence[concurrent.futures.Future],
+    callback: typing.Callable[[typing.Sequence[concurrent.futures.Future]], None],
+) -> None:
+    """Calls ``callback(futures)`` once every future is done, from the thread that
+    completes the last of them (or immediately, if they are all already done).
+    """
+    remaining = len(futures)
+    lock = threading.Lock()
+
+    def on_done(_: concurrent.futures.Future) -> None:
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            if remaining > 0:
+                return
+        callback(futures)
+
+    if remaining == 0:
+        callback(futures)
+    for future in futures:
+        future.add_done_callback(on_done)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import threading
+import time
+import typing
+
+
+class TokenBucket:
+    """Thread-safe token bucket that limits the rate of an operation (e.g. sending
+    emails) shared by every thread in the process.
+
+    Tokens accrue at ``rate`` per second, up to ``capacity``. ``acquire()`` takes
+    tokens when they are available, or reserves them and waits until they will
+    have accrued; callers are therefore served in the order they arrive, and a
+    burst of callers proceeds at exactly ``rate`` rather than failing.
+
+    Args:
+        rate: Number of tokens that accrue each second
+        capacity: Maximum number of tokens that can accrue while the bucket is idle,
+            i.e. the largest burst allowed above ``rate``
+        clock: Monotonic clock that returns the current time in seconds
+        sleep: Function used to wait for tokens to accrue
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1,
+        clock: typing.Callable[[], float] = time.monotonic,
+        sleep: typing.Callable[[float], typing.Any] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated_at = clock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Takes ``tokens`` from the bucket, waiting until enough have accrued.
+
+        Returns:
+            The number of seconds spent waiting.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(
+                self._tokens + (now - self._updated_at) * self.rate, self.capacity
+            )
+            self._updated_at = now
+            # Tokens not yet accrued are reserved by going into debt, which
+            # later callers must also wait to be repaid.
+            self._tokens -= tokens
+            wait_seconds = max(-self._tokens / self.rate, 0)
+        if wait_seconds > 0:
+            self.sleep(wait_seconds)
+        return wait_seconds
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import io
+import math
+import typing
+
+from src.lib.logging import get_logger
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    import structlog
+    from mypy_boto3_s3 import S3Client
+    from mypy_boto3_s3.type_defs import CompletedPartTypeDef
+
+# S3 requires every part of a multipart upload, except the last, to be at least 5 MiB.
+MIN_PART_SIZE = 5 * 1024**2
+# S3 does not allow a single part (uploaded or copied) to exceed 5 GiB.
+MAX_PART_SIZE = 5 * 1024**3
+DEFAULT_PART_SIZE = 64 * 1024**2
+DEFAULT_MAX_IN_FLIGHT_PARTS = 2
+
+
+def split_range(size: int, max_part_size: int) -> list[tuple[int, int]]:
+    """Splits ``size`` bytes into the fewest contiguous, evenly-sized ranges
+    that are each no larger than ``max_part_size``.
+
+    Args:
+        size: Total number of bytes to split
+        max_part_size: Maximum number of bytes in each range
+
+    Returns:
+        List of (first_byte, last_byte) tuples, where both offsets are inclusive
+        (matching the HTTP ``Range`` header convention).
+    """
+    if size <= 0:
+        return []
+    part_size = math.ceil(size / math.ceil(size / max_part_size))
+    return [
+        (start, min(start + part_size, size) - 1) for start in range(0, size, part_size)
+    ]
+
+
+def abort_multipart_upload(
+    s3: S3Client,
+    bucket: str,
+    key: str,
+    upload_id: str,
+    logger: structlog.stdlib.BoundLogger,
+) -> bool:
+    """Aborts a multipart upload, discarding any parts that were already uploaded.
+
+    Errors (e.g. when not permitted to abort uploads) are logged rather than
+    raised, so that they neither fail an otherwise successful job nor hide the
+    error that caused the upload to be abandoned.
+
+    Returns:
+        Whether the upload was aborted.
+    """
+    try:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+    except Exception:
+        logger.exception("error aborting multipart upload", s3_upload_id=upload_id)
+        return False
+    return True
+
+
+def upload_appended_object(
+    s3: S3Client,
+    fh: typing.IO[bytes],
+    bucket: str,
+    key: str,
+    source_etag: str,
+    unchanged_size: int,
+    part_size: int = DEFAULT_PART_SIZE,
+    extra_args: dict[str, typing.Any] | None = None,
+) -> str:
+    """Replaces an S3 object with the contents of ``fh``, where the first
+    ``unchanged_size`` bytes of ``fh`` are known to be identical to the existing
+    object (e.g. because ``fh`` was downloaded from it and then appended to).
+
+    The unchanged leading bytes are copied server-side with ``UploadPartCopy``,
+    so only the remaining bytes of ``fh`` are actually uploaded.
+
+    Args:
+        s3: S3 client used to perform the multipart upload
+        fh: Seekable binary file-like object containing the complete new object data
+        bucket: Name of the S3 bucket containing the object
+        key: S3 key of the object to replace
+        source_etag: ETag of the existing object. Copying fails if the object
+            has changed since ``fh`` was derived from it.
+        unchanged_size: Number of leading bytes of ``fh`` that are identical
+            to the existing object. Must be at least ``MIN_PART_SIZE``.
+        part_size: Size of each uploaded (non-copied) part
+        extra_args: Additional arguments for ``CreateMultipartUpload``,
+            such as ``ServerSideEncryption``.
+
+    Returns:
+        The ETag of the new object, as reported by ``CompleteMultipartUpload``.
+
+    Raises:
+        ValueError: When ``unchanged_size`` is too small to be copied as a part.
+    """
+    if unchanged_size < MIN_PART_SIZE:
+        raise ValueError(
+            f"unchanged_size must be at least {MIN_PART_SIZE} bytes to be copied"
+        )
+    part_size = max(part_size, MIN_PART_SIZE)
+    logger = get_logger(
+        s3_bucket=bucket,
+        s3_key=key,
+        unchanged_size=unchanged_size,
+        part_size=part_size,
+    )
+
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket, Key=key, **(extra_args or {})
+    )["UploadId"]
+    parts: list[CompletedPartTypeDef] = []
+    uploaded_bytes = 0
+    try:
+        for first_byte, last_byte in split_range(unchanged_size, MAX_PART_SIZE):
+            copy_response = s3.upload_part_copy(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=len(parts) + 1,
+                CopySource={"Bucket": bucket, "Key": key},
+                CopySourceRange=f"bytes={first_byte}-{last_byte}",
+                CopySourceIfMatch=source_etag,
+            )
+            parts.append(
+                {
+                    "PartNumber": len(parts) + 1,
+                    "ETag": copy_response["CopyPartResult"]["ETag"],
+                }
+            )
+
+        fh.seek(unchanged_size)
+        while data := fh.read(part_size):
+            upload_response = s3.upload_part(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=len(parts) + 1,
+                Body=data,
+            )
+            parts.append(
+                {"PartNumber": len(parts) + 1, "ETag": upload_response["ETag"]}
+            )
+            uploaded_bytes += len(data)
+
+        response = s3.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except:
+        logger.exception("error during multipart upload; aborting")
+        abort_multipart_upload(s3, bucket, key, upload_id, logger)
+        raise
+
+    logger.info(
+        "completed multipart upload reusing unchanged object data",
+        parts_count=len(parts),
+        uploaded_bytes=uploaded_bytes,
+    )
+    return response["ETag"]
+
+
+class MultipartUploadWriter(io.BufferedIOBase):
+    """Write-only, non-seekable file-like object that streams written data into
+    a new S3 object using a multipart upload, so that the object can be created
+    without first being written to local storage.
+
+    Data is uploaded in fixed-size parts on background threads while writing
+    continues, with at most ``max_in_flight_parts`` parts being uploaded at once.
+    Memory use is therefore bounded by about ``(max_in_flight_parts + 1) * part_size``.
+
+    When used as a context manager, the upload is completed on exit, or aborted
+    if an exception was raised. The upload can also be discarded explicitly
+    with ``abort()``, in which case no object is created.
+
+    Args:
+        s3: S3 client used to perform the multipart upload
+        bucket: Name of the S3 bucket for the new object
+        key: S3 key of the new object
+        part_size: Size of each uploaded part (other than the last)
+        max_in_flight_parts: Maximum number of parts to upload concurrently
+        extra_args: Additional arguments for ``CreateMultipartUpload``,
+            such as ``ServerSideEncryption``.
+    """
+
+    def __init__(
+        self,
+        s3: S3Client,
+        bucket: str,
+        key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_in_flight_parts: int = DEFAULT_MAX_IN_FLIGHT_PARTS,
+        extra_args: dict[str, typing.Any] | None = None,
+    ):
+        super().__init__()
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.max_in_flight_parts = max(max_in_flight_parts, 1)
+        self.bytes_written = 0
+        self.etag: str | None = None
+        self.parts: list[CompletedPartTypeDef] = []
+        self.logger = get_logger(s3_bucket=bucket, s3_key=key, part_size=part_size)
+        self.upload_id = s3.create_multipart_upload(
+            Bucket=bucket, Key=key, **(extra_args or {})
+        )["UploadId"]
+        self._buffer = bytearray()
+        self._in_flight: collections.deque[concurrent.futures.Future] = (
+            collections.deque()
+        )
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_in_flight_parts,
+            thread_name_prefix="multipart-upload",
+        )
+        self._finished = False
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.complete()
+        else:
+            self.abort()
+        return super().__exit__(exc_type, exc_value, traceback)
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.bytes_written
+
+    def write(self, data: typing.Any) -> int:
+        if self._finished:
+            raise ValueError("write to a finished multipart upload")
+        size = len(memoryview(data).cast("B"))
+        self._buffer += data
+        self.bytes_written += size
+        while len(self._buffer) >= self.part_size:
+            self._submit_part(bytes(self._buffer[: self.part_size]))
+            del self._buffer[: self.part_size]
+        return size
+
+    def complete(self) -> None:
+        """Uploads any buffered data as the final part and completes the upload.
+        Afterwards, ``etag`` is the ETag of the uploaded object.
+        """
+        if self._finished:
+            return
+        try:
+            # A multipart upload must contain at least one (possibly empty) part
+            if self._buffer or not (self.parts or self._in_flight):
+                self._submit_part(bytes(self._buffer))
+                self._buffer.clear()
+            while self._in_flight:
+                self.parts.append(self._in_flight.popleft().result())
+            response = self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+            self.etag = response.get("ETag")
+        except:
+            self.logger.exception("error completing multipart upload; aborting")
+            self.abort()
+            raise
+        self._finished = True
+        self._executor.shutdown()
+        self.logger.info(
+            "completed streaming multipart upload",
+            parts_count=len(self.parts),
+            uploaded_bytes=self.bytes_written,
+        )
+
+    def abort(self) -> None:
+        """Discards the upload, including any parts that were already uploaded."""
+        if self._finished:
+            return
+        self._finished = True
+        self._executor.shutdown(cancel_futures=True)
+        self._in_flight.clear()
+        self._buffer.clear()
+        if abort_multipart_upload(
+            self.s3, self.bucket, self.key, self.upload_id, self.logger
+        ):
+            self.logger.info("aborted streaming multipart upload")
+
+    def _submit_part(self, data: bytes) -> None:
+        # Wait for the oldest part when at capacity, to bound memory use
+        if len(self._in_flight) >= self.max_in_flight_parts:
+            self.parts.append(self._in_flight.popleft().result())
+        part_number = len(self.parts) + len(self._in_flight) + 1
+        self._in_flight.append(
+            self._executor.submit(self._upload_part, part_number, data)
+        )
+
+    def _upload_part(self, part_number: int, data: bytes) -> CompletedPartTypeDef:
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import errno
+import io
+import os
+import typing
+
+from src.lib.s3_multipart import split_range
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_s3 import S3Client
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+DEFAULT_STREAM_PART_SIZE = 8 * 1024**2
+DEFAULT_STREAM_CONCURRENCY = 4
+
+
+class S3ObjectReader(io.RawIOBase):
+    """Read-only, seekable file-like object that fetches data from an S3 object
+    using ranged GET requests, so that only the byte ranges actually read are
+    transferred. Every request is conditioned on the object's ETag, so reads fail
+    (rather than return mixed data) if the object is replaced while being read.
+
+    This is primarily useful for reading the central directory of a large zip
+    archive without downloading the whole object. Wrapping instances in an
+    ``io.BufferedReader`` (see ``DEFAULT_BUFFER_SIZE``) coalesces small reads,
+    like those made by ``zipfile``, into fewer requests.
+
+    Args:
+        s3: S3 client used to make requests
+        bucket: Name of the S3 bucket containing the object
+        key: S3 key of the object
+        size: (Optional) Size of the object, in bytes.
+        etag: (Optional) ETag of the object. If either ``size`` or ``etag``
+            is omitted, both are obtained with a HEAD request.
+    """
+
+    def __init__(
+        self,
+        s3: S3Client,
+        bucket: str,
+        key: str,
+        size: int | None = None,
+        etag: str | None = None,
+    ):
+        super().__init__()
+        if size is None or etag is None:
+            response = s3.head_object(Bucket=bucket, Key=key)
+            size = response["ContentLength"]
+            etag = response["ETag"]
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.size: int = size
+        self.etag: str = etag
+        self.bytes_requested = 0
+        self.requests_made = 0
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if position < 0:
+            raise OSError(errno.EINVAL, f"negative seek position {position}")
+        self._position = position
+        return self._position
+
+    def readinto(self, buffer: typing.Any) -> int:
+        if self._position >= self.size:
+            return 0
+        view = memoryview(buffer).cast("B")
+        last_byte = min(self._position + len(view), self.size) - 1
+        response = self.s3.get_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Range=f"bytes={self._position}-{last_byte}",
+            IfMatch=self.etag,
+        )
+        data = response["Body"].read()
+        view[: len(data)] = data
+        self.requests_made += 1
+        self.bytes_requested += len(data)
+        self._position += len(data)
+        return len(data)
+
+
+class S3ObjectStreamReader(io.RawIOBase):
+    """Read-only, sequential file-like object that fetches the data of an S3 object
+    using concurrent ranged GET requests.
+
+    Up to ``max_concurrency`` parts of ``part_size`` bytes are fetched ahead of the
+    current position (on a thread pool, starting with the first read), so reading
+    a large object is limited by bandwidth rather than by the latency of each
+    request. Every request is conditioned on the object's ETag, so reads fail
+    (rather than return mixed data) if the object is replaced while being read.
+
+    Unlike ``S3ObjectReader``, instances are not seekable, and hold up to
+    ``max_concurrency`` parts in memory.
+
+    Args:
+        s3: S3 client used to make requests
+        bucket: Name of the S3 bucket containing the object
+        key: S3 key of the object
+        size: Size of the object, in bytes
+        etag: ETag of the object
+        part_size: Maximum number of bytes to fetch with each request
+        max_concurrency: Maximum number of requests to make concurrently
+    """
+
+    def __init__(
+        self,
+        s3: S3Client,
+        bucket: str,
+        key: str,
+        size: int,
+        etag: str,
+        part_size: int = DEFAULT_STREAM_PART_SIZE,
+        max_concurrency: int = DEFAULT_STREAM_CONCURRENCY,
+    ):
+        super().__init__()
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.max_concurrency = max(max_concurrency, 1)
+        self.bytes_requested = 0
+        self.requests_made = 0
+        self._ranges = iter(split_range(size, max(part_size, 1)))
+        self._in_flight: collections.deque[concurrent.futures.Future[bytes]] = (
+            collections.deque()
+        )
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+        self._part = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: typing.Any) -> int:
+        while not self._part:
+            self._fetch_ahead()
+            if not self._in_flight:
+                return 0
+            data = self._in_flight.popleft().result()
+            self.requests_made += 1
+            self.bytes_requested += len(data)
+            self._part = memoryview(data)
+        view = memoryview(buffer).cast("B")
+        size = min(len(view), len(self._part))
+        view[:size] = self._part[:size]
+        self._part = self._part[size:]
+        return size
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+        self._in_flight.clear()
+        self._part = memoryview(b"")
+        super().close()
+
+    def _fetch_ahead(self) -> None:
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix="s3-object-stream",
+            )
+        while len(self._in_flight) < self.max_concurrency:
+            byte_range = next(self._ranges, None)
+            if byte_range is None:
+                return
+            self._in_flight.append(self._executor.submit(self._fetch, *byte_range))
+
+    def _fetch(self, first_byte: int, last_byte: int) -> bytes:
+        response = self.s3.get_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Range=f"bytes={first_byte}-{last_byte}",
+            IfMatch=self.etag,
+        )
+        data = response["Body"].read()
+        if len(data) != last_byte - first_byte + 1:
+            raise OSError(
+                errno.EIO,
+                f"expected {last_byte - first_byte + 1} bytes from s3 object "
+                f"but received {len(data)}",
+            )
+        return data
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import math
+import shutil
+import time
+import typing
+
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from s3transfer.subscribers import BaseSubscriber
+
+from src.lib.logging import get_logger
+from src.lib.metrics import get_statsd
+from src.lib.s3_multipart import MAX_PART_SIZE, MIN_PART_SIZE, MultipartUploadWriter
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_s3 import S3Client
+
+# Defaults of boto3.s3.transfer.TransferConfig
+DEFAULT_THRESHOLD = 8 * 1024**2
+DEFAULT_MAX_CONCURRENCY = 10
+# S3 does not allow a multipart upload to have more than 10,000 parts.
+MAX_PARTS = 10_000
+# Automatic part sizes give each thread this many parts to transfer, so that
+# threads are kept busy without making many more requests than necessary.
+AUTO_PARTS_PER_THREAD = 4
+AUTO_MIN_PART_SIZE = 8 * 1024**2
+AUTO_MAX_PART_SIZE = 512 * 1024**2
+
+
+@dataclasses.dataclass(frozen=True)
+class TransferSettings:
+    """Settings for managed (multipart) S3 transfers with ``download_fileobj()``
+    and ``upload_fileobj()``.
+
+    Args:
+        part_size: (Optional) Size of each part of a multipart transfer. When
+            omitted, it is chosen for each transfer based on the object size
+            (see ``choose_part_size()``).
+        max_concurrency: Maximum number of parts to transfer concurrently
+        threshold: Minimum object size for which multipart transfers are used
+    """
+
+    part_size: int | None = None
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    threshold: int = DEFAULT_THRESHOLD
+
+    def choose_part_size(self, size: int) -> int:
+        """Returns the part size to use when transferring an object of ``size``
+        bytes. Automatic part sizes are rounded up to a whole MiB, and give each
+        of ``max_concurrency`` threads ``AUTO_PARTS_PER_THREAD`` parts (within
+        ``AUTO_MIN_PART_SIZE`` and ``AUTO_MAX_PART_SIZE``).
+        """
+        if self.part_size is not None:
+            part_size = self.part_size
+        else:
+            part_size = math.ceil(size / (self.max_concurrency * AUTO_PARTS_PER_THREAD))
+            part_size = math.ceil(part_size / 1024**2) * 1024**2
+            part_size = min(max(part_size, AUTO_MIN_PART_SIZE), AUTO_MAX_PART_SIZE)
+        # Every part must be within S3 limits, and there can only be so many parts
+        part_size = max(part_size, math.ceil(size / MAX_PARTS))
+        return min(max(part_size, MIN_PART_SIZE), MAX_PART_SIZE)
+
+    def config_for(self, size: int) -> TransferConfig:
+        """Returns the boto3 ``TransferConfig`` for an object of ``size`` bytes."""
+        return TransferConfig(
+            multipart_threshold=self.threshold,
+            multipart_chunksize=self.choose_part_size(size),
+            max_concurrency=self.max_concurrency,
+        )
+
+
+@contextlib.contextmanager
+def log_transfer_throughput(
+    operation: str, bucket: str, key: str, size: int, **log_kwargs: typing.Any
+) -> typing.Iterator[None]:
+    """Context manager that logs the duration and throughput of an S3 transfer
+    of ``size`` bytes once it completes successfully. The bytes transferred
+    (``s3.transfer.bytes``) and throughput (``s3.transfer.bytes_per_second``)
+    are also sent to DogStatsD, tagged with ``operation``.
+
+    Args:
+        operation: Name of the transfer operation (e.g. ``"download"``)
+        bucket: Name of the S3 bucket containing the object
+        key: S3 key of the object
+        size: Number of bytes transferred
+        log_kwargs: Additional context to log (e.g. transfer settings)
+    """
+    started = time.perf_counter()
+    yield
+    duration = time.perf_counter() - started
+    bytes_per_second = round(size / duration) if duration > 0 else None
+    get_logger(s3_bucket=bucket, s3_key=key).info(
+        "completed s3 transfer",
+        transfer_operation=operation,
+        transfer_bytes=size,
+        transfer_seconds=round(duration, 3),
+        transfer_bytes_per_second=bytes_per_second,
+        **log_kwargs,
+    )
+    statsd = get_statsd()
+    tags = [f"operation:{operation}"]
+    statsd.increment("s3.transfer.bytes", size, tags=tags)
+    if bytes_per_second is not None:
+        statsd.distribution("s3.transfer.bytes_per_second", bytes_per_second, tags=tags)
+
+
+class _ObjectVersionProvider(BaseSubscriber):
+    """Provides the size and ETag of an object to a download, which otherwise
+    retrieves them with a ``HeadObject`` request. Every request of the download
+    is conditioned on the ETag (with ``IfMatch``).
+    """
+
+    def __init__(self, size: int, etag: str | None):
+        self.size = size
+        self.etag = etag
+
+    def on_queued(self, future, **kwargs) -> None:
+        future.meta.provide_transfer_size(self.size)
+        if self.etag is not None:
+            future.meta.provide_object_etag(self.etag)
+
+
+def download_fileobj(
+    s3: S3Client,
+    bucket: str,
+    key: str,
+    fh: typing.IO[bytes],
+    size: int,
+    settings: TransferSettings | None = None,
+    etag: str | None = None,
+) -> None:
+    """Downloads an S3 object of ``size`` bytes to ``fh`` with a transfer
+    configuration chosen for its size, and logs the throughput of the download.
+
+    When ``etag`` is provided, the object is not looked up again before it is
+    downloaded, and every request is conditioned on it (with ``IfMatch``), so that
+    the download fails if the object is replaced.
+    """
+    settings = settings or TransferSettings()
+    config = settings.config_for(size)
+    with log_transfer_throughput(
+        "download",
+        bucket,
+        key,
+        size,
+        part_size=config.multipart_chunksize,
+        max_concurrency=settings.max_concurrency,
+    ):
+        if etag is not None and size < config.multipart_threshold:
+            # Managed downloads only condition ranged (i.e. multipart) requests
+            response = s3.get_object(Bucket=bucket, Key=key, IfMatch=etag)
+            shutil.copyfileobj(response["Body"], fh)
+            return
+        with create_transfer_manager(s3, config) as manager:
+            manager.download(
+                bucket,
+                key,
+                fh,
+                subscribers=[_ObjectVersionProvider(size, etag)],
+            ).result()
+
+
+def upload_fileobj(
+    s3: S3Client,
+    fh: typing.IO[bytes],
+    bucket: str,
+    key: str,
+    size: int,
+    settings: TransferSettings | None = None,
+    extra_args: dict[str, typing.Any] | None = None,
+) -> str:
+    """Uploads ``size`` bytes from ``fh`` (which may be closed afterwards) to an
+    S3 object with a transfer configuration chosen for its size, and logs the
+    throughput of the upload.
+
+    Objects smaller than the multipart threshold are uploaded with a single
+    ``PutObject`` request, and others with a ``MultipartUploadWriter``, rather than
+    with a managed transfer, since those do not report the ETag of the new object.
+
+    Returns:
+        The ETag of the uploaded object, as reported by the request that created it.
+    """
+    settings = settings or TransferSettings()
+    config = settings.config_for(size)
+    with log_transfer_throughput(
+        "upload",
+        bucket,
+        key,
+        size,
+        part_size=config.multipart_chunksize,
+        max_concurrency=settings.max_concurrency,
+    ):
+        if size < config.multipart_threshold:
+            response = s3.put_object(
+                Bucket=bucket, Key=key, Body=fh.read(size), **(extra_args or {})
+            )
+            return response["ETag"]
+        with MultipartUploadWriter(
+            s3,
+            bucket,
+            key,
+            part_size=config.multipart_chunksize,
+            max_in_flight_parts=settings.max_concurrency,
+            extra_args=extra_args,
+        ) as writer:
+            shutil.copyfileobj(fh, writer, config.multipart_chunksize)
+        return typing.cast(str, writer.etag)
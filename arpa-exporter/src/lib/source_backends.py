@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import os
+import posixpath
+import stat
+import typing
+import zipfile
+
+from src.lib.s3_object_reader import (
+    DEFAULT_STREAM_CONCURRENCY,
+    DEFAULT_STREAM_PART_SIZE,
+    S3ObjectStreamReader,
+)
+from src.lib.source_directory import SourceDirectory
+from src.lib.zip_entries import EntrySource, LocalFileSource
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_s3 import S3Client
+
+
+class SourceBackend(typing.Protocol):
+    """Storage for the source files of zip entries, which are identified by name
+    (i.e. ``<upload_id><extension>``).
+
+    Implementations may list their storage once and cache the result, so an
+    instance should only be used while handling one message.
+    """
+
+    def exists(self, name: str) -> bool:
+        """Determines whether a source file exists."""
+        ...
+
+    def getsize(self, name: str) -> int:
+        """Returns the size of a source file.
+
+        Raises:
+            FileNotFoundError: When the source file does not exist.
+        """
+        ...
+
+    def getmtime(self, name: str) -> float:
+        """Returns the last modification time of a source file, as a POSIX timestamp.
+
+        Raises:
+            FileNotFoundError: When the source file does not exist.
+        """
+        ...
+
+    def get(self, name: str) -> EntrySource:
+        """Returns the source of the data for a zip entry from a source file."""
+        ...
+
+    def location(self, name: str) -> str:
+        """Returns a description of the location of a source file, for logging."""
+        ...
+
+
+class LocalSourceBackend:
+    """``SourceBackend`` for source files in a local (or mounted) directory,
+    which is listed once (see ``SourceDirectory``).
+
+    Args:
+        directory: Path of the directory containing source files
+    """
+
+    def __init__(self, directory: str):
+        self.directory = SourceDirectory(directory)
+
+    def exists(self, name: str) -> bool:
+        return self.directory.exists(name)
+
+    def getsize(self, name: str) -> int:
+        return self.directory.getsize(name)
+
+    def getmtime(self, name: str) -> float:
+        return self.directory.getmtime(name)
+
+    def get(self, name: str) -> EntrySource:
+        return LocalFileSource(self.location(name))
+
+    def location(self, name: str) -> str:
+        return os.path.join(self.directory.path, name)
+
+
+@dataclasses.dataclass(frozen=True)
+class S3ObjectSource:
+    """``EntrySource`` for an S3 object, which is read using concurrent ranged
+    GET requests (see ``S3ObjectStreamReader``).
+    """
+
+    s3: S3Client
+    bucket: str
+    key: str
+    size: int
+    etag: str
+    last_modified: datetime.datetime
+    part_size: int = DEFAULT_STREAM_PART_SIZE
+    max_concurrency: int = DEFAULT_STREAM_CONCURRENCY
+
+    def zipinfo(self, arcname: str) -> zipfile.ZipInfo:
+        # Like ZipInfo.from_file() for a regular file with rw-r--r-- permissions
+        zinfo = zipfile.ZipInfo(
+            arcname, self.last_modified.astimezone().timetuple()[:6]
+        )
+        zinfo.external_attr = (stat.S_IFREG | 0o644) << 16
+        zinfo.file_size = self.size
+        return zinfo
+
+    def open(self) -> typing.IO[bytes]:
+        return typing.cast(
+            typing.IO[bytes],
+            S3ObjectStreamReader(
+                self.s3,
+                self.bucket,
+                self.key,
+                self.size,
+                self.etag,
+                part_size=self.part_size,
+                max_concurrency=self.max_concurrency,
+            ),
+        )
+
+    def read_head(self, size: int) -> bytes:
+        if size <= 0 or self.size == 0:
+            return b""
+        response = self.s3.get_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Range=f"bytes=0-{min(size, self.size) - 1}",
+            IfMatch=self.etag,
+        )
+        return response["Body"].read()
+
+
+class S3SourceBackend:
+    """``SourceBackend`` for source files stored as S3 objects under a common
+    prefix, so that source files can be read without a shared filesystem.
+
+    Objects directly under the prefix are listed (with ``ListObjectsV2``) once,
+    when first needed. Source files are then read with concurrent ranged GET
+    requests; each request is conditioned on the ETag from the listing.
+
+    Args:
+        s3: S3 client used to list and read objects
+        bucket: Name of the S3 bucket containing source files
+        prefix: Key prefix of source files (e.g. ``"uploads/"``), which is treated
+            as a directory whether or not it ends with ``/``
+        part_size: Maximum number of bytes to fetch with each ranged GET request
+        max_concurrency: Maximum number of concurrent requests for each source file
+    """
+
+    def __init__(
+        self,
+        s3: S3Client,
+        bucket: str,
+        prefix: str = "",
+        part_size: int = DEFAULT_STREAM_PART_SIZE,
+        max_concurrency: int = DEFAULT_STREAM_CONCURRENCY,
+    ):
+        self.s3 = s3
+        self.bucket = bucket
+        # Objects are listed directly under the prefix, as a directory
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        self.prefix = prefix
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self._objects: dict[str, S3ObjectSource] | None = None
+
+    @property
+    def objects(self) -> dict[str, S3ObjectSource]:
+        """Objects directly under ``prefix``, indexed by name (without ``prefix``)."""
+        if self._objects is None:
+            objects = {}
+            paginator = self.s3.get_paginator("list_objects_v2")
+            for page in paginator.paginate(
+                Bucket=self.bucket, Prefix=self.prefix, Delimiter="/"
+            ):
+                for obj in page.get("Contents", []):
+                    objects[obj["Key"][len(self.prefix) :]] = S3ObjectSource(
+                        s3=self.s3,
+                        bucket=self.bucket,
+                        key=obj["Key"],
+                        size=obj["Size"],
+                        etag=obj["ETag"],
+                        last_modified=obj["LastModified"],
+                        part_size=self.part_size,
+                        max_concurrency=self.max_concurrency,
+                    )
+            self._objects = objects
+        return self._objects
+
+    def exists(self, name: str) -> bool:
+        return name in self.objects
+
+    def getsize(self, name: str) -> int:
+        return self.get(name).size
+
+    def getmtime(self, name: str) -> float:
+        return self.get(name).last_modified.timestamp()
+
+    def get(self, name: str) -> S3ObjectSource:
+        source = self.objects.get(name)
+        if source is None:
+            raise FileNotFoundError(f"No such source file: {self.location(name)!r}")
+        return source
+
+    def location(self, name: str) -> str:
+        return f"s3://{self.bucket}/{posixpath.join(self.prefix, name)}"
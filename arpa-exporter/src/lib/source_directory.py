@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import os
+import zipfile
+
+
+def normalize_entry_path(path_in_zip: str) -> str:
+    """Normalizes a zip entry path the same way as ``zipfile.ZipInfo.from_file()``
+    (for a regular file) without accessing the filesystem.
+
+    Args:
+        path_in_zip: Requested path of the entry in the zip archive
+
+    Returns:
+        Zip-compatible version of ``path_in_zip``
+    """
+    path = os.path.normpath(os.path.splitdrive(path_in_zip)[1])
+    path = path.lstrip(os.sep + (os.altsep or ""))
+    return zipfile.ZipInfo(path).filename
+
+
+class SourceDirectory:
+    """Listing of the regular files in a local directory, read with a single
+    ``os.scandir()`` pass when first needed and cached for the lifetime of the
+    instance (e.g. while handling one message).
+
+    Looking up files in the listing makes no further filesystem requests, except
+    that ``getsize()`` and ``getmtime()`` stat each file at most once. This avoids a lookup per file
+    on network filesystems, where each one is relatively slow.
+
+    Instances are not safe to share between threads.
+
+    Args:
+        path: Path of the directory
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: dict[str, os.DirEntry[str]] | None = None
+
+    @property
+    def entries(self) -> dict[str, os.DirEntry[str]]:
+        """Regular files in the directory, indexed by name."""
+        if self._entries is None:
+            with os.scandir(self.path) as entries:
+                self._entries = {
+                    entry.name: entry for entry in entries if entry.is_file()
+                }
+        return self._entries
+
+    def exists(self, source_path: str) -> bool:
+        """Determines whether a path in the directory names a regular file."""
+        return os.path.basename(source_path) in self.entries
+
+    def getsize(self, source_path: str) -> int:
+        """Returns the size of a regular file in the directory.
+
+        Raises:
+            FileNotFoundError: When the file was not in the directory when it was listed.
+        """
+        return self._get_entry(source_path).stat().st_size
+
+    def getmtime(self, source_path: str) -> float:
+        """Returns the last modification time of a regular file in the directory,
+        as a POSIX timestamp.
+
+        Raises:
+            FileNotFoundError: When the file was not in the directory when it was listed.
+        """
+        return self._get_entry(source_path).stat().st_mtime
+
+    def _get_entry(self, source_path: str) -> os.DirEntry[str]:
+        entry = self.entries.get(os.path.basename(source_path))
+        if entry is None:
+            raise FileNotFoundError(f"No such file in {self.path}: {source_path!r}")
+        return entry
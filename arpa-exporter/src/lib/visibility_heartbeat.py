@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+import typing
+
+import botocore.exceptions
+
+from src.lib.logging import get_logger
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_sqs import SQSClient
+
+    from src.lib.shutdown_handler import ShutdownHandler
+
+
+class VisibilityHeartbeat:
+    """Context manager that keeps in-flight SQS messages hidden from other
+    consumers while they are being processed, by periodically extending their
+    visibility timeout from a background thread.
+
+    The heartbeat stops when the context exits (whether or not processing
+    succeeded), or as soon as a shutdown is requested via ``shutdown_handler``.
+    Errors extending the visibility timeout are logged, and the extension is
+    retried after the next interval.
+    After it stops, messages become visible again once their current visibility
+    timeout lapses, unless they have been deleted.
+
+    Args:
+        sqs: SQS client used to change the message visibility
+        queue_url: URL of the queue from which the messages were received
+        receipt_handles: Receipt handles of the in-flight messages (at most 10)
+        interval_seconds: Time to wait between extensions
+        visibility_timeout_seconds: Visibility timeout to set on each extension,
+            which should comfortably exceed ``interval_seconds``.
+        shutdown_handler: (Optional) When provided, extensions stop once
+            a shutdown has been requested.
+    """
+
+    def __init__(
+        self,
+        sqs: SQSClient,
+        queue_url: str,
+        receipt_handles: typing.Sequence[str],
+        interval_seconds: float,
+        visibility_timeout_seconds: int,
+        shutdown_handler: ShutdownHandler | None = None,
+    ):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.receipt_handles = list(receipt_handles)
+        self.interval_seconds = interval_seconds
+        self.visibility_timeout_seconds = visibility_timeout_seconds
+        self.shutdown_handler = shutdown_handler
+        self.extensions_count = 0
+        self.logger = get_logger(
+            heartbeat_interval_seconds=interval_seconds,
+            heartbeat_visibility_timeout_seconds=visibility_timeout_seconds,
+        )
+        self._stop_requested = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> VisibilityHeartbeat:
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Starts extending the message visibility timeout in the background."""
+        # Run in a copy of the current context so heartbeat logs share its values
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._run,),
+            name="sqs-visibility-heartbeat",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops extending the message visibility timeout and waits for the
+        background thread to finish.
+        """
+        self._stop_requested.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_requested.wait(self.interval_seconds):
+            if self.shutdown_handler and self.shutdown_handler.is_shutdown_requested():
+                self.logger.warning(
+                    "shutdown requested; no longer extending SQS message visibility"
+                )
+                return
+            try:
+                response = self.sqs.change_message_visibility_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {
+                            "Id": str(i),
+                            "ReceiptHandle": receipt_handle,
+                            "VisibilityTimeout": self.visibility_timeout_seconds,
+                        }
+                        for i, receipt_handle in enumerate(self.receipt_handles)
+                    ],
+                )
+            except botocore.exceptions.ClientError:
+                # Errors may be transient, and processing may still finish before
+                # messages become visible, so try again on the next interval.
+                self.logger.exception("error extending SQS message visibility")
+                continue
+            if failed := response.get("Failed", []):
+                self.logger.error(
+                    "could not extend SQS message visibility",
+                    failures=[f.get("Message", f["Code"]) for f in failed],
+                )
+                continue
+            self.extensions_count += 1
+            self.logger.debug(
+                "extended SQS message visibility",
+                extensions_count=self.extensions_count,
+            )
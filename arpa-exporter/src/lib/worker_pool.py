@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import concurrent.futures
+import threading
+import typing
+
+from src.lib.logging import get_logger
+
+
+class WorkerPool:
+    """Pool of threads that only accepts work while one of its workers is free,
+    so that callers can take on more work (e.g. receive more SQS messages) as soon
+    as any worker finishes, without queueing work that cannot start yet.
+
+    Callers reserve free workers with ``reserve()``, then start a job on each
+    reserved worker with ``submit()`` (or return unused workers with ``release()``).
+    Each worker is freed again once its job finishes.
+
+    Errors raised by jobs are logged, and the first of them is raised by the next
+    call to ``reserve()``, so that callers stop taking on work after a failure.
+    When closed (e.g. on shutdown), every job that was already submitted finishes
+    before ``close()`` returns.
+
+    Args:
+        workers: Number of jobs that can run at once
+        thread_name_prefix: Prefix of the name of each worker thread
+    """
+
+    def __init__(self, workers: int, thread_name_prefix: str = ""):
+        self.workers = max(workers, 1)
+        self.logger = get_logger(pool_workers=self.workers)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix=thread_name_prefix
+        )
+        self._free = threading.Semaphore(self.workers)
+        self._lock = threading.Lock()
+        self._error: BaseException | None = None
+
+    def __enter__(self) -> WorkerPool:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def reserve(self, max_workers: int, timeout: float | None = None) -> int:
+        """Waits until at least one worker is free, and then reserves as many free
+        workers as possible, up to ``max_workers``.
+
+        Args:
+            max_workers: Maximum number of workers to reserve
+            timeout: (Optional) Maximum time to wait for a free worker, in seconds.
+                When omitted, waits indefinitely.
+
+        Returns:
+            The number of workers reserved, which is 0 when none became free
+            before ``timeout``.
+
+        Raises:
+            The first error raised by any job, if one has failed.
+        """
+        self._raise_error()
+        if max_workers < 1 or not self._free.acquire(timeout=timeout):
+            return 0
+        reserved = 1
+        while reserved < max_workers and self._free.acquire(blocking=False):
+            reserved += 1
+        return reserved
+
+    def release(self, workers: int = 1) -> None:
+        """Frees workers that were reserved but will not be given a job."""
+        if workers > 0:
+            self._free.release(workers)
+
+    def submit(
+        self,
+        fn: typing.Callable[..., typing.Any],
+        *args: typing.Any,
+        **kwargs: typing.Any,
+    ) -> concurrent.futures.Future:
+        """Starts a call to ``fn(*args, **kwargs)`` on a worker that was reserved
+        with ``reserve()``, which is freed once the call returns.
+        """
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def close(self) -> None:
+        """Waits for every submitted job to finish, and stops the worker threads."""
+        self._executor.shutdown(wait=True)
+
+    def _on_done(self, future: concurrent.futures.Future) -> None:
+        if not future.cancelled() and (error := future.exception()) is not None:
+            self.logger.error("error running job in worker pool", exc_info=error)
+            with self._lock:
+                if self._error is None:
+                    self._error = error
+        self._free.release()
+
+    def _raise_error(self) -> None:
+        with self._lock:
+            error = self._error
+        if error is not None:
+            raise error
@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+import dataclasses
+import os
+import shutil
+import struct
+import typing
+import zipfile
+import zlib
+
+READ_CHUNK_SIZE = 1024**2
+# Larger reads for raw copies, which may come from S3 (one ranged GET per read)
+RAW_COPY_CHUNK_SIZE = 8 * 1024**2
+DEFAULT_PROBE_SIZE = 64 * 1024
+# Formats whose data is already compressed, so compressing them again wastes CPU
+DEFAULT_STORED_EXTENSIONS = frozenset(
+    [
+        ".xlsx",
+        ".xlsm",
+        ".xlsb",
+        ".docx",
+        ".pptx",
+        ".zip",
+        ".gz",
+        ".7z",
+        ".pdf",
+        ".png",
+        ".jpg",
+        ".jpeg",
+    ]
+)
+# Formats that reliably compress well
+DEFAULT_COMPRESSED_EXTENSIONS = frozenset(
+    [
+        # Text formats
+        ".csv",
+        ".tsv",
+        ".txt",
+        ".json",
+        ".xml",
+        ".html",
+        # Spreadsheets in the legacy binary format, which (unlike .xlsx, .xlsm
+        # and .xlsb files) are not zip archives already
+        ".xls",
+    ]
+)
+# General purpose flag bits (see zipfile._MASK_*)
+_MASK_COMPRESS_OPTION_1 = 1 << 1
+_MASK_USE_DATA_DESCRIPTOR = 1 << 3
+# Local file header layout (see zipfile.structFileHeader)
+_LOCAL_FILE_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_FILE_HEADER_SIGNATURE = b"PK\003\004"
+
+
+class EntrySource(typing.Protocol):
+    """Source of the data for a zip entry, e.g. a local file or an S3 object."""
+
+    def zipinfo(self, arcname: str) -> zipfile.ZipInfo:
+        """Returns a ``ZipInfo`` for an entry named ``arcname`` with the data of
+        this source, whose ``file_size``, ``date_time`` and ``external_attr``
+        describe the source.
+        """
+        ...
+
+    def open(self) -> typing.IO[bytes]:
+        """Opens the data of this source for reading from its start."""
+        ...
+
+    def read_head(self, size: int) -> bytes:
+        """Returns (up to) the first ``size`` bytes of the data of this source."""
+        ...
+
+
+@dataclasses.dataclass(frozen=True)
+class LocalFileSource:
+    """``EntrySource`` for a file on the local filesystem."""
+
+    path: str
+
+    def zipinfo(self, arcname: str) -> zipfile.ZipInfo:
+        return zipfile.ZipInfo.from_file(self.path, arcname)
+
+    def open(self) -> typing.IO[bytes]:
+        return open(self.path, "rb")
+
+    def read_head(self, size: int) -> bytes:
+        with open(self.path, "rb") as fh:
+            return fh.read(size)
+
+
+def as_entry_source(source: str | EntrySource) -> EntrySource:
+    """Returns ``source``, or a ``LocalFileSource`` when it is a local file path."""
+    return LocalFileSource(source) if isinstance(source, str) else source
+
+
+@dataclasses.dataclass
+class CompressedEntry:
+    """A zip entry whose data has already been compressed, ready to be written
+    to an archive with ``write_compressed_entry()``.
+    """
+
+    zinfo: zipfile.ZipInfo
+    chunks: typing.Iterable[bytes]
+
+
+def parse_extensions(value: str) -> frozenset[str]:
+    """Parses a comma-separated list of file extensions (e.g. from an environment
+    variable) into lower-case extensions with a leading dot, as expected by
+    ``CompressionPolicy``. Surrounding whitespace and empty items are ignored,
+    so that e.g. ``"CSV, .txt,"`` is parsed as ``{".csv", ".txt"}``.
+    """
+    extensions = set()
+    for item in value.split(","):
+        if extension := item.strip().lower():
+            extensions.add(extension if extension.startswith(".") else f".{extension}")
+    return frozenset(extensions)
+
+
+@dataclasses.dataclass(frozen=True)
+class CompressionPolicy:
+    """Chooses how to compress each zip entry, so that CPU time is only spent
+    compressing data that will actually get smaller.
+
+    Entries whose file extension is in ``stored_extensions`` are stored without
+    compression, and those whose extension is in ``compressed_extensions`` are
+    compressed with ``compress_type``. Other entries are compressed only if
+    compressing their first ``probe_size`` bytes (at a fast compression level)
+    saves at least ``min_probe_savings`` of the probed size.
+
+    Args:
+        compress_type: Compression method for compressible entries
+        compress_level: (Optional) Compression level for ``compress_type``
+        stored_extensions: Lower-case file extensions (including the leading dot)
+            of entries that are never compressed
+        compressed_extensions: Lower-case file extensions of entries that are
+            always compressed
+        probe_size: Number of leading bytes to test-compress for entries with
+            other extensions. When 0, those entries are always compressed.
+        min_probe_savings: Minimum fraction of the probed data that compression
+            must save for an entry to be compressed
+    """
+
+    compress_type: int
+    compress_level: int | None = None
+    stored_extensions: frozenset[str] = DEFAULT_STORED_EXTENSIONS
+    compressed_extensions: frozenset[str] = DEFAULT_COMPRESSED_EXTENSIONS
+    probe_size: int = DEFAULT_PROBE_SIZE
+    min_probe_savings: float = 0.1
+
+    def choose_compress_type(self, source: str | EntrySource, arcname: str) -> int:
+        """Returns the compression method to use for an entry.
+
+        Args:
+            source: Source (or local file path) of the entry data
+            arcname: Name of the entry in the zip archive
+        """
+        _, extension = os.path.splitext(arcname)
+        if extension.lower() in self.stored_extensions:
+            return zipfile.ZIP_STORED
+        if extension.lower() in self.compressed_extensions or self.probe_size <= 0:
+            return self.compress_type
+        probe = as_entry_source(source).read_head(self.probe_size)
+        if not probe:
+            return zipfile.ZIP_STORED
+        savings = 1 - len(zlib.compress(probe, 1)) / len(probe)
+        if savings < self.min_probe_savings:
+            return zipfile.ZIP_STORED
+        return self.compress_type
+
+    def compress(self, source: str | EntrySource, arcname: str) -> CompressedEntry:
+        """Reads and compresses a source (or local file) as the data of a zip entry,
+        using the compression method chosen for it by this policy.
+        See ``compress_file()`` for details.
+        """
+        return compress_file(
+            source,
+            arcname,
+            self.choose_compress_type(source, arcname),
+            self.compress_level,
+        )
+
+
+def compress_file(
+    source: str | EntrySource,
+    arcname: str,
+    compress_type: int,
+    compress_level: int | None = None,
+) -> CompressedEntry:
+    """Reads and compresses a source (or local file) into memory as the data
+    of a zip entry.
+
+    This does not touch any ``ZipFile``, so it can run on other threads while
+    previously compressed entries are written to an archive. Compressors from
+    ``zlib``, ``bz2`` and ``lzma`` release the GIL, so those threads can make
+    use of multiple cores.
+
+    Args:
+        source: Source (or path of the local file) to compress
+        arcname: Name of the entry in the zip archive
+        compress_type: Compression method for the entry (e.g. ``zipfile.ZIP_DEFLATED``)
+        compress_level: (Optional) Compression level for ``compress_type``.
+            Defaults to the default level of the compression method.
+
+    Returns:
+        ``CompressedEntry`` whose ``zinfo`` contains the CRC and sizes of the data.
+    """
+    source = as_entry_source(source)
+    zinfo = source.zipinfo(arcname)
+    zinfo.compress_type = compress_type
+    if compress_type == zipfile.ZIP_LZMA:
+        # Compressed data includes an end-of-stream (EOS) marker
+        zinfo.flag_bits |= _MASK_COMPRESS_OPTION_1
+    # Use the same compressor (and settings) as zipfile would when writing the entry
+    compressor = zipfile._get_compressor(compress_type, compress_level)  # type: ignore[attr-defined]
+    chunks: list[bytes] = []
+    crc = 0
+    file_size = 0
+    with source.open() as fh:
+        while data := fh.read(READ_CHUNK_SIZE):
+            crc = zlib.crc32(data, crc)
+            file_size += len(data)
+            chunks.append(compressor.compress(data) if compressor else data)
+    if compressor:
+        chunks.append(compressor.flush())
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    zinfo.compress_size = sum(len(chunk) for chunk in chunks)
+    return CompressedEntry(zinfo=zinfo, chunks=[chunk for chunk in chunks if chunk])
+
+
+def write_source_entry(
+    archive: zipfile.ZipFile,
+    source: str | EntrySource,
+    arcname: str,
+    compress_type: int | None = None,
+    compress_level: int | None = None,
+) -> None:
+    """Streams a source (or local file) into an archive that is open for writing,
+    compressing it as it is written. Like ``ZipFile.write()``, the data is never
+    held in memory in full, but its sizes and CRC are only known once written.
+
+    Args:
+        archive: Zip archive opened with mode ``"w"``, ``"a"`` or ``"x"``
+        source: Source (or path of the local file) of the entry data
+        arcname: Name of the entry in the zip archive
+        compress_type: (Optional) Compression method for the entry.
+            Defaults to the compression method of the archive.
+        compress_level: (Optional) Compression level for ``compress_type``.
+            Defaults to the compression level of the archive.
+    """
+    source = as_entry_source(source)
+    zinfo = source.zipinfo(arcname)
+    # Chosen the same way as ZipFile.write() (ZipInfo.compress_level from Python 3.13)
+    zinfo.compress_type = (
+        compress_type if compress_type is not None else archive.compression
+    )
+    zinfo._compresslevel = (  # type: ignore[attr-defined]
+        compress_level if compress_level is not None else archive.compresslevel
+    )
+    with source.open() as src, archive.open(zinfo, "w") as dest:
+        shutil.copyfileobj(src, dest, READ_CHUNK_SIZE)
+
+
+def read_raw_entry(
+    fh: typing.IO[bytes], zinfo: zipfile.ZipInfo, arcname: str | None = None
+) -> CompressedEntry:
+    """Prepares an entry of an existing zip archive to be copied to another archive
+    (optionally under a different name) without decompressing and recompressing
+    its data.
+
+    The entry data is read lazily from ``fh`` when the returned entry is written,
+    so ``fh`` must remain open until then.
+
+    Args:
+        fh: Seekable binary file-like object containing the existing archive
+        zinfo: Entry of the existing archive, as read from its central directory
+        arcname: (Optional) New name for the entry. Defaults to its current name.
+
+    Returns:
+        ``CompressedEntry`` with the same data, CRC and sizes as the existing entry.
+
+    Raises:
+        zipfile.BadZipFile: When the entry's local header cannot be read.
+    """
+    fh.seek(zinfo.header_offset)
+    header = fh.read(_LOCAL_FILE_HEADER.size)
+    if len(header) != _LOCAL_FILE_HEADER.size:
+        raise zipfile.BadZipFile(f"Truncated file header for {zinfo.filename!r}")
+    fields = _LOCAL_FILE_HEADER.unpack(header)
+    if fields[0] != _LOCAL_FILE_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(
+            f"Bad magic number for file header of {zinfo.filename!r}"
+        )
+    filename_length, extra_length = fields[10], fields[11]
+    data_offset = (
+        zinfo.header_offset + _LOCAL_FILE_HEADER.size + filename_length + extra_length
+    )
+
+    copied = zipfile.ZipInfo(arcname or zinfo.filename, zinfo.date_time)
+    copied.compress_type = zinfo.compress_type
+    copied.flag_bits = zinfo.flag_bits & ~_MASK_USE_DATA_DESCRIPTOR
+    copied.create_system = zinfo.create_system
+    copied.external_attr = zinfo.external_attr
+    copied.comment = zinfo.comment
+    copied.CRC = zinfo.CRC
+    copied.file_size = zinfo.file_size
+    copied.compress_size = zinfo.compress_size
+    # Extra fields are not copied, since any ZIP64 fields (the only ones zipfile
+    # writes) are regenerated as needed when the copy is written.
+
+    def read_chunks() -> typing.Iterator[bytes]:
+        position = data_offset
+        remaining = zinfo.compress_size
+        while remaining > 0:
+            fh.seek(position)
+            data = fh.read(min(RAW_COPY_CHUNK_SIZE, remaining))
+            if not data:
+                raise zipfile.BadZipFile(f"Truncated data for {zinfo.filename!r}")
+            position += len(data)
+            remaining -= len(data)
+            yield data
+
+    return CompressedEntry(zinfo=copied, chunks=read_chunks())
+
+
+def write_compressed_entry(archive: zipfile.ZipFile, entry: CompressedEntry) -> None:
+    """Writes an entry with already-compressed data to an archive that is open
+    for writing, without compressing it again.
+
+    Since the CRC and sizes of the entry are known before its data is written,
+    its local header is written once and never needs to be rewritten. This works
+    the same whether or not the archive is being written to a seekable file.
+
+    Args:
+        archive: Zip archive opened with mode ``"w"``, ``"a"`` or ``"x"``
+        entry: Entry to write, whose ``zinfo`` has a correct CRC and sizes
+    """
+    zinfo = entry.zinfo
+    # This mirrors ZipFile._open_to_write() and _ZipWriteFile.close(), which
+    # only support writing data that is compressed as it is written.
+    zf: typing.Any = archive
+    with zf._lock:
+        if zf._writing:
+            raise ValueError(
+                "Can't write to the ZIP file while there is another write handle open on it."
+            )
+        zinfo.flag_bits &= ~_MASK_USE_DATA_DESCRIPTOR
+        if not zinfo.external_attr:
+            zinfo.external_attr = 0o600 << 16  # permissions: ?rw-------
+        if zf._seekable:
+            zf.fp.seek(zf.start_dir)
+        zinfo.header_offset = zf.fp.tell()
+        zf._writecheck(zinfo)
+        zf._didModify = True
+        zf.fp.write(zinfo.FileHeader())
+        for chunk in entry.chunks:
+            zf.fp.write(chunk)
+        zf.start_dir = zf.fp.tell()
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
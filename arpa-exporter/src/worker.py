@@ -1,37 +1,213 @@
 from __future__ import annotations
 
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
 import csv
 import datetime
+import functools
 import io
 import json
 import os
+import posixpath
 import tempfile
+import time
 import typing
 import urllib.parse
 import zipfile
 from tempfile import _TemporaryFileWrapper
 
-import boto3
 import botocore.client
 import botocore.exceptions
 import pydantic
 import structlog
 from ddtrace import tracer
 
-from src.lib.email import generate_email, send_email
+from src.lib.archive_cache import ArchiveCache
+from src.lib.aws_clients import (
+    DEFAULT_MAX_POOL_CONNECTIONS,
+    ClientSettings,
+    create_client,
+)
+from src.lib.email import (
+    configure_send_rate_limiter,
+    generate_email,
+    load_templates,
+    send_email,
+)
+from src.lib.job_metrics import JobMetrics
 from src.lib.logging import get_logger, reset_contextvars
+from src.lib.metrics import close_statsd, get_statsd, organization_tags
+from src.lib.notifier import BackgroundNotifier, when_all_done
+from src.lib.s3_multipart import (
+    DEFAULT_MAX_IN_FLIGHT_PARTS,
+    MIN_PART_SIZE,
+    MultipartUploadWriter,
+    upload_appended_object,
+)
+from src.lib.s3_object_reader import (
+    DEFAULT_BUFFER_SIZE,
+    DEFAULT_STREAM_CONCURRENCY,
+    DEFAULT_STREAM_PART_SIZE,
+    S3ObjectReader,
+)
+from src.lib.s3_transfer import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_THRESHOLD,
+    TransferSettings,
+    download_fileobj,
+    log_transfer_throughput,
+    upload_fileobj,
+)
 from src.lib.shutdown_handler import ShutdownHandler
+from src.lib.source_backends import (
+    LocalSourceBackend,
+    S3SourceBackend,
+    SourceBackend,
+)
+from src.lib.source_directory import normalize_entry_path
+from src.lib.visibility_heartbeat import VisibilityHeartbeat
+from src.lib.worker_pool import WorkerPool
+from src.lib.zip_entries import (
+    DEFAULT_COMPRESSED_EXTENSIONS,
+    DEFAULT_PROBE_SIZE,
+    DEFAULT_STORED_EXTENSIONS,
+    CompressedEntry,
+    CompressionPolicy,
+    EntrySource,
+    compress_file,
+    parse_extensions,
+    read_raw_entry,
+    write_compressed_entry,
+    write_source_entry,
+)
 
 if typing.TYPE_CHECKING:  # pragma: nocover
     from mypy_boto3_s3 import S3Client
     from mypy_boto3_ses import SESClient
     from mypy_boto3_sqs import SQSClient
+    from mypy_boto3_sqs.type_defs import MessageTypeDef
 
 TASK_QUEUE_URL = os.environ["TASK_QUEUE_URL"]
 TASK_QUEUE_RECEIVE_TIMEOUT = int(os.getenv("TASK_QUEUE_RECEIVE_TIMEOUT", 20))
-DATA_DIR = os.environ["DATA_DIR"]
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 1))
+COALESCE_MESSAGES_ENABLED = (
+    os.getenv("COALESCE_MESSAGES_ENABLED", "false").lower() == "true"
+)
+VISIBILITY_HEARTBEAT_INTERVAL_SECONDS = int(
+    os.getenv("VISIBILITY_HEARTBEAT_INTERVAL_SECONDS", 60)
+)
+# Should be at least the queue's own visibility timeout (15 minutes), so that
+# extending it never makes in-flight messages visible sooner than they would be
+VISIBILITY_HEARTBEAT_TIMEOUT_SECONDS = int(
+    os.getenv("VISIBILITY_HEARTBEAT_TIMEOUT_SECONDS", 900)
+)
+# Send notifications from background threads (see BackgroundNotifier), so that
+# building zip files does not wait for email delivery
+ASYNC_NOTIFICATIONS_ENABLED = (
+    os.getenv("ASYNC_NOTIFICATIONS_ENABLED", "true").lower() == "true"
+)
+NOTIFIER_WORKERS = int(os.getenv("NOTIFIER_WORKERS", 1))
+NOTIFIER_MAX_PENDING = int(os.getenv("NOTIFIER_MAX_PENDING", 100))
+NOTIFIER_MAX_ATTEMPTS = int(os.getenv("NOTIFIER_MAX_ATTEMPTS", 5))
+NOTIFIER_BACKOFF_SECONDS = float(os.getenv("NOTIFIER_BACKOFF_SECONDS", 1))
+NOTIFIER_MAX_BACKOFF_SECONDS = float(os.getenv("NOTIFIER_MAX_BACKOFF_SECONDS", 60))
+# Managed S3 transfers of zip files. The part size is chosen for each transfer
+# (based on the zip file size) when S3_TRANSFER_PART_SIZE is "auto".
+S3_TRANSFER_SETTINGS = TransferSettings(
+    part_size=(
+        None
+        if (part_size := os.getenv("S3_TRANSFER_PART_SIZE", "auto")).lower() == "auto"
+        else int(part_size)
+    ),
+    max_concurrency=int(
+        os.getenv("S3_TRANSFER_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+    ),
+    threshold=int(os.getenv("S3_TRANSFER_THRESHOLD", DEFAULT_THRESHOLD)),
+)
+# AWS client connections (see ClientSettings). Unless AWS_MAX_POOL_CONNECTIONS
+# is set, connection pools are sized for the configured concurrency.
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", 0))
+AWS_CONNECT_TIMEOUT_SECONDS = float(os.getenv("AWS_CONNECT_TIMEOUT_SECONDS", 10))
+AWS_READ_TIMEOUT_SECONDS = float(os.getenv("AWS_READ_TIMEOUT_SECONDS", 60))
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", 5))
+AWS_RETRY_MODE = os.getenv("AWS_RETRY_MODE", "adaptive").lower()
+AWS_TCP_KEEPALIVE = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() == "true"
+# Where source files are read from: "local" (DATA_DIR) or "s3" (SOURCE_S3_BUCKET)
+SOURCE_BACKEND = os.getenv("SOURCE_BACKEND", "local").lower()
+DATA_DIR = (
+    os.environ["DATA_DIR"] if SOURCE_BACKEND == "local" else os.getenv("DATA_DIR", "")
+)
+SOURCE_S3_BUCKET = os.getenv("SOURCE_S3_BUCKET", "")
+SOURCE_S3_PREFIX = os.getenv("SOURCE_S3_PREFIX", "")
+SOURCE_S3_PART_SIZE = int(os.getenv("SOURCE_S3_PART_SIZE", DEFAULT_STREAM_PART_SIZE))
+SOURCE_S3_MAX_CONCURRENCY = int(
+    os.getenv("SOURCE_S3_MAX_CONCURRENCY", DEFAULT_STREAM_CONCURRENCY)
+)
 DOWNLOAD_URL_EXPIRATION_SECONDS = int(datetime.timedelta(hours=24).total_seconds())
 API_DOMAIN = os.environ["API_DOMAIN"]
+REMOTE_PLAN_ENABLED = os.getenv("REMOTE_PLAN_ENABLED", "true").lower() == "true"
+APPEND_UPLOAD_ENABLED = os.getenv("APPEND_UPLOAD_ENABLED", "true").lower() == "true"
+STREAMING_UPLOAD_ENABLED = (
+    os.getenv("STREAMING_UPLOAD_ENABLED", "true").lower() == "true"
+)
+ZIP_COMPRESS_TYPE = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}[os.getenv("ZIP_COMPRESSION", "stored").lower()]
+ZIP_COMPRESS_LEVEL = (
+    int(os.environ["ZIP_COMPRESS_LEVEL"]) if os.getenv("ZIP_COMPRESS_LEVEL") else None
+)
+# Threads compressing entries at once. Defaults to the number of CPUs this process
+# may run on, which does not account for CPU quotas (e.g. the vCPUs of a Fargate
+# task), so deployments with such quotas should set it to match them instead.
+ZIP_COMPRESS_WORKERS = int(
+    os.getenv(
+        "ZIP_COMPRESS_WORKERS",
+        len(os.sched_getaffinity(0))
+        if hasattr(os, "sched_getaffinity")
+        else os.cpu_count() or 1,
+    )
+)
+# Source files to read ahead (on background threads) while stored entries are written
+ZIP_PREFETCH_WORKERS = int(os.getenv("ZIP_PREFETCH_WORKERS", 4))
+ZIP_PREFETCH_MAX_BYTES = int(os.getenv("ZIP_PREFETCH_MAX_BYTES", 256 * 1024**2))
+ZIP_COMPRESSION_PROBE_BYTES = int(
+    os.getenv("ZIP_COMPRESSION_PROBE_BYTES", DEFAULT_PROBE_SIZE)
+)
+ZIP_STORED_EXTENSIONS = (
+    parse_extensions(os.environ["ZIP_STORED_EXTENSIONS"])
+    if "ZIP_STORED_EXTENSIONS" in os.environ
+    else DEFAULT_STORED_EXTENSIONS
+)
+ZIP_COMPRESSED_EXTENSIONS = (
+    parse_extensions(os.environ["ZIP_COMPRESSED_EXTENSIONS"])
+    if "ZIP_COMPRESSED_EXTENSIONS" in os.environ
+    else DEFAULT_COMPRESSED_EXTENSIONS
+)
+ARCHIVE_COMPACTION_ENABLED = (
+    os.getenv("ARCHIVE_COMPACTION_ENABLED", "false").lower() == "true"
+)
+RECREATE_REUSE_ENTRIES_ENABLED = (
+    os.getenv("RECREATE_REUSE_ENTRIES_ENABLED", "true").lower() == "true"
+)
+ARCHIVE_MANIFEST_ENABLED = (
+    os.getenv("ARCHIVE_MANIFEST_ENABLED", "true").lower() == "true"
+)
+SKIP_UNCHANGED_METADATA_ENABLED = (
+    os.getenv("SKIP_UNCHANGED_METADATA_ENABLED", "true").lower() == "true"
+)
+# User-defined S3 object metadata key recording the ETag of the CSV metadata
+# object from which a zip file object was built
+ZIP_METADATA_ETAG_KEY = "metadata-etag"
+SOURCE_PREFLIGHT_ENABLED = (
+    os.getenv("SOURCE_PREFLIGHT_ENABLED", "true").lower() == "true"
+)
+ARCHIVE_CACHE_DIR = os.getenv("ARCHIVE_CACHE_DIR")
+ARCHIVE_CACHE_MAX_BYTES = int(os.getenv("ARCHIVE_CACHE_MAX_BYTES", 8 * 1024**3))
 
 
 class UploadInfo(pydantic.BaseModel):
@@ -50,6 +226,11 @@ class S3Schema(pydantic.BaseModel):
     zip_key: str
     metadata_key: str
 
+    @property
+    def manifest_key(self) -> str:
+        """S3 key of the manifest (see ``ArchiveManifest``) stored next to the zip file."""
+        return f"{posixpath.splitext(self.zip_key)[0]}.manifest.json"
+
 
 class MessageSchema(pydantic.BaseModel):
     """Schema for messages received from the SQS queue"""
@@ -60,15 +241,230 @@ class MessageSchema(pydantic.BaseModel):
     recreate_archive: bool
 
 
+class RemoteArchive(pydantic.BaseModel):
+    """Version of an existing zip file S3 object, as retrieved by a single
+    ``HeadObject`` request (see ``head_remote_archive()``), so that every later
+    step of handling a message reads that same version.
+    """
+
+    etag: str
+    size: int
+    metadata: dict[str, str] = {}
+
+
+class ManifestEntry(pydantic.BaseModel):
+    """Describes a single entry of a zip file in an ``ArchiveManifest``."""
+
+    name: str
+    upload_id: str | None
+    header_offset: int
+    compress_type: int
+    compress_size: int
+    file_size: int
+    crc: int
+
+
+class ArchiveManifest(pydantic.BaseModel):
+    """Sidecar index of the entries in a zip file S3 object, which allows them
+    to be determined by reading one small object instead of the zip file.
+
+    A manifest is only valid for the zip file object whose ETag matches its
+    ``archive_etag``.
+    """
+
+    archive_etag: str | None = None
+    metadata_etag: str | None = None
+    central_directory_offset: int
+    entries: list[ManifestEntry]
+
+    @classmethod
+    def from_archive(
+        cls,
+        archive: zipfile.ZipFile,
+        central_directory_offset: int | None = None,
+        **kwargs: typing.Any,
+    ) -> ArchiveManifest:
+        """Builds a manifest from the central directory of an open zip archive.
+        Additional keyword arguments set other fields of the manifest.
+
+        An archive open for writing does not know where its central directory
+        will be written, so its ``central_directory_offset`` (i.e. the size of its
+        entries) must be provided.
+        """
+        if central_directory_offset is None:
+            central_directory_offset = archive.start_dir
+        return cls(
+            central_directory_offset=central_directory_offset,
+            entries=[
+                ManifestEntry(
+                    name=zinfo.filename,
+                    upload_id=get_upload_id_from_entry_path(zinfo.filename),
+                    header_offset=zinfo.header_offset,
+                    compress_type=zinfo.compress_type,
+                    compress_size=zinfo.compress_size,
+                    file_size=zinfo.file_size,
+                    crc=zinfo.CRC,
+                )
+                for zinfo in archive.infolist()
+            ],
+            **kwargs,
+        )
+
+
+def get_source_name(upload: UploadInfo) -> str:
+    """Returns the name of the source file for an ``UploadInfo``, which identifies
+    it in a ``SourceBackend``.
+    """
+    _, file_extension = os.path.splitext(upload.path_in_zip)
+    return f"{upload.upload_id}{file_extension}"
+
+
+def get_source_path(upload: UploadInfo) -> str:
+    """Returns the path of the source file in ``DATA_DIR`` for an ``UploadInfo``."""
+    return os.path.join(DATA_DIR, get_source_name(upload))
+
+
+def get_source_backend(s3: S3Client) -> SourceBackend:
+    """Returns a new ``SourceBackend`` (as configured by ``SOURCE_BACKEND``)
+    from which source files are read while handling one message.
+    """
+    if SOURCE_BACKEND == "s3":
+        return S3SourceBackend(
+            s3,
+            SOURCE_S3_BUCKET,
+            SOURCE_S3_PREFIX,
+            part_size=SOURCE_S3_PART_SIZE,
+            max_concurrency=SOURCE_S3_MAX_CONCURRENCY,
+        )
+    return LocalSourceBackend(DATA_DIR)
+
+
+def get_entry_paths(upload: UploadInfo) -> tuple[str, str]:
+    """Resolves the local source file path and the normalized zip entry path
+    for an ``UploadInfo``.
+
+    Args:
+        upload: Source upload to resolve paths for
+
+    Returns:
+        A 2-tuple containing (source_path, path_in_zip), where:
+            source_path: Path of the source file in ``DATA_DIR``
+            path_in_zip: Zip-compatible version of ``upload.path_in_zip``
+    """
+    # Normalized like ZipInfo.from_file() would, but without a stat of the source file
+    return get_source_path(upload), normalize_entry_path(upload.path_in_zip)
+
+
+@tracer.wrap()
+def preflight_source_uploads(
+    source_uploads: typing.Iterable[UploadInfo],
+    source_backend: SourceBackend | None = None,
+) -> list[UploadInfo]:
+    """Reads all of ``source_uploads`` and checks that the source file of each
+    one exists in the source backend, so that a message naming missing source files
+    fails before any zip file is downloaded or written.
+
+    Source backends list their storage once (e.g. ``DATA_DIR`` with ``os.scandir()``)
+    rather than looking up each source file individually, so the cost of this check
+    does not grow with the latency of individual file lookups on network filesystems.
+
+    Args:
+        source_uploads: Uploads whose source files are needed to build a zip file
+        source_backend: (Optional) Backend containing the source files.
+            Defaults to a ``LocalSourceBackend`` for ``DATA_DIR``.
+
+    Returns:
+        List of all uploads from ``source_uploads``, in the same order.
+
+    Raises:
+        FileNotFoundError: When any source files are missing (or are not regular
+            files). The error names every missing source file.
+    """
+    if source_backend is None:
+        source_backend = LocalSourceBackend(DATA_DIR)
+    # The location of the backend's root, e.g. DATA_DIR or an S3 prefix
+    logger = get_logger(source_location=source_backend.location(""))
+    uploads = list(source_uploads)
+    missing_source_paths = [
+        source_backend.location(source_name)
+        for upload in uploads
+        if not source_backend.exists(source_name := get_source_name(upload))
+    ]
+    if missing_source_paths:
+        logger.error(
+            "source files named in CSV metadata are missing",
+            files_checked=len(uploads),
+            missing_source_paths=missing_source_paths,
+        )
+        raise FileNotFoundError(
+            f"{len(missing_source_paths)} of {len(uploads)} source files are missing: "
+            + ", ".join(missing_source_paths)
+        )
+    logger.info(
+        "all source files named in CSV metadata exist", files_checked=len(uploads)
+    )
+    return uploads
+
+
 @tracer.wrap()
-def build_zip(fh: _TemporaryFileWrapper, source_uploads: typing.Iterator[UploadInfo]) -> bool:
+def build_zip(
+    fh: typing.IO[bytes],
+    source_uploads: typing.Iterator[UploadInfo],
+    mode: typing.Literal["a", "w"] = "a",
+    compression: CompressionPolicy | None = None,
+    compress_workers: int = 1,
+    previous_archive: zipfile.ZipFile | None = None,
+    source_backend: SourceBackend | None = None,
+    prefetch_workers: int = 0,
+    max_pending_bytes: int = ZIP_PREFETCH_MAX_BYTES,
+    metrics: JobMetrics | None = None,
+    on_written: typing.Callable[[zipfile.ZipFile], None] | None = None,
+) -> bool:
     """Appends file entries named by ``source_uploads`` to an open zip archive,
     skipping those whose names are already present in the zip.
 
+    When a ``previous_archive`` is given, entries for uploads that it already
+    contains (see ``get_entries_by_upload_id()``) that are unchanged from their
+    source file (see ``is_reusable_entry()``) are copied from it without
+    recompression, and renamed when their ``path_in_zip`` has changed. Only other
+    uploads are read from their source files.
+
+    When a ``compression`` policy is given, the next ``compress_workers`` source
+    files are read and compressed (as chosen by the policy) on a thread pool
+    while compressed entries are written to the zip (in the order given by
+    ``source_uploads``). Otherwise, when ``prefetch_workers`` is positive, the next
+    ``prefetch_workers`` source files are likewise read ahead into memory while
+    entries are written, so that the latency of reading each file (e.g. from a
+    network filesystem) overlaps with writing others.
+
+    Source files held in memory (while read ahead or compressed) are limited to
+    ``max_pending_bytes`` in total; larger source files are instead streamed from
+    disk into the zip once every preceding entry has been written.
+
     Args:
         fh: Open, writeable zip file handler or file-like object
         source_uploads: Iterator of ``UploadInfo`` used to map source files from
-            a local filesystem to entries of the zip file.
+            ``source_backend`` to entries of the zip file.
+        mode: ``"a"`` (the default) to append to any archive already in ``fh``,
+            or ``"w"`` to write a new archive. Only ``"w"`` supports writing
+            to non-seekable file-like objects.
+        compression: (Optional) Chooses the compression of each new entry.
+            When omitted, new entries are stored without compression.
+        compress_workers: Number of source files to compress concurrently
+        previous_archive: (Optional) Zip archive, opened for reading from a
+            seekable file, whose entries may be copied to the zip file.
+        source_backend: (Optional) Backend from which source files are read.
+            Defaults to a ``LocalSourceBackend`` for ``DATA_DIR``.
+        prefetch_workers: Number of source files to read ahead concurrently when
+            entries are not compressed. Defaults to 0 (no read-ahead).
+        max_pending_bytes: Maximum total size of source files to hold in memory
+            while reading ahead or compressing them.
+        metrics: (Optional) Job metrics to which the time spent checking for
+            existing entries (``"diff"``) and writing new entries (``"entry_writes"``,
+            including waiting for them to be read) are added, along with the number
+            of entries checked, added and reused, and the bytes they contain.
+        on_written: (Optional) Called with the zip archive once every entry has been
+            written to it, before it is closed (e.g. to index its entries).
 
     Returns:
         bool indicating whether any new entries were appended to the zip file.
@@ -77,17 +473,83 @@ def build_zip(fh: _TemporaryFileWrapper, source_uploads: typing.Iterator[UploadI
     logger = get_logger()
     files_added = 0
     files_checked = 0
-    with zipfile.ZipFile(fh, "a") as archive:
+    if source_backend is None:
+        source_backend = LocalSourceBackend(DATA_DIR)
+    if metrics is None:
+        metrics = JobMetrics()
+    diff_metrics = metrics.get("diff")
+    write_metrics = metrics.get("entry_writes")
+    with contextlib.ExitStack() as stack:
+        archive = stack.enter_context(zipfile.ZipFile(fh, mode))
+        read_entry: typing.Callable[[EntrySource, str], CompressedEntry] | None = None
+        max_pending = 0
+        if compression is not None:
+            read_entry = compression.compress
+            max_pending = max(compress_workers, 1)
+        elif prefetch_workers > 0:
+            read_entry = functools.partial(
+                compress_file, compress_type=zipfile.ZIP_STORED
+            )
+            max_pending = prefetch_workers
+        executor: concurrent.futures.ThreadPoolExecutor | None = None
+        if read_entry is not None:
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_pending, thread_name_prefix="build-zip-read"
+            )
+            # Runs before the archive is closed, discarding unwritten entries on error
+            stack.callback(executor.shutdown, cancel_futures=True)
+        # Entries being read, compressed or copied, in the order they must be
+        # written, with the size of their source files held in memory
+        pending: collections.deque[
+            tuple[
+                structlog.stdlib.BoundLogger,
+                concurrent.futures.Future[CompressedEntry],
+                int,
+            ]
+        ] = collections.deque()
+        pending_bytes = 0
+
+        def add_written_entry_metrics(started: float) -> None:
+            zinfo = archive.filelist[-1]
+            write_metrics.add(
+                seconds=time.perf_counter() - started,
+                bytes=zinfo.file_size,
+                compressed_bytes=zinfo.compress_size,
+                entries_added=1,
+            )
+
+        def write_next_pending_entry() -> None:
+            nonlocal files_added, pending_bytes
+            entry_logger, future, source_size = pending.popleft()
+            pending_bytes -= source_size
+            started = time.perf_counter()
+            try:
+                write_compressed_entry(archive, future.result())
+            except:
+                metrics.record_failure("entry_writes")
+                entry_logger.exception("error writing source file to entry in archive")
+                raise
+            add_written_entry_metrics(started)
+            files_added += 1
+            entry_logger.info(
+                "Added file to the archive.",
+                files_added=files_added,
+                files_checked=files_checked,
+            )
+
+        # Index entry names once so that duplicate checks do not rescan the archive
+        existing_entries = set(archive.namelist())
+        previous_fh = previous_archive.fp if previous_archive else None
+        previous_entries = (
+            get_entries_by_upload_id(previous_archive) if previous_archive else {}
+        )
         for upload in source_uploads:
+            started = time.perf_counter()
             files_checked += 1
-            _, file_extension = os.path.splitext(upload.path_in_zip)
-            source_path = os.path.join(DATA_DIR, f"{upload.upload_id}{file_extension}")
-            # Use ZipInfo filename to pre-normalize the destination path:
-            path_in_zip = zipfile.ZipInfo.from_file(
-                source_path, upload.path_in_zip
-            ).filename
+            source_name = get_source_name(upload)
+            path_in_zip = normalize_entry_path(upload.path_in_zip)
             entry_logger = logger.bind(
-                source_path=source_path,
+                source_path=source_backend.location(source_name),
                 entry_path=path_in_zip,
             )
             if path_in_zip != upload.path_in_zip:  # pragma: nocover
@@ -96,22 +558,93 @@ def build_zip(fh: _TemporaryFileWrapper, source_uploads: typing.Iterator[UploadI
                     incompatible_entry_path=upload.path_in_zip,
                 )
 
-            if path_in_zip in archive.namelist():
+            if path_in_zip in existing_entries:
+                diff_metrics.add(
+                    seconds=time.perf_counter() - started,
+                    entries_checked=1,
+                    entries_existing=1,
+                )
                 entry_logger.info("file already exists in archive")
                 continue
+            existing_entries.add(path_in_zip)
+            diff_metrics.add(seconds=time.perf_counter() - started, entries_checked=1)
 
-            try:
-                archive.write(source_path, arcname=path_in_zip)
-            except:
-                entry_logger.exception("error writing source file to entry in archive")
-                raise
+            future: concurrent.futures.Future[CompressedEntry]
+            # Reused entries are read lazily as written, so they hold no source data
+            source_size = 0
+            previous_zinfo = previous_entries.get(upload.upload_id)
+            if (
+                previous_fh is not None
+                and previous_zinfo is not None
+                and is_reusable_entry(
+                    previous_zinfo, source_backend, source_name, compression
+                )
+            ):
+                # Copy the compressed data as-is, renaming the entry if needed
+                entry_logger = entry_logger.bind(
+                    previous_entry_path=previous_zinfo.filename
+                )
+                diff_metrics.add(entries_reused=1)
+                future = concurrent.futures.Future()
+                future.set_result(
+                    read_raw_entry(previous_fh, previous_zinfo, path_in_zip)
+                )
+            elif (
+                read_entry is not None
+                and executor is not None
+                and (source_size := source_backend.getsize(source_name))
+                <= max_pending_bytes
+            ):
+                # Make room for the entry before it is read into memory
+                while pending and (
+                    len(pending) >= max_pending
+                    or pending_bytes + source_size > max_pending_bytes
+                ):
+                    write_next_pending_entry()
+                future = executor.submit(
+                    read_entry, source_backend.get(source_name), path_in_zip
+                )
+            else:
+                # Entries are streamed from disk rather than read into memory
+                while pending:
+                    write_next_pending_entry()
+                started = time.perf_counter()
+                try:
+                    source = source_backend.get(source_name)
+                    if compression is not None:
+                        write_source_entry(
+                            archive,
+                            source,
+                            path_in_zip,
+                            compression.choose_compress_type(source, path_in_zip),
+                            compression.compress_level,
+                        )
+                    else:
+                        write_source_entry(archive, source, path_in_zip)
+                except:
+                    metrics.record_failure("entry_writes")
+                    entry_logger.exception(
+                        "error writing source file to entry in archive"
+                    )
+                    raise
+                add_written_entry_metrics(started)
+                files_added += 1
+                entry_logger.info(
+                    "Added file to the archive.",
+                    files_added=files_added,
+                    files_checked=files_checked,
+                )
+                continue
 
-            files_added += 1
-            entry_logger.info(
-                "Added file to the archive.",
-                files_added=files_added,
-                files_checked=files_checked,
-            )
+            pending.append((entry_logger, future, source_size))
+            pending_bytes += source_size
+            while len(pending) > max_pending:
+                write_next_pending_entry()
+
+        while pending:
+            write_next_pending_entry()
+        if on_written is not None:
+            on_written(archive)
 
     logger = logger.bind(files_added=files_added, files_checked=files_checked)
     if files_added == 0:
@@ -130,8 +663,108 @@ def build_zip(fh: _TemporaryFileWrapper, source_uploads: typing.Iterator[UploadI
     return True
 
 
+def get_upload_id_from_entry_path(path_in_zip: str) -> str | None:
+    """Extracts the upload ID from the name of a zip entry, which is formatted as
+    ``<directories>/<filename>--<upload_id><extension>`` by the API server.
+
+    Returns:
+        The upload ID, or None if the entry name is not in the expected format.
+    """
+    stem, _ = os.path.splitext(posixpath.basename(path_in_zip))
+    _, separator, upload_id = stem.rpartition("--")
+    return upload_id if separator and upload_id else None
+
+
+def get_entries_by_upload_id(archive: zipfile.ZipFile) -> dict[str, zipfile.ZipInfo]:
+    """Indexes the entries of a zip archive by the upload ID in their names.
+
+    Args:
+        archive: Zip archive opened for reading
+
+    Returns:
+        Mapping of upload IDs to entries. Entries whose names do not contain
+        an upload ID are omitted.
+    """
+    return {
+        upload_id: zinfo
+        for zinfo in archive.infolist()
+        if not zinfo.is_dir()
+        and (upload_id := get_upload_id_from_entry_path(zinfo.filename)) is not None
+    }
+
+
+def is_reusable_entry(
+    zinfo: zipfile.ZipInfo,
+    source_backend: SourceBackend,
+    source_name: str,
+    compression: CompressionPolicy | None = None,
+) -> bool:
+    """Determines whether an entry of a previous zip archive can be copied as-is
+    in place of a new entry for a source file, i.e. whether it has the size and
+    last modification time of the source file (as recorded in the entry when it was
+    written from that file), and the compression method that ``compression`` would
+    now choose for the source file.
+
+    Args:
+        zinfo: Entry of the previous zip archive
+        source_backend: Backend containing the source file
+        source_name: Name of the source file in ``source_backend``
+        compression: (Optional) Compression policy for new entries. When omitted,
+            new entries are stored without compression.
+    """
+    if zinfo.file_size != source_backend.getsize(source_name):
+        return False
+    # As recorded by ZipInfo.from_file(), and read back at a 2-second resolution
+    mtime = time.localtime(source_backend.getmtime(source_name))
+    if zinfo.date_time != (*mtime[:5], mtime.tm_sec - mtime.tm_sec % 2):
+        return False
+    if compression is None:
+        return zinfo.compress_type == zipfile.ZIP_STORED
+    # The extension of the source file name is that of the new entry
+    return zinfo.compress_type == compression.choose_compress_type(
+        source_backend.get(source_name), source_name
+    )
+
+
+def get_stale_entry_paths(
+    fh: typing.IO[bytes], source_uploads: typing.Iterable[UploadInfo]
+) -> list[str]:
+    """Finds entries of a zip file that are not named by any of ``source_uploads``,
+    e.g. because the ``path_in_zip`` of an upload has changed since it was added.
+
+    Args:
+        fh: Open, readable zip file handler or file-like object
+        source_uploads: Uploads that the zip file should contain
+
+    Returns:
+        Paths of stale entries in the zip file
+    """
+    wanted_entries = {get_entry_paths(upload)[1] for upload in source_uploads}
+    with zipfile.ZipFile(fh, "r") as archive:
+        return [name for name in archive.namelist() if name not in wanted_entries]
+
+
+def get_unchanged_prefix_size(fh: typing.IO[bytes]) -> int:
+    """Determines how many leading bytes of a zip file will remain unchanged
+    when ``build_zip()`` appends entries to it, i.e. the offset of its central
+    directory, which is where new entries are written.
+
+    Args:
+        fh: Open, readable zip file handler or file-like object
+
+    Returns:
+        Size of the unchanged prefix, in bytes. This is 0 when ``fh``
+        does not contain a readable zip archive.
+    """
+    try:
+        with zipfile.ZipFile(fh, "r") as archive:
+            return archive.start_dir
+    except zipfile.BadZipFile:
+        return 0
+
+
 def load_source_uploads_from_csv(
-    s3: S3Client, bucket: str, file_key: str
+    s3: S3Client, bucket: str, file_key: str, etag: str | None = None
 ) -> typing.Iterator[UploadInfo]:
     """Downloads a CSV file from S3 and yields instances of ``UploadInfo``
     populated from its rows.
@@ -143,6 +776,8 @@ def load_source_uploads_from_csv(
         s3: S3 client for downloading the CSV file
         bucket: Name of the S3 bucket containing the CSV file object
         file_key: S3 key for the CSV file object
+        etag: (Optional) Expected ETag of the CSV file object. When provided,
+            loading fails if the object has been replaced.
 
     Returns:
         Generator of ``UploadInfo``
@@ -152,10 +787,10 @@ def load_source_uploads_from_csv(
     """
     logger = get_logger(csv_bucket=bucket, csv_file_key=file_key)
     try:
-        response = s3.get_object(
-            Bucket=bucket,
-            Key=file_key,
-        )
+        if etag:
+            response = s3.get_object(Bucket=bucket, Key=file_key, IfMatch=etag)
+        else:
+            response = s3.get_object(Bucket=bucket, Key=file_key)
     except botocore.exceptions.ClientError:
         logger.exception("error retrieving CSV file from S3")
         raise
@@ -166,11 +801,275 @@ def load_source_uploads_from_csv(
         reader = csv.DictReader(csv_file_stream, delimiter=",")
         for row in reader:
             yield UploadInfo(**row)
+    except GeneratorExit:
+        # The caller stopped iterating before all rows were read, which is not an error
+        raise
     except:
         logger.exception("error reading CSV data from S3")
         raise
 
 
+@contextlib.contextmanager
+def open_remote_archive(
+    s3: S3Client,
+    bucket: str,
+    key: str,
+    size: int | None = None,
+    etag: str | None = None,
+) -> typing.Iterator[zipfile.ZipFile | None]:
+    """Context manager that opens an existing zip file S3 object for reading
+    without downloading it. Data is retrieved with ranged GET requests as it
+    is read (see ``S3ObjectReader``), so opening the archive only retrieves
+    its central directory.
+
+    Args:
+        s3: S3 client used to read the zip file
+        bucket: Name of the S3 bucket containing the zip file
+        key: S3 key of the zip file
+        size: (Optional) Size of the zip file, if already known
+        etag: (Optional) ETag of the zip file, if already known
+
+    Yields:
+        The opened zip archive, or None when the zip file does not exist
+        or is not a readable archive.
+    """
+    logger = get_logger(s3_bucket=bucket, s3_key=key)
+    try:
+        reader = S3ObjectReader(s3, bucket, key, size=size, etag=etag)
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] != "404":
+            logger.exception("error retrieving S3 object metadata for zip file")
+            raise
+        logger.info("no existing s3 object found for zip file")
+        yield None
+        return
+
+    with io.BufferedReader(reader, DEFAULT_BUFFER_SIZE) as buffered_reader:
+        try:
+            archive = zipfile.ZipFile(buffered_reader, "r")
+        except zipfile.BadZipFile:
+            logger.warning("existing s3 object for zip file is not a readable archive")
+            yield None
+            return
+        with archive:
+            yield archive
+    logger.info(
+        "finished reading existing s3 object for zip file",
+        zip_bytes_requested=reader.bytes_requested,
+        zip_requests_made=reader.requests_made,
+    )
+
+
+def read_archive_manifest(s3: S3Client, s3_data: S3Schema) -> ArchiveManifest | None:
+    """Retrieves the manifest stored next to a zip file S3 object.
+
+    Returns:
+        The manifest, or None when it does not exist or cannot be read.
+    """
+    logger = get_logger(s3_bucket=s3_data.bucket, s3_key=s3_data.manifest_key)
+    try:
+        response = s3.get_object(Bucket=s3_data.bucket, Key=s3_data.manifest_key)
+        return ArchiveManifest.model_validate_json(response["Body"].read())
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+            logger.exception("error retrieving zip file manifest from S3")
+        return None
+    except pydantic.ValidationError:
+        logger.warning("zip file manifest in S3 is invalid")
+        return None
+
+
+def write_archive_manifest(
+    s3: S3Client, s3_data: S3Schema, manifest: ArchiveManifest
+) -> None:
+    """Stores the manifest for a zip file S3 object next to it. Since manifests
+    are rebuilt when missing, errors are logged rather than raised.
+    """
+    logger = get_logger(s3_bucket=s3_data.bucket, s3_key=s3_data.manifest_key)
+    try:
+        s3.put_object(
+            Bucket=s3_data.bucket,
+            Key=s3_data.manifest_key,
+            Body=manifest.model_dump_json().encode(),
+            ContentType="application/json",
+            ServerSideEncryption="AES256",
+        )
+    except botocore.exceptions.ClientError:
+        logger.exception("error storing zip file manifest in S3")
+        return
+    logger.info(
+        "stored zip file manifest in S3",
+        zip_entries_count=len(manifest.entries),
+        zip_etag=manifest.archive_etag,
+    )
+
+
+def get_metadata_etag(s3: S3Client, s3_data: S3Schema) -> str | None:
+    """Returns the ETag of the CSV metadata S3 object, or None when it does
+    not exist (in which case loading it fails later on).
+    """
+    try:
+        return s3.head_object(Bucket=s3_data.bucket, Key=s3_data.metadata_key)["ETag"]
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] != "404":
+            get_logger().exception("error retrieving S3 object metadata for CSV file")
+            raise
+        return None
+
+
+def get_archive_upload_args(metadata_etag: str | None) -> dict[str, typing.Any]:
+    """Returns extra arguments for uploading a zip file S3 object built from the
+    CSV metadata object with the given ETag, which is recorded in the zip file
+    object's metadata (see ``archive_matches_metadata()``).
+    """
+    extra_args: dict[str, typing.Any] = {"ServerSideEncryption": "AES256"}
+    if metadata_etag is not None:
+        extra_args["Metadata"] = {ZIP_METADATA_ETAG_KEY: metadata_etag}
+    return extra_args
+
+
+def head_remote_archive(s3: S3Client, s3_data: S3Schema) -> RemoteArchive | None:
+    """Retrieves the current version of an existing zip file S3 object.
+
+    Returns:
+        The ETag, size and user-defined metadata of the zip file object,
+        or None when it does not exist.
+    """
+    try:
+        response = s3.head_object(Bucket=s3_data.bucket, Key=s3_data.zip_key)
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] != "404":
+            get_logger().exception("error retrieving S3 object metadata for zip file")
+            raise
+        return None
+    return RemoteArchive(
+        etag=response["ETag"],
+        size=response["ContentLength"],
+        metadata=response.get("Metadata", {}),
+    )
+
+
+def archive_matches_metadata(remote_archive: RemoteArchive, metadata_etag: str) -> bool:
+    """Determines whether an existing zip file S3 object was built from the
+    current version of the CSV metadata object (identified by its ETag).
+    Such a zip file already contains every entry named in the CSV metadata.
+
+    Returns:
+        bool indicating whether the zip file object was built from the CSV
+        metadata object with ``metadata_etag``.
+    """
+    return remote_archive.metadata.get(ZIP_METADATA_ETAG_KEY) == metadata_etag
+
+
+def get_remote_archive_entry_names(
+    s3: S3Client, s3_data: S3Schema, remote_archive: RemoteArchive | None = None
+) -> set[str] | None:
+    """Determines the names of the entries in an existing zip file S3 object
+    without downloading it.
+
+    The entries are read from the zip file's manifest when it is current (i.e. it
+    was built for the zip file's current ETag). Otherwise, they are read from the
+    central directory of the zip file (using ranged GET requests), and the manifest
+    is rebuilt from it.
+
+    Args:
+        s3: S3 client used to read the zip file and its manifest
+        s3_data: Locations of the zip file and its manifest in S3
+        remote_archive: (Optional) Version of the zip file to read, as returned
+            by ``head_remote_archive()``. When omitted, the current version is
+            retrieved.
+
+    Returns:
+        Set of entry names, or None when the zip file does not exist or is unreadable.
+    """
+    logger = get_logger()
+    if remote_archive is None:
+        remote_archive = head_remote_archive(s3, s3_data)
+    if remote_archive is None:
+        logger.info("no existing s3 object found for zip file")
+        return None
+
+    if ARCHIVE_MANIFEST_ENABLED:
+        manifest = read_archive_manifest(s3, s3_data)
+        if manifest is not None and manifest.archive_etag == remote_archive.etag:
+            logger.info("read zip file entries from manifest")
+            return {entry.name for entry in manifest.entries}
+        logger.info("zip file manifest is missing or inconsistent; rebuilding it")
+
+    with open_remote_archive(
+        s3,
+        s3_data.bucket,
+        s3_data.zip_key,
+        size=remote_archive.size,
+        etag=remote_archive.etag,
+    ) as archive:
+        if archive is None:
+            return None
+        if ARCHIVE_MANIFEST_ENABLED:
+            write_archive_manifest(
+                s3,
+                s3_data,
+                ArchiveManifest.from_archive(archive, archive_etag=remote_archive.etag),
+            )
+        return set(archive.namelist())
+
+
+@tracer.wrap()
+def remote_archive_is_complete(
+    s3: S3Client,
+    s3_data: S3Schema,
+    remote_archive: RemoteArchive | None = None,
+    source_uploads: typing.Iterable[UploadInfo] | None = None,
+) -> bool:
+    """Determines whether an existing zip file S3 object already contains an entry
+    for every file named in the CSV metadata, without downloading the zip file.
+
+    Only the manifest or the central directory of the zip file is retrieved
+    (see ``get_remote_archive_entry_names()``), so the cost of this check scales
+    with the number of entries in the zip file rather than its total size.
+
+    Args:
+        s3: S3 client used to read the zip file and stream the CSV metadata
+        s3_data: Locations of the zip file and CSV metadata objects in S3
+        remote_archive: (Optional) Version of the zip file to check, as returned
+            by ``head_remote_archive()``. When omitted, the current version is
+            retrieved.
+        source_uploads: (Optional) Uploads already read from the CSV metadata.
+            When omitted, the CSV metadata is streamed from S3.
+
+    Returns:
+        bool indicating whether every entry named in the CSV metadata is present
+        in the zip file. False when the zip file does not exist or is unreadable.
+    """
+    logger = get_logger()
+    existing_entries = get_remote_archive_entry_names(s3, s3_data, remote_archive)
+    if existing_entries is None:
+        return False
+    logger = logger.bind(zip_entries_count=len(existing_entries))
+
+    if source_uploads is None:
+        source_uploads = load_source_uploads_from_csv(
+            s3, s3_data.bucket, s3_data.metadata_key
+        )
+    files_checked = 0
+    for upload in source_uploads:
+        files_checked += 1
+        _, path_in_zip = get_entry_paths(upload)
+        if path_in_zip not in existing_entries:
+            logger.info(
+                "existing s3 object for zip file is missing entries from CSV metadata",
+                missing_entry_path=path_in_zip,
+                files_checked=files_checked,
+            )
+            return False
+
+    logger.info(
+        "existing s3 object for zip file contains all entries from CSV metadata",
+        files_checked=files_checked,
+    )
+    return True
+
+
 def build_url(base_url: str, endpoint: str = ""):
     """Combines a base URL or domain name with a given endpoint.
 
@@ -267,19 +1166,114 @@ def notify_user(
         raise
 
 
+def get_compression_policy() -> CompressionPolicy | None:
+    """Returns the policy for compressing new zip entries, or None when entries
+    are stored without compression (i.e. ``ZIP_COMPRESSION`` is ``stored``).
+    """
+    if ZIP_COMPRESS_TYPE == zipfile.ZIP_STORED:
+        return None
+    return CompressionPolicy(
+        compress_type=ZIP_COMPRESS_TYPE,
+        compress_level=ZIP_COMPRESS_LEVEL,
+        stored_extensions=ZIP_STORED_EXTENSIONS,
+        compressed_extensions=ZIP_COMPRESSED_EXTENSIONS,
+        probe_size=ZIP_COMPRESSION_PROBE_BYTES,
+    )
+
+
+@functools.cache
+def get_archive_cache() -> ArchiveCache | None:
+    """Returns the archive cache shared by all messages handled in this process,
+    or None when caching is disabled (i.e. ``ARCHIVE_CACHE_DIR`` is not set).
+    """
+    if not ARCHIVE_CACHE_DIR:
+        return None
+    return ArchiveCache(ARCHIVE_CACHE_DIR, ARCHIVE_CACHE_MAX_BYTES)
+
+
+@tracer.wrap()
+def download_archive(
+    s3: S3Client,
+    bucket: str,
+    key: str,
+    fh: typing.IO[bytes],
+    remote_archive: RemoteArchive | None = None,
+) -> str:
+    """Writes the contents of an existing zip archive S3 object to ``fh``,
+    from the archive cache when it holds a current copy.
+
+    Args:
+        s3: S3 client used to download the zip file
+        bucket: Name of the S3 bucket containing the zip file
+        key: S3 key of the zip file
+        fh: Writeable binary file-like object for the zip file contents
+        remote_archive: (Optional) Version of the zip file to download, as returned
+            by ``head_remote_archive()``. When provided, the download fails if the
+            object is no longer that version. When omitted, the current version
+            is downloaded.
+
+    Returns:
+        The ETag of the downloaded S3 object.
+
+    Raises:
+        botocore.exceptions.ClientError: When the object does not exist
+            (with a ``404`` error code) or cannot be downloaded.
+    """
+    size = etag = None
+    if remote_archive is not None:
+        size, etag = remote_archive.size, remote_archive.etag
+    if (archive_cache := get_archive_cache()) is not None:
+        return archive_cache.fetch(
+            s3, bucket, key, fh, S3_TRANSFER_SETTINGS, size=size, etag=etag
+        )
+    if size is None or etag is None:
+        response = s3.head_object(Bucket=bucket, Key=key)
+        size, etag = response["ContentLength"], response["ETag"]
+    download_fileobj(s3, bucket, key, fh, size, S3_TRANSFER_SETTINGS, etag=etag)
+    return etag
+
+
 @tracer.wrap()
 def process_sqs_message_request(
-    s3: S3Client, ses: SESClient, message_data: MessageSchema, local_file: _TemporaryFileWrapper
-):
+    s3: S3Client,
+    ses: SESClient,
+    message_data: MessageSchema,
+    local_file: _TemporaryFileWrapper,
+    user_emails: typing.Sequence[str] | None = None,
+    notifier: BackgroundNotifier | None = None,
+    metrics: JobMetrics | None = None,
+) -> list[concurrent.futures.Future]:
     """Handles work for a single SQS message, orchestrating the following steps:
 
-    1. Downloads a zip file S3 object (if it exists) to ``local_file``
-    2. Streams a CSV object from S3 and uses its contents to determine
-        updates to the downloaded zip file.
+    1. Reads the CSV metadata object from S3 once, and (unless disabled) checks
+        that every source file it names exists (see ``preflight_source_uploads()``)
+        before any zip file is read or written. Then downloads a zip file S3 object
+        (if it exists) to ``local_file``, unless it was built from the current CSV
+        metadata object (according to their ETags; see ``archive_matches_metadata()``)
+        or its central directory shows that it already contains every entry named
+        in the CSV metadata (see ``remote_archive_is_complete()``), in which case
+        steps 2 and 3 are skipped. A current copy in the archive cache is used
+        instead of downloading, when available. The zip file object is looked up
+        only once (see ``head_remote_archive()``), and every later step reads that
+        version of it.
+    2. Uses the rows of the CSV metadata to determine updates to the downloaded
+        zip file. When the zip file is being recreated, it is instead written
+        directly to a multipart S3 upload as it is built, without using
+        ``local_file``; entries of the extant S3 object are reused (copied using
+        ranged reads) rather than read from local files. Likewise, when the
+        downloaded zip file contains stale entries that are no longer named in the
+        CSV metadata, it is compacted by copying the remaining entries into a new
+        zip file that is streamed to S3.
     3. If changes were made to the downloaded zip file, it is uploaded to S3,
-        potentially replacing an extant S3 object.
-    4. Notifies a user identified in the SQS message that the new/updated zip file
-        is ready for download.
+        potentially replacing an extant S3 object. When entries were only appended
+        to a downloaded zip file, its unchanged leading bytes are copied server-side
+        from the extant S3 object rather than uploaded again. The final zip file
+        is kept in the archive cache (when enabled) for later messages, and the
+        ETag of the CSV metadata object is recorded in its S3 object metadata.
+    4. Notifies a user identified in the SQS message (or each of ``user_emails``)
+        that the new/updated zip file is ready for download. When a ``notifier`` is
+        provided, notifications are submitted to it rather than sent before
+        returning.
 
     Args:
         s3: S3 client used to download, upload, and stream objects
@@ -287,6 +1281,17 @@ def process_sqs_message_request(
         message_data: Work parameters provided by SQS
         local_file: An open, read/write binary file-like object that will be used
             to store zip file contents while the function is running.
+        user_emails: (Optional) Email addresses of the users to notify.
+            Defaults to the ``user_email`` provided in ``message_data``.
+        notifier: (Optional) Background notifier used to send notifications
+        metrics: (Optional) Job metrics to which the time, bytes and item counts
+            of each step are added (as the ``"preflight"``, ``"csv_stream"``,
+            ``"plan"``, ``"download"``, ``"diff"``, ``"entry_writes"``, ``"upload"``
+            and ``"notify"`` stages)
+
+    Returns:
+        Futures for the notifications submitted to ``notifier``, which resolve once
+        each notification is sent (empty when no ``notifier`` is provided).
     """
     # Get the S3 object if it already exists.
     # If 404, assume it doesn't & create from scratch.
@@ -297,17 +1302,82 @@ def process_sqs_message_request(
     s3_bucket = message_data.s3.bucket
     s3_key = message_data.s3.zip_key
     logger = get_logger()
+    if metrics is None:
+        metrics = JobMetrics()
 
     # Step 1 - Download the existing zip archive from S3 if exists and not force recreating
-    if message_data.recreate_archive:
-        logger.info("zip file recreation requested, skipping download from S3")
-    else:
+    metadata_etag: str | None = None
+    archive_is_complete = False
+    download_existing_zip = False
+    existing_zip_etag: str | None = None
+    unchanged_prefix_size = 0
+    # The CSV metadata is read once, and missing source files would fail the build
+    # part-way, so they are checked for before any zip file I/O. Source files are
+    # listed at most once for the message, and only if needed.
+    source_backend = get_source_backend(s3)
+    with metrics.stage("preflight"):
+        if ARCHIVE_MANIFEST_ENABLED or SKIP_UNCHANGED_METADATA_ENABLED:
+            metadata_etag = get_metadata_etag(s3, message_data.s3)
+        source_data = list(
+            metrics.timed_iter(
+                "csv_stream",
+                load_source_uploads_from_csv(
+                    s3,
+                    message_data.s3.bucket,
+                    message_data.s3.metadata_key,
+                    metadata_etag,
+                ),
+                count_name="uploads",
+            )
+        )
+        if SOURCE_PREFLIGHT_ENABLED:
+            preflight_source_uploads(source_data, source_backend)
+
+    # Every step reads the version of the zip file found by a single HEAD request
+    remote_archive: RemoteArchive | None = None
+    with metrics.stage("plan"):
+        if message_data.recreate_archive:
+            logger.info("zip file recreation requested, skipping download from S3")
+        elif (remote_archive := head_remote_archive(s3, message_data.s3)) is None:
+            logger = logger.bind(updating_existing_zip_file_from_s3=False)
+            logger.info("no existing s3 object found for zip file")
+        elif (
+            SKIP_UNCHANGED_METADATA_ENABLED
+            and metadata_etag is not None
+            and archive_matches_metadata(remote_archive, metadata_etag)
+        ):
+            # The zip file was built from this exact CSV metadata (e.g. for a
+            # redelivered or repeated message), so there is nothing to read or update.
+            archive_is_complete = True
+            logger.info(
+                "existing s3 object for zip file was built from current CSV metadata, "
+                "skipping download"
+            )
+        elif REMOTE_PLAN_ENABLED and remote_archive_is_complete(
+            s3, message_data.s3, remote_archive, source_data
+        ):
+            # The central directory shows nothing to add, so skip the download entirely
+            archive_is_complete = True
+            logger.info(
+                "existing s3 object for zip file is complete, skipping download"
+            )
+        else:
+            download_existing_zip = True
+
+    if download_existing_zip:
         try:
-            s3.download_fileobj(s3_bucket, s3_key, local_file)
+            # If the object is replaced after this, copying its unchanged prefix
+            # during upload fails on the ETag precondition rather than mixing data.
+            with metrics.stage("download") as download_metrics:
+                existing_zip_etag = download_archive(
+                    s3, s3_bucket, s3_key, local_file, remote_archive
+                )
+                download_metrics.add(bytes=local_file.seek(0, os.SEEK_END))
+            unchanged_prefix_size = get_unchanged_prefix_size(local_file)
             logger = logger.bind(updating_existing_zip_file_from_s3=True)
             logger.info("downloaded existing s3 object for zip file")
         except botocore.exceptions.ClientError as e:
-            if e.response["Error"]["Code"] != "404":
+            if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
                 logger.exception("error downloading S3 object")
                 raise
             else:
@@ -315,119 +1385,733 @@ def process_sqs_message_request(
                 logger.info("no existing s3 object found for zip file")
 
     # Step 2 - Add or update contents of the zipfile with the new metadata
-    try:
-        source_data = load_source_uploads_from_csv(
-            s3, message_data.s3.bucket, message_data.s3.metadata_key
-        )
-        zip_has_updates = build_zip(local_file, source_data)
-        logger.info(
-            "local zip file contains all entries from CSV metadata",
-            zip_updated=zip_has_updates,
-        )
-    except:
-        logger.exception("error building zip archive")
-        raise
-
-    # Step 3 - Upload the zip archive back to S3
-    if zip_has_updates:
+    zip_has_updates = False
+    # Recreated archives have nothing to append to, so they can be streamed to S3
+    stream_to_s3 = message_data.recreate_archive and STREAMING_UPLOAD_ENABLED
+    if not archive_is_complete:
         try:
-            local_file.seek(0)
-            s3.upload_fileobj(
-                local_file,
-                s3_bucket,
-                s3_key,
-                ExtraArgs={"ServerSideEncryption": "AES256"},
+            compact = False
+            if (
+                ARCHIVE_COMPACTION_ENABLED
+                and STREAMING_UPLOAD_ENABLED
+                and existing_zip_etag is not None
+            ):
+                with metrics.stage("diff"):
+                    stale_entries = get_stale_entry_paths(local_file, source_data)
+                if stale_entries:
+                    # Entries are copied from the downloaded zip file into a new one
+                    compact = stream_to_s3 = True
+                    logger.info(
+                        "compacting zip file to remove stale entries",
+                        stale_entries_count=len(stale_entries),
+                    )
+            build_options: dict[str, typing.Any] = {
+                "compression": get_compression_policy(),
+                "compress_workers": ZIP_COMPRESS_WORKERS,
+                "source_backend": source_backend,
+                "prefetch_workers": ZIP_PREFETCH_WORKERS,
+                "max_pending_bytes": ZIP_PREFETCH_MAX_BYTES,
+                "metrics": metrics,
+            }
+            if stream_to_s3:
+                # The upload runs throughout the build, so its time overlaps
+                # with that of other stages.
+                upload_started = time.perf_counter()
+                manifest: ArchiveManifest | None = None
+
+                def index_archive(archive: zipfile.ZipFile) -> None:
+                    nonlocal manifest
+                    # Every entry has been written, so the central directory is next
+                    manifest = ArchiveManifest.from_archive(
+                        archive,
+                        central_directory_offset=writer.bytes_written,
+                        metadata_etag=metadata_etag,
+                    )
+
+                with contextlib.ExitStack() as stack:
+                    previous_archive: zipfile.ZipFile | None = None
+                    if compact:
+                        previous_archive = stack.enter_context(
+                            zipfile.ZipFile(local_file, "r")
+                        )
+                    elif RECREATE_REUSE_ENTRIES_ENABLED:
+                        # Reuse entries of the existing S3 object, which stays
+                        # readable until the replacement upload completes.
+                        previous_archive = stack.enter_context(
+                            open_remote_archive(s3, s3_bucket, s3_key)
+                        )
+                    writer = stack.enter_context(
+                        MultipartUploadWriter(
+                            s3,
+                            s3_bucket,
+                            s3_key,
+                            extra_args=get_archive_upload_args(metadata_etag),
+                        )
+                    )
+                    zip_has_updates = build_zip(
+                        typing.cast(typing.IO[bytes], writer),
+                        iter(source_data),
+                        mode="w",
+                        previous_archive=previous_archive,
+                        on_written=(
+                            index_archive if ARCHIVE_MANIFEST_ENABLED else None
+                        ),
+                        **build_options,
+                    )
+                    if not zip_has_updates:
+                        writer.abort()
+                if zip_has_updates:
+                    metrics.get("upload").add(
+                        seconds=time.perf_counter() - upload_started,
+                        bytes=writer.bytes_written,
+                        streamed_uploads=1,
+                    )
+                    get_statsd().distribution(
+                        "archive.bytes",
+                        writer.bytes_written,
+                        tags=organization_tags(message_data.organization_id),
+                    )
+                if zip_has_updates and manifest is not None:
+                    manifest.archive_etag = writer.etag
+                    write_archive_manifest(s3, message_data.s3, manifest)
+            else:
+                zip_has_updates = build_zip(
+                    local_file, iter(source_data), **build_options
+                )
+            logger.info(
+                "local zip file contains all entries from CSV metadata",
+                zip_updated=zip_has_updates,
             )
-            logger.info("zip file uploaded to s3")
         except:
-            logger.exception("error uploading zip archive to s3")
+            # Unless a more specific stage (e.g. "diff") already failed, the error
+            # was raised while writing entries, or while streaming them to S3
+            metrics.record_failure("upload" if stream_to_s3 else "entry_writes")
+            logger.exception("error building zip archive")
             raise
+
+    # Step 3 - Upload the zip archive back to S3, keeping its contents in the cache
+    # and its manifest next to it
+    archive_cache = get_archive_cache()
+    if zip_has_updates and stream_to_s3:
+        if archive_cache is not None:
+            archive_cache.discard(s3_bucket, s3_key)
+        logger.info("zip file uploaded to s3 while it was built")
+    elif zip_has_updates:
+        zip_size = local_file.seek(0, os.SEEK_END)
+        get_statsd().distribution(
+            "archive.bytes",
+            zip_size,
+            tags=organization_tags(message_data.organization_id),
+        )
+        # Uploading may close local_file, so it is indexed and cached beforehand
+        manifest = None
+        if ARCHIVE_MANIFEST_ENABLED:
+            with zipfile.ZipFile(local_file, "r") as archive:
+                manifest = ArchiveManifest.from_archive(
+                    archive, metadata_etag=metadata_etag
+                )
+        cache_storing: contextlib.AbstractContextManager[
+            typing.Callable[[str], None] | None
+        ] = (
+            archive_cache.storing(s3_bucket, s3_key, local_file)
+            if archive_cache is not None
+            else contextlib.nullcontext()
+        )
+        with (
+            cache_storing as set_cached_etag,
+            metrics.stage("upload") as upload_metrics,
+        ):
+            try:
+                if (
+                    APPEND_UPLOAD_ENABLED
+                    and existing_zip_etag is not None
+                    and unchanged_prefix_size >= MIN_PART_SIZE
+                ):
+                    # Only entries appended after the old central directory need uploading
+                    appended_size = zip_size - unchanged_prefix_size
+                    upload_metrics.add(
+                        bytes=appended_size, copied_bytes=unchanged_prefix_size
+                    )
+                    part_size = S3_TRANSFER_SETTINGS.choose_part_size(appended_size)
+                    with log_transfer_throughput(
+                        "append", s3_bucket, s3_key, appended_size, part_size=part_size
+                    ):
+                        uploaded_etag = upload_appended_object(
+                            s3,
+                            local_file,
+                            s3_bucket,
+                            s3_key,
+                            source_etag=existing_zip_etag,
+                            unchanged_size=unchanged_prefix_size,
+                            part_size=part_size,
+                            extra_args=get_archive_upload_args(metadata_etag),
+                        )
+                else:
+                    upload_metrics.add(bytes=zip_size)
+                    local_file.seek(0)
+                    uploaded_etag = upload_fileobj(
+                        s3,
+                        local_file,
+                        s3_bucket,
+                        s3_key,
+                        zip_size,
+                        S3_TRANSFER_SETTINGS,
+                        extra_args=get_archive_upload_args(metadata_etag),
+                    )
+                logger.info("zip file uploaded to s3")
+            except:
+                logger.exception("error uploading zip archive to s3")
+                raise
+            if set_cached_etag is not None:
+                set_cached_etag(uploaded_etag)
+            if manifest is not None:
+                manifest.archive_etag = uploaded_etag
+                write_archive_manifest(s3, message_data.s3, manifest)
     else:
         logger.info("skipped uploading zip file to s3 because there are no changes")
+        if archive_cache is not None and existing_zip_etag is not None:
+            archive_cache.store(s3_bucket, s3_key, existing_zip_etag, local_file)
 
     # Step 4 - Notify user and download link via email
+    # (only the time to submit notifications, when sent in the background)
+    notifications: list[concurrent.futures.Future] = []
+    with metrics.stage("notify") as notify_metrics:
+        for user_email in user_emails or [message_data.user_email]:
+            notify_metrics.add(notifications=1)
+            if notifier is not None:
+                notifications.append(
+                    notifier.submit(
+                        notify_user, ses, user_email, message_data.organization_id
+                    )
+                )
+                continue
+            try:
+                notify_user(ses, user_email, message_data.organization_id)
+            except:
+                get_logger().exception("error sending user notification")
+                raise
+    return notifications
+
+
+def visibility_heartbeat(
+    sqs: SQSClient,
+    receipt_handles: typing.Sequence[str],
+    shutdown_handler: ShutdownHandler | None = None,
+) -> contextlib.AbstractContextManager:
+    """Returns a context manager that extends the visibility timeout of in-flight
+    SQS messages while it is active, or a no-op context manager when heartbeats are
+    disabled (i.e. ``VISIBILITY_HEARTBEAT_INTERVAL_SECONDS`` is 0 or less).
+    """
+    if VISIBILITY_HEARTBEAT_INTERVAL_SECONDS <= 0:
+        return contextlib.nullcontext()
+    return VisibilityHeartbeat(
+        sqs,
+        TASK_QUEUE_URL,
+        receipt_handles,
+        interval_seconds=VISIBILITY_HEARTBEAT_INTERVAL_SECONDS,
+        visibility_timeout_seconds=VISIBILITY_HEARTBEAT_TIMEOUT_SECONDS,
+        shutdown_handler=shutdown_handler,
+    )
+
+
+def coalesce_messages(
+    messages: typing.Sequence[MessageTypeDef],
+) -> list[list[MessageTypeDef]]:
+    """Groups SQS messages that request an export of the same organization's data
+    to the same S3 objects, so that each group can be handled with a single build.
+
+    Messages that cannot be parsed are each placed in their own group, so that
+    errors are reported for them individually by ``handle_messages()``.
+
+    Args:
+        messages: Messages received from SQS
+
+    Returns:
+        List of message groups, in the order their first message was received.
+    """
+    groups: dict[typing.Hashable, list[MessageTypeDef]] = {}
+    for message in messages:
+        key: typing.Hashable
+        try:
+            data = MessageSchema.model_validate_json(message["Body"])
+            key = (
+                data.organization_id,
+                data.s3.bucket,
+                data.s3.zip_key,
+                data.s3.metadata_key,
+            )
+        except pydantic.ValidationError:
+            key = message["ReceiptHandle"]
+        groups.setdefault(key, []).append(message)
+    return list(groups.values())
+
+
+def handle_messages(
+    sqs: SQSClient,
+    s3: S3Client,
+    ses: SESClient,
+    messages: typing.Sequence[MessageTypeDef],
+    shutdown_handler: ShutdownHandler | None = None,
+    notifier: BackgroundNotifier | None = None,
+):
+    """Processes one or more SQS messages that request the same export
+    (see ``coalesce_messages()``) with a single build, and then deletes them
+    if no unhandled errors occurred during processing.
+
+    When a ``notifier`` is provided, this function returns once the export is
+    built (releasing its temporary file), without waiting for users to be notified.
+    The messages are instead deleted once every notification has been sent,
+    and their visibility timeout is extended until then (see
+    ``delete_messages_when_notified()``).
+
+    When there are multiple messages, the archive is recreated if any of them
+    requested it, and each distinct recipient is notified once.
+
+    The time and bytes spent in each stage of processing are reported as metrics
+    of the current trace span, in one summary log event (see ``JobMetrics``),
+    and as DogStatsD metrics (see ``emit_job_metrics()``).
+
+    While the messages are processed, their visibility timeout is periodically
+    extended (every ``VISIBILITY_HEARTBEAT_INTERVAL_SECONDS``, if greater than 0)
+    so that long-running work is not duplicated by another worker receiving
+    the same messages.
+
+    Args:
+        sqs: SQS client used to delete messages from the queue at ``TASK_QUEUE_URL``
+        s3: S3 client used for processing work indicated by the messages
+        ses: SES client used to notify users that work is complete
+        messages: Messages received from SQS
+        shutdown_handler: (Optional) When provided, visibility timeout extensions
+            stop once a shutdown has been requested.
+        notifier: (Optional) Background notifier used to send notifications
+    """
+    logger = get_logger()
+    receipt_handles = [message["ReceiptHandle"] for message in messages]
+    with tracer.trace("arpa_exporter.handle_message", span_type="process"):
+        if len(receipt_handles) == 1:
+            structlog.contextvars.bind_contextvars(
+                sqs_message_receipt_handle=receipt_handles[0]
+            )
+        else:
+            structlog.contextvars.bind_contextvars(
+                sqs_message_receipt_handles=receipt_handles
+            )
+        logger.info("received message from SQS", messages_count=len(messages))
+        requests: list[MessageSchema] = []
+        for message in messages:
+            try:
+                raw_data = json.loads(message["Body"])
+            except json.JSONDecodeError:
+                # This is a problem with the message, not the worker, so don't re-raise
+                logger.exception("error parsing request data from SQS message")
+                return
+
+            try:
+                requests.append(MessageSchema(**raw_data))
+            except pydantic.ValidationError:
+                # This is potentially a problem with the message, not the worker,
+                # so don't re-raise
+                logger.exception("SQS message data did not match expected schema")
+                return
+
+        data = requests[0].model_copy(
+            update={"recreate_archive": any(r.recreate_archive for r in requests)}
+        )
+        user_emails = list(dict.fromkeys(r.user_email for r in requests))
+
+        with contextlib.ExitStack() as heartbeat:
+            with tempfile.NamedTemporaryFile() as tfh:
+                with structlog.contextvars.bound_contextvars(
+                    s3_bucket=data.s3.bucket,
+                    s3_zip_key=data.s3.zip_key,
+                    s3_metadata_key=data.s3.metadata_key,
+                    destination_file_path=tfh.name,
+                    destination_file_mode=tfh.mode,
+                    recreate_archive=data.recreate_archive,
+                ):
+                    metrics = JobMetrics()
+                    succeeded = False
+                    started = time.perf_counter()
+                    try:
+                        heartbeat.enter_context(
+                            visibility_heartbeat(sqs, receipt_handles, shutdown_handler)
+                        )
+                        notifications = process_sqs_message_request(
+                            s3,
+                            ses,
+                            data,
+                            tfh,
+                            user_emails=user_emails,
+                            notifier=notifier,
+                            metrics=metrics,
+                        )
+                        succeeded = True
+                    except:
+                        logger.info(
+                            "error processing SQS message request for ARPA data export"
+                        )
+                        raise
+                    finally:
+                        metrics.set_span_metrics(tracer.current_span())
+                        metrics.log_summary(
+                            logger,
+                            organization_id=data.organization_id,
+                            succeeded=succeeded,
+                        )
+                        emit_job_metrics(
+                            metrics,
+                            data.organization_id,
+                            messages_count=len(messages),
+                            seconds=time.perf_counter() - started,
+                            succeeded=succeeded,
+                        )
+            if notifier is not None and notifications:
+                # The heartbeat is stopped once notifications are sent
+                delete_messages_when_notified(
+                    sqs, receipt_handles, notifications, heartbeat.pop_all()
+                )
+                return
+
+    delete_messages(sqs, receipt_handles)
+
+
+def emit_job_metrics(
+    metrics: JobMetrics,
+    organization_id: int | str,
+    messages_count: int,
+    seconds: float,
+    succeeded: bool,
+):
+    """Sends DogStatsD metrics for an export job, tagged with ``organization_id``:
+
+    - ``messages.processed``: messages handled by the job (count, tagged with
+        ``status`` of ``success`` or ``failure``)
+    - ``job.duration``: wall time of the job (distribution, in seconds)
+    - ``job.failures``: failed jobs (count, tagged with the ``stage`` that failed)
+    - The metrics of each stage (see ``JobMetrics.emit()``)
+    """
+    statsd = get_statsd()
+    status = "success" if succeeded else "failure"
+    tags = organization_tags(organization_id)
+    statsd.increment(
+        "messages.processed", messages_count, tags=[*tags, f"status:{status}"]
+    )
+    statsd.distribution("job.duration", seconds, tags=[*tags, f"status:{status}"])
+    if not succeeded:
+        statsd.increment(
+            "job.failures", tags=[*tags, f"stage:{metrics.failed_stage or 'other'}"]
+        )
+    metrics.emit(statsd, tags)
+
+
+def delete_messages_when_notified(
+    sqs: SQSClient,
+    receipt_handles: typing.Sequence[str],
+    notifications: typing.Sequence[concurrent.futures.Future],
+    heartbeat: contextlib.ExitStack,
+):
+    """Deletes processed SQS messages once every notification for them has been
+    sent (i.e. accepted by SES). The messages are not deleted if any notification
+    could not be sent, so that they are received and handled again once their
+    visibility timeout lapses.
+
+    Args:
+        sqs: SQS client used to delete messages from the queue at ``TASK_QUEUE_URL``
+        receipt_handles: Receipt handles of the processed messages
+        notifications: Futures for the notifications sent for the messages
+            (see ``BackgroundNotifier.submit()``)
+        heartbeat: Visibility heartbeat of the messages, which is stopped (closed)
+            once the notifications are done
+    """
+    logger = get_logger()
+    logger.info(
+        "waiting for notifications before deleting SQS messages",
+        notifications_count=len(notifications),
+    )
+    context = contextvars.copy_context()
+
+    def settle(notifications: typing.Sequence[concurrent.futures.Future]):
+        heartbeat.close()
+        if any(future.exception() is not None for future in notifications):
+            logger.error(
+                "not deleting SQS messages because user notification failed",
+                notifications_failed_count=sum(
+                    future.exception() is not None for future in notifications
+                ),
+            )
+            return
+        try:
+            delete_messages(sqs, receipt_handles)
+        except Exception:
+            # Already logged; the messages will be received again
+            pass
+
+    when_all_done(notifications, lambda futures: context.run(settle, futures))
+
+
+def delete_messages(sqs: SQSClient, receipt_handles: typing.Sequence[str]):
+    """Deletes successfully processed SQS messages from the queue
+    at ``TASK_QUEUE_URL``.
+    """
+    logger = get_logger()
+    with tracer.trace("cleanup_message", span_type="settle"):
+        if len(receipt_handles) == 1:
+            try:
+                sqs.delete_message(
+                    QueueUrl=TASK_QUEUE_URL, ReceiptHandle=receipt_handles[0]
+                )
+            except:
+                logger.exception(
+                    "could not delete SQS message after it was succcessfully processed"
+                )
+                raise
+        else:
+            try:
+                response = sqs.delete_message_batch(
+                    QueueUrl=TASK_QUEUE_URL,
+                    Entries=[
+                        {"Id": str(i), "ReceiptHandle": receipt_handle}
+                        for i, receipt_handle in enumerate(receipt_handles)
+                    ],
+                )
+            except:
+                logger.exception(
+                    "could not delete SQS messages after they were succcessfully processed"
+                )
+                raise
+            if failed := response.get("Failed", []):
+                logger.error(
+                    "could not delete some SQS messages after they were succcessfully processed",
+                    failures=[f.get("Message", f["Code"]) for f in failed],
+                )
+                raise RuntimeError(f"failed to delete {len(failed)} SQS message(s)")
+
+
+def release_messages(sqs: SQSClient, messages: typing.Sequence[MessageTypeDef]):
+    """Makes received SQS messages that will not be handled by this worker visible
+    again at once, instead of once their visibility timeout lapses, so that they
+    can be received again without delay.
+
+    Errors are logged but not raised, since the messages become visible again
+    once their visibility timeout lapses anyway.
+    """
+    logger = get_logger()
+    logger.info(
+        "releasing SQS messages that cannot be handled yet",
+        messages_count=len(messages),
+    )
     try:
-        notify_user(ses, message_data.user_email, message_data.organization_id)
-    except:
-        get_logger().exception("error sending user notification")
-        raise
+        response = sqs.change_message_visibility_batch(
+            QueueUrl=TASK_QUEUE_URL,
+            Entries=[
+                {
+                    "Id": str(i),
+                    "ReceiptHandle": message["ReceiptHandle"],
+                    "VisibilityTimeout": 0,
+                }
+                for i, message in enumerate(messages)
+            ],
+        )
+    except botocore.exceptions.ClientError:
+        logger.exception("error releasing SQS messages")
+        return
+    if failed := response.get("Failed", []):
+        logger.error(
+            "could not release some SQS messages",
+            failures=[f.get("Message", f["Code"]) for f in failed],
+        )
 
 
 @tracer.wrap()
 @reset_contextvars
-def handle_work(sqs: SQSClient, s3: S3Client, ses: SESClient):
-    """Receives up to 1 message from SQS, processes it, and then deletes it
-    if no unhandled errors occurred during processing.
+def handle_work(
+    sqs: SQSClient,
+    s3: S3Client,
+    ses: SESClient,
+    pool: WorkerPool | None = None,
+    shutdown_handler: ShutdownHandler | None = None,
+    notifier: BackgroundNotifier | None = None,
+):
+    """Receives a batch of messages from SQS and processes them with
+    ``handle_messages()``.
+
+    When ``COALESCE_MESSAGES_ENABLED`` is true, a full batch (up to 10 messages)
+    is received, and messages in it that request the same export are grouped and
+    handled together (see ``coalesce_messages()``). Otherwise, each message is
+    handled on its own, and no more messages are received than can be handled
+    at once (i.e. one at a time, or one per free worker). Either way, since the
+    visibility timeout of a message is only extended once its handling starts,
+    messages that cannot be handled right away are made visible again at once
+    (see ``release_messages()``), so that they are received again later or by
+    another worker.
+
+    When a ``pool`` is provided, this function first waits for at least one of its
+    workers to be free. Each message (or group of messages) is processed by its
+    own worker, in its own copy of the current context, so that log context values
+    and trace spans bound for one message do not leak into another. This function
+    returns without waiting for the messages to be handled, so that more messages
+    can be received as soon as any worker is free.
 
     Args:
-        sqs: SQS client used to receive and delete a message from the queue at ``TASK_QUEUE_URL``
-        s3: S3 client used for processing work indicated by a received  SQS message
+        sqs: SQS client used to receive and delete messages from the queue at ``TASK_QUEUE_URL``
+        s3: S3 client used for processing work indicated by received SQS messages
         ses: SES client used to notify users that work is complete
+        pool: (Optional) Worker pool used to process received messages concurrently.
+            When omitted, messages are processed one at a time before this function
+            returns.
+        shutdown_handler: (Optional) Passed to ``handle_messages()``. When provided,
+            this function returns without receiving messages if a shutdown is
+            requested while waiting for a free worker.
+        notifier: (Optional) Passed to ``handle_messages()``.
+
+    Raises:
+        The first exception raised while handling any message. When a ``pool``
+        is provided, this is raised by a later call, once the message that
+        failed has been handled.
     """
     logger = get_logger()
+    free_workers = 1
+    if pool is not None:
+        while not (free_workers := pool.reserve(10, timeout=1)):
+            if (
+                shutdown_handler is not None
+                and shutdown_handler.is_shutdown_requested()
+            ):
+                return
+
     logger.info("long-polling next SQS message batch")
     try:
         response = sqs.receive_message(
             QueueUrl=TASK_QUEUE_URL,
-            MaxNumberOfMessages=1,
+            MaxNumberOfMessages=10 if COALESCE_MESSAGES_ENABLED else free_workers,
             WaitTimeSeconds=TASK_QUEUE_RECEIVE_TIMEOUT,
         )
-        message = response.get("Messages", [])[0]
     except botocore.exceptions.ClientError:
         logger.exception("error polling SQS for messages")
+        if pool is not None:
+            pool.release(free_workers)
         raise
-    except IndexError:
+
+    messages = response.get("Messages", [])
+    if len(messages) == 0:
         # This is normal when there are no available messages in the queue
         logger.info("empty message batch received from SQS")
+        get_statsd().increment("sqs.empty_polls")
+        if pool is not None:
+            pool.release(free_workers)
         return
+    logger.info("received message batch from SQS", messages_count=len(messages))
+    get_statsd().increment("sqs.messages_received", len(messages))
 
-    with tracer.trace("arpa_exporter.handle_message", span_type="process"):
-        structlog.contextvars.bind_contextvars(
-            sqs_message_receipt_handle=message["ReceiptHandle"]
+    if COALESCE_MESSAGES_ENABLED:
+        message_groups = coalesce_messages(messages)
+        logger.info(
+            "coalesced SQS messages requesting the same export",
+            messages_count=len(messages),
+            message_groups_count=len(message_groups),
         )
-        logger.info("received message from SQS")
-        try:
-            raw_data = json.loads(message["Body"])
-        except json.JSONDecodeError:
-            # This is a problem with the message, not the worker, so don't re-raise
-            logger.exception("error parsing request data from SQS message")
-            return
-
-        try:
-            data = MessageSchema(**raw_data)
-        except pydantic.ValidationError:
-            # This is potentially a problem with the message, not the worker,
-            # so don't re-raise
-            logger.exception("SQS message data did not match expected schema")
-            return
+    else:
+        message_groups = [[message] for message in messages]
 
-        with tempfile.NamedTemporaryFile() as tfh:
-            with structlog.contextvars.bound_contextvars(
-                s3_bucket=data.s3.bucket,
-                s3_zip_key=data.s3.zip_key,
-                s3_metadata_key=data.s3.metadata_key,
-                destination_file_path=tfh.name,
-                destination_file_mode=tfh.mode,
-                recreate_archive=data.recreate_archive,
-            ):
-                try:
-                    process_sqs_message_request(s3, ses, data, tfh)
-                except:
-                    logger.info(
-                        "error processing SQS message request for ARPA data export"
-                    )
-                    raise
+    if pool is not None and len(message_groups) > free_workers:
+        # More workers may have become free while receiving messages
+        free_workers += pool.reserve(len(message_groups) - free_workers, timeout=0)
+    if deferred_groups := message_groups[free_workers:]:
+        message_groups = message_groups[:free_workers]
+        release_messages(
+            sqs, [message for group in deferred_groups for message in group]
+        )
 
-    with tracer.trace("cleanup_message", span_type="settle"):
-        try:
-            sqs.delete_message(
-                QueueUrl=TASK_QUEUE_URL, ReceiptHandle=message["ReceiptHandle"]
+    if pool is None:
+        for message_group in message_groups:
+            contextvars.copy_context().run(
+                handle_messages,
+                sqs,
+                s3,
+                ses,
+                message_group,
+                shutdown_handler,
+                notifier,
             )
-        except:
-            logger.exception(
-                "could not delete SQS message after it was succcessfully processed"
+        return
+
+    # Coalesced messages share a worker, which can then be used by other messages
+    pool.release(free_workers - len(message_groups))
+    for message_group in message_groups:
+        pool.submit(
+            contextvars.copy_context().run,
+            handle_messages,
+            sqs,
+            s3,
+            ses,
+            message_group,
+            shutdown_handler,
+            notifier,
+        )
+
+
+def get_max_pool_connections(service_name: str) -> int:
+    """Returns the number of connections an AWS service client needs so that
+    every thread that may use it concurrently can have its own connection.
+    """
+    if AWS_MAX_POOL_CONNECTIONS > 0:
+        return AWS_MAX_POOL_CONNECTIONS
+    workers = max(WORKER_CONCURRENCY, 1)
+    if service_name == "s3":
+        # Zip files are transferred, or else built while reading source files and
+        # uploading parts (and reading the existing zip file) concurrently.
+        source_reads = 0
+        if SOURCE_BACKEND == "s3":
+            source_reads = (
+                max(ZIP_PREFETCH_WORKERS, ZIP_COMPRESS_WORKERS, 1)
+                * SOURCE_S3_MAX_CONCURRENCY
             )
-            raise
+        per_message = max(
+            S3_TRANSFER_SETTINGS.max_concurrency,
+            source_reads + DEFAULT_MAX_IN_FLIGHT_PARTS + 1,
+        )
+    elif service_name == "sqs":
+        # Each message's visibility heartbeat, plus receiving and deleting messages
+        # (which notifier threads do once notifications are sent)
+        per_message = 1
+        workers += 1 + (NOTIFIER_WORKERS if ASYNC_NOTIFICATIONS_ENABLED else 0)
+    else:
+        per_message = 1
+        if ASYNC_NOTIFICATIONS_ENABLED:
+            workers = max(NOTIFIER_WORKERS, 1)
+    return max(workers * per_message, DEFAULT_MAX_POOL_CONNECTIONS)
+
+
+def get_client_settings(service_name: str) -> ClientSettings:
+    """Returns the connection settings for an AWS service client,
+    as configured by environment variables.
+    """
+    return ClientSettings(
+        max_pool_connections=get_max_pool_connections(service_name),
+        connect_timeout=AWS_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=AWS_READ_TIMEOUT_SECONDS,
+        max_attempts=AWS_MAX_ATTEMPTS,
+        retry_mode=typing.cast(
+            typing.Literal["legacy", "standard", "adaptive"], AWS_RETRY_MODE
+        ),
+        tcp_keepalive=AWS_TCP_KEEPALIVE,
+    )
+
+
+def get_notifier() -> contextlib.AbstractContextManager[BackgroundNotifier | None]:
+    """Returns a context manager that runs a ``BackgroundNotifier`` configured
+    by environment variables (and drains it on exit), or a no-op context manager
+    when ``ASYNC_NOTIFICATIONS_ENABLED`` is false.
+    """
+    if not ASYNC_NOTIFICATIONS_ENABLED:
+        return contextlib.nullcontext()
+    return BackgroundNotifier(
+        max_pending=NOTIFIER_MAX_PENDING,
+        workers=NOTIFIER_WORKERS,
+        max_attempts=NOTIFIER_MAX_ATTEMPTS,
+        backoff_seconds=NOTIFIER_BACKOFF_SECONDS,
+        max_backoff_seconds=NOTIFIER_MAX_BACKOFF_SECONDS,
+    )
 
 
 @tracer.wrap(name="arpa_exporter.worker", span_type="consumer")
@@ -435,16 +2119,47 @@ def main() -> None:
     """Main work loop that calls ``handle_work()`` until a shutdown is requested
     by SIGINT or SIGTERM. When a shutdown is requested, any in-flight work is finished
     before this function returns.
+
+    When ``WORKER_CONCURRENCY`` is greater than 1, messages are processed
+    concurrently by a pool of that many workers, and more messages are received
+    whenever any of them is free (see ``WorkerPool``). AWS clients are
+    shared by all threads, with connection pools sized accordingly
+    (see ``get_client_settings()``).
+
+    When ``ASYNC_NOTIFICATIONS_ENABLED`` is true, users are notified from background
+    threads (see ``get_notifier()``). Pending notifications are sent before this
+    function returns. Emails are sent no faster than the SES send rate limit
+    (see ``configure_send_rate_limiter()``).
     """
-    sqs: SQSClient = boto3.client("sqs")
-    s3: S3Client = boto3.client("s3")
-    ses: SESClient = boto3.client("ses")
+    # Read email templates before handling any messages
+    load_templates()
+
+    sqs = create_client("sqs", get_client_settings("sqs"))
+    s3 = create_client("s3", get_client_settings("s3"))
+    ses = create_client("ses", get_client_settings("ses"))
+    configure_send_rate_limiter(ses)
 
     shutdown_handler = ShutdownHandler(logger=get_logger())
-    with tracer.trace(name="arpa_exporter.worker.main_loop"):
+    with (
+        get_notifier() as notifier,
+        tracer.trace(name="arpa_exporter.worker.main_loop"),
+        WorkerPool(
+            WORKER_CONCURRENCY, thread_name_prefix="arpa-exporter-worker"
+        ) as pool,
+    ):
         while shutdown_handler.is_shutdown_requested() is False:
-            handle_work(sqs, s3, ses)
+            handle_work(
+                sqs,
+                s3,
+                ses,
+                pool=pool if WORKER_CONCURRENCY > 1 else None,
+                shutdown_handler=shutdown_handler,
+                notifier=notifier,
+            )
     get_logger().warn("shutting down")
+    if (archive_cache := get_archive_cache()) is not None:
+        archive_cache.close()
+    close_statsd()
 
 
 if __name__ == "__main__":
@@ -8,6 +8,7 @@ import moto.ses.models
 import pytest
 
 os.environ.setdefault("DD_TRACE_ENABLED", "false")
+os.environ.setdefault("DOGSTATSD_ENABLED", "false")
 os.environ.setdefault("TASK_QUEUE_URL", "https://example.com/queue")
 os.environ.setdefault("TASK_QUEUE_RECEIVE_TIMEOUT", "1")
 os.environ.setdefault(
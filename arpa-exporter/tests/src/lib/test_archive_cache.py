@@ -0,0 +1,147 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+import botocore.exceptions
+import pytest
+
+from src.lib.archive_cache import ArchiveCache
+from src.lib.s3_transfer import download_fileobj
+
+
+class TestArchiveCache:
+    BUCKET_NAME = "test-archive-cache"
+
+    @pytest.fixture(scope="function", autouse=True)
+    def make_test_bucket(self, s3):
+        s3.create_bucket(
+            Bucket=self.BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+
+    @pytest.fixture
+    def archive_cache(self, tmp_path):
+        return ArchiveCache(str(tmp_path / "archive-cache"), max_bytes=1024)
+
+    def test_only_removes_its_own_files(self, tmp_path):
+        shared_path = tmp_path / "shared"
+        shared_path.mkdir()
+        (shared_path / "other.zip").write_bytes(b"not cached by this process")
+        first = ArchiveCache(str(shared_path), max_bytes=1024)
+        second = ArchiveCache(str(shared_path), max_bytes=1024)
+        with io.BytesIO(b"cached") as fh:
+            assert first.store(self.BUCKET_NAME, "first.zip", '"etag"', fh) is True
+
+        assert first.directory != second.directory
+        first.close()
+        assert not os.path.exists(first.directory)
+        assert os.path.isdir(second.directory)
+        assert (shared_path / "other.zip").read_bytes() == b"not cached by this process"
+
+    def fetch(self, archive_cache, s3, key) -> tuple[str, bytes]:
+        with io.BytesIO() as fh:
+            etag = archive_cache.fetch(s3, self.BUCKET_NAME, key, fh)
+            return etag, fh.getvalue()
+
+    def test_downloads_object_not_in_cache(self, s3, archive_cache):
+        s3.put_object(Bucket=self.BUCKET_NAME, Key="a.zip", Body=b"a" * 100)
+        etag, data = self.fetch(archive_cache, s3, "a.zip")
+        assert data == b"a" * 100
+        assert etag == s3.head_object(Bucket=self.BUCKET_NAME, Key="a.zip")["ETag"]
+
+    def test_uses_cached_copy_when_object_is_unchanged(self, s3, archive_cache):
+        etag = s3.put_object(Bucket=self.BUCKET_NAME, Key="a.zip", Body=b"a" * 100)[
+            "ETag"
+        ]
+        with tempfile.NamedTemporaryFile() as fh:
+            fh.write(b"a" * 100)
+            assert archive_cache.store(self.BUCKET_NAME, "a.zip", etag, fh)
+        assert archive_cache.size == 100
+
+        with mock.patch(
+            "src.lib.archive_cache.download_fileobj"
+        ) as mock_download_fileobj:
+            assert self.fetch(archive_cache, s3, "a.zip") == (etag, b"a" * 100)
+        mock_download_fileobj.assert_not_called()
+
+    def test_uses_known_object_version_without_looking_it_up(self, s3, archive_cache):
+        etag = s3.put_object(Bucket=self.BUCKET_NAME, Key="a.zip", Body=b"a" * 100)[
+            "ETag"
+        ]
+        with mock.patch.object(s3, "head_object") as mock_head_object:
+            with io.BytesIO() as fh:
+                assert (
+                    archive_cache.fetch(
+                        s3, self.BUCKET_NAME, "a.zip", fh, size=100, etag=etag
+                    )
+                    == etag
+                )
+                assert fh.getvalue() == b"a" * 100
+            archive_cache.store(self.BUCKET_NAME, "a.zip", etag, io.BytesIO(b"a" * 100))
+            with mock.patch(
+                "src.lib.archive_cache.download_fileobj"
+            ) as mock_download_fileobj:
+                with io.BytesIO() as fh:
+                    archive_cache.fetch(
+                        s3, self.BUCKET_NAME, "a.zip", fh, size=100, etag=etag
+                    )
+                    assert fh.getvalue() == b"a" * 100
+            mock_download_fileobj.assert_not_called()
+        mock_head_object.assert_not_called()
+
+    def test_downloads_object_when_cached_copy_is_stale(self, s3, archive_cache):
+        old_etag = s3.put_object(Bucket=self.BUCKET_NAME, Key="a.zip", Body=b"old")[
+            "ETag"
+        ]
+        archive_cache.store(self.BUCKET_NAME, "a.zip", old_etag, io.BytesIO(b"old"))
+        new_etag = s3.put_object(Bucket=self.BUCKET_NAME, Key="a.zip", Body=b"new")[
+            "ETag"
+        ]
+
+        assert self.fetch(archive_cache, s3, "a.zip") == (new_etag, b"new")
+        assert archive_cache.size == 0
+
+    def test_evicts_least_recently_used_objects(self, s3, archive_cache):
+        etags = {}
+        for key in ["a.zip", "b.zip", "c.zip"]:
+            data = key.encode() * 100
+            etags[key] = s3.put_object(Bucket=self.BUCKET_NAME, Key=key, Body=data)[
+                "ETag"
+            ]
+            archive_cache.store(self.BUCKET_NAME, key, etags[key], io.BytesIO(data))
+        assert archive_cache.size == 1000
+
+        with mock.patch(
+            "src.lib.archive_cache.download_fileobj", wraps=download_fileobj
+        ) as mock_download_fileobj:
+            # b.zip becomes the most recently used, so c.zip is evicted next
+            self.fetch(archive_cache, s3, "b.zip")
+            archive_cache.store(
+                self.BUCKET_NAME, "a.zip", etags["a.zip"], io.BytesIO(b"a.zip" * 100)
+            )
+            mock_download_fileobj.assert_not_called()
+            self.fetch(archive_cache, s3, "c.zip")
+            mock_download_fileobj.assert_called_once()
+        assert len(os.listdir(archive_cache.directory)) == 2
+
+    def test_does_not_cache_objects_larger_than_budget(self, archive_cache):
+        assert not archive_cache.store(
+            self.BUCKET_NAME, "a.zip", '"etag"', io.BytesIO(b"a" * 2048)
+        )
+        assert archive_cache.size == 0
+        assert os.listdir(archive_cache.directory) == []
+
+    def test_fetch_raises_when_object_does_not_exist(self, s3, archive_cache):
+        with pytest.raises(botocore.exceptions.ClientError) as raised:
+            self.fetch(archive_cache, s3, "does-not-exist.zip")
+        assert raised.value.response["Error"]["Code"] == "404"
+
+    def test_storing_discards_copy_without_etag(self, archive_cache):
+        with pytest.raises(ValueError):
+            with archive_cache.storing(self.BUCKET_NAME, "a.zip", io.BytesIO(b"a")):
+                raise ValueError("upload failed")
+        with archive_cache.storing(self.BUCKET_NAME, "b.zip", io.BytesIO(b"b")):
+            pass
+        assert archive_cache.size == 0
+        assert os.listdir(archive_cache.directory) == []
@@ -0,0 +1,79 @@
+import logging
+
+import pytest
+import structlog
+
+from src.lib import aws_clients
+from src.lib.aws_clients import ClientSettings, ConnectionPoolMonitor, create_client
+
+
+class TestClientSettings:
+    def test_to_config(self):
+        config = ClientSettings(
+            max_pool_connections=25,
+            connect_timeout=3,
+            read_timeout=30,
+            max_attempts=7,
+            retry_mode="standard",
+            tcp_keepalive=False,
+        ).to_config()
+        assert config.max_pool_connections == 25
+        assert config.connect_timeout == 3
+        assert config.read_timeout == 30
+        assert config.retries == {"mode": "standard", "total_max_attempts": 7}
+        assert config.tcp_keepalive is False
+
+    def test_max_pool_connections_is_at_least_one(self):
+        assert (
+            ClientSettings(max_pool_connections=0).to_config().max_pool_connections == 1
+        )
+
+
+class TestConnectionPoolMonitor:
+    @pytest.fixture
+    def pool_logger(self):
+        pool_logger = logging.getLogger(aws_clients.URLLIB3_CONNECTION_POOL_LOGGER)
+        monitor = ConnectionPoolMonitor()
+        pool_logger.addHandler(monitor)
+        yield pool_logger, monitor
+        pool_logger.removeHandler(monitor)
+
+    def test_counts_and_logs_full_connection_pools(self, pool_logger):
+        pool_logger, monitor = pool_logger
+        with structlog.testing.capture_logs() as logs:
+            for _ in range(2):
+                pool_logger.warning(
+                    "Connection pool is full, discarding connection: %s. "
+                    "Connection pool size: %s",
+                    "bucket.s3.amazonaws.com",
+                    10,
+                )
+        assert monitor.count == 2
+        assert [log["connection_pool_full_count"] for log in logs] == [1, 2]
+        assert logs[0]["connection_pool_host"] == "bucket.s3.amazonaws.com"
+        assert logs[0]["connection_pool_size"] == 10
+
+    def test_ignores_other_messages(self, pool_logger):
+        pool_logger, monitor = pool_logger
+        with structlog.testing.capture_logs() as logs:
+            pool_logger.warning(
+                "Retrying (%s) after connection broken", "Retry(total=1)"
+            )
+        assert monitor.count == 0
+        assert logs == []
+
+
+def test_install_connection_pool_monitor_is_idempotent():
+    pool_logger = logging.getLogger(aws_clients.URLLIB3_CONNECTION_POOL_LOGGER)
+    aws_clients.install_connection_pool_monitor()
+    aws_clients.install_connection_pool_monitor()
+    assert pool_logger.handlers.count(aws_clients.connection_pool_monitor) == 1
+
+
+def test_create_client(mocked_aws):
+    settings = ClientSettings(max_pool_connections=42, max_attempts=3)
+    s3 = create_client("s3", settings)
+    assert s3.meta.config.max_pool_connections == 42
+    assert s3.meta.config.retries == {"mode": "adaptive", "total_max_attempts": 3}
+    assert s3.meta.config.tcp_keepalive is True
+    assert s3.list_buckets()["Buckets"] == []
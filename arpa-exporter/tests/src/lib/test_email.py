@@ -4,6 +4,9 @@ import copy
 import typing
 from unittest import mock
 
+import chevron
+import pytest
+
 from src.lib import email
 
 if typing.TYPE_CHECKING:
@@ -101,3 +104,76 @@ class TestEmail:
             assert expect_val == tagged_msg[expect_key], (
                 "message parameter value unexpectedly modified after tagging"
             )
+
+
+class TestTemplateCache:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        email.clear_template_cache()
+        yield
+        email.clear_template_cache()
+
+    def test_reads_templates_once(self):
+        with mock.patch("builtins.open", wraps=open) as mock_open:
+            first = email.generate_email("https://example.org/1.zip", "https://a.csv")
+            second = email.generate_email("https://example.org/2.zip", "https://b.csv")
+            email.generate_email("https://example.org/1.zip", "https://a.csv")
+        assert mock_open.call_count == len(email.TEMPLATE_FILES)
+        assert "https://example.org/1.zip" in first[0]
+        assert "https://example.org/2.zip" in second[0]
+
+    def test_caches_generated_email(self):
+        with mock.patch("chevron.render", wraps=chevron.render) as mock_render:
+            first = email.generate_email("https://example.org/1.zip", "https://a.csv")
+            second = email.generate_email("https://example.org/1.zip", "https://a.csv")
+        assert first == second
+        assert mock_render.call_count == 4
+
+    def test_clear_template_cache_reloads_templates(self, tmp_path):
+        for name, path in email.TEMPLATE_FILES.items():
+            (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / path).write_text(f"{name}: {{{{zip_url}}}}{{{{> email_body}}}}")
+        email.generate_email("https://example.org/1.zip", "https://a.csv")
+        with mock.patch("src.lib.email.TEMPLATES_DIR", str(tmp_path)):
+            email.clear_template_cache()
+            email_html, email_text, _ = email.generate_email(
+                "https://example.org/1.zip", "https://a.csv"
+            )
+        assert email_html == "base: formatted_body: "
+        assert email_text == "full_file_export_text: https://example.org/1.zip"
+
+
+class TestSendRateLimiter:
+    @pytest.fixture(autouse=True)
+    def reset_send_rate_limiter(self):
+        with mock.patch("src.lib.email.send_rate_limiter", None):
+            yield
+
+    def test_uses_ses_max_send_rate(self, ses):
+        limiter = email.configure_send_rate_limiter(ses)
+        assert limiter is email.send_rate_limiter
+        assert limiter is not None
+        assert limiter.rate == ses.get_send_quota()["MaxSendRate"]
+
+    @pytest.mark.parametrize(("max_send_rate", "expected"), [("14", 14), ("0", None)])
+    def test_uses_configured_max_send_rate(self, ses, max_send_rate, expected):
+        with mock.patch("src.lib.email.SES_MAX_SEND_RATE", max_send_rate):
+            limiter = email.configure_send_rate_limiter(ses)
+        assert (limiter.rate if limiter else None) == expected
+
+    def test_does_not_limit_when_quota_is_unavailable(self, ses):
+        with mock.patch.object(
+            ses,
+            "get_send_quota",
+            side_effect=ses.exceptions.ClientError(
+                {"Error": {"Code": "AccessDenied"}}, "GetSendQuota"
+            ),
+        ):
+            assert email.configure_send_rate_limiter(ses) is None
+
+    def test_send_email_acquires_token(self, ses):
+        limiter = mock.Mock(spec=email.TokenBucket)
+        limiter.acquire.return_value = 0.25
+        with mock.patch("src.lib.email.send_rate_limiter", limiter):
+            email.send_email(ses, "foo@example.com", "Test", "Test", "Test")
+        limiter.acquire.assert_called_once_with()
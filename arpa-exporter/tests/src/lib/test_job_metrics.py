@@ -0,0 +1,112 @@
+from unittest import mock
+
+import pytest
+import structlog
+
+from src.lib.job_metrics import JobMetrics, StageMetrics
+
+
+class TestStageMetrics:
+    def test_add(self):
+        stage = StageMetrics()
+        stage.add(seconds=1.5, bytes=10, entries=1)
+        stage.add(seconds=0.5, bytes=30, entries=2, reused=1)
+        assert stage.seconds == 2
+        assert stage.bytes == 40
+        assert stage.counts == {"entries": 3, "reused": 1}
+        assert stage.bytes_per_second == 20
+
+    @pytest.mark.parametrize(("seconds", "bytes"), [(0, 10), (1, 0)])
+    def test_bytes_per_second_requires_time_and_bytes(self, seconds, bytes):
+        assert StageMetrics(seconds=seconds, bytes=bytes).bytes_per_second is None
+
+
+class TestJobMetrics:
+    def test_stage_adds_wall_time(self):
+        metrics = JobMetrics()
+        with mock.patch("time.perf_counter", side_effect=[10, 12.5, 20, 21]):
+            with metrics.stage("download") as stage:
+                stage.add(bytes=100)
+            with pytest.raises(ValueError), metrics.stage("download"):
+                raise ValueError()
+        assert metrics.get("download") == StageMetrics(seconds=3.5, bytes=100)
+
+    def test_timed_iter(self):
+        metrics = JobMetrics()
+        with mock.patch("time.perf_counter", side_effect=[0, 1, 1, 3, 3, 3.5]):
+            assert list(metrics.timed_iter("csv_stream", "ab", "rows")) == ["a", "b"]
+        assert metrics.get("csv_stream") == StageMetrics(
+            seconds=3.5, counts={"rows": 2}
+        )
+
+    def test_summary(self):
+        metrics = JobMetrics()
+        metrics.get("download").add(seconds=2, bytes=1000)
+        metrics.get("diff").add(seconds=0.0004, entries_checked=3)
+        assert metrics.summary() == {
+            "download_seconds": 2,
+            "download_bytes": 1000,
+            "download_bytes_per_second": 500,
+            "diff_seconds": 0.0,
+            "diff_entries_checked": 3,
+        }
+
+    def test_records_first_failed_stage(self):
+        metrics = JobMetrics()
+        with pytest.raises(ValueError), metrics.stage("build"):
+            with metrics.stage("csv_stream"):
+                raise ValueError()
+        assert metrics.failed_stage == "csv_stream"
+
+    def test_timed_iter_records_failure(self):
+        def rows():
+            yield "a"
+            raise ValueError()
+
+        metrics = JobMetrics()
+        with pytest.raises(ValueError):
+            list(metrics.timed_iter("csv_stream", rows()))
+        assert metrics.failed_stage == "csv_stream"
+
+    def test_emit(self):
+        metrics = JobMetrics()
+        metrics.get("upload").add(seconds=1, bytes=10, archive_parts=2)
+        statsd = mock.Mock()
+        metrics.emit(statsd, ["organization_id:1"])
+        tags = ["organization_id:1", "stage:upload"]
+        statsd.distribution.assert_called_once_with("stage.duration", 1, tags=tags)
+        statsd.increment.assert_has_calls(
+            [
+                mock.call("stage.bytes", 10, tags=tags),
+                mock.call("stage.archive_parts", 2, tags=tags),
+            ]
+        )
+
+    def test_set_span_metrics(self):
+        metrics = JobMetrics()
+        metrics.get("upload").add(seconds=1, bytes=10)
+        span = mock.Mock()
+        metrics.set_span_metrics(span)
+        span.set_metric.assert_has_calls(
+            [
+                mock.call("arpa_exporter.stage.upload_seconds", 1),
+                mock.call("arpa_exporter.stage.upload_bytes", 10),
+                mock.call("arpa_exporter.stage.upload_bytes_per_second", 10),
+            ]
+        )
+        metrics.set_span_metrics(None)
+
+    def test_log_summary(self):
+        metrics = JobMetrics()
+        metrics.get("notify").add(seconds=1, notifications=2)
+        with structlog.testing.capture_logs() as logs:
+            metrics.log_summary(structlog.get_logger(), organization_id=1)
+        assert logs == [
+            {
+                "event": "export job stage metrics",
+                "log_level": "info",
+                "organization_id": 1,
+                "notify_seconds": 1,
+                "notify_notifications": 2,
+            }
+        ]
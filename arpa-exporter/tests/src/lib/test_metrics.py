@@ -0,0 +1,55 @@
+import socket
+from unittest import mock
+
+import pytest
+from ddtrace.vendor.dogstatsd import DogStatsd
+
+from src.lib import metrics
+from src.lib.metrics import NullStatsdClient, organization_tags
+
+
+@pytest.fixture
+def server():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.settimeout(5)
+        yield sock
+
+
+class TestGetStatsd:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        metrics.get_statsd.cache_clear()
+        yield
+        metrics.get_statsd.cache_clear()
+
+    def test_disabled(self):
+        with mock.patch("src.lib.metrics.DOGSTATSD_ENABLED", False):
+            assert isinstance(metrics.get_statsd(), NullStatsdClient)
+            metrics.close_statsd()
+
+    def test_enabled(self, monkeypatch, server):
+        monkeypatch.setenv("DD_ENV", "staging")
+        monkeypatch.delenv("DD_SERVICE", raising=False)
+        monkeypatch.delenv("DD_VERSION", raising=False)
+        host, port = server.getsockname()
+        with (
+            mock.patch("src.lib.metrics.DOGSTATSD_ENABLED", True),
+            mock.patch("src.lib.metrics.DOGSTATSD_HOST", host),
+            mock.patch("src.lib.metrics.DOGSTATSD_PORT", port),
+        ):
+            client = metrics.get_statsd()
+        assert isinstance(client, DogStatsd)
+        assert client is metrics.get_statsd()
+        assert "env:staging" in client.constant_tags
+
+        client.increment("messages", tags=["organization_id:1"])
+        metrics.close_statsd()
+        assert server.recv(65535).decode().startswith("arpa_exporter.messages:1|c|#")
+
+
+def test_organization_tags():
+    assert organization_tags(1234, "stage:upload") == [
+        "organization_id:1234",
+        "stage:upload",
+    ]
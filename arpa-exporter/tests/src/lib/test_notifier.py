@@ -0,0 +1,117 @@
+import contextvars
+import threading
+from unittest import mock
+
+import botocore.exceptions
+import pytest
+
+from src.lib.notifier import BackgroundNotifier, is_retryable_error, when_all_done
+
+test_var: contextvars.ContextVar[str] = contextvars.ContextVar("test_var")
+
+
+def client_error(code: str) -> botocore.exceptions.ClientError:
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": code, "Message": code}}, "SendEmail"
+    )
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (client_error("Throttling"), True),
+        (client_error("MessageRejected"), False),
+        (botocore.exceptions.EndpointConnectionError(endpoint_url="x"), True),
+        (ValueError("nope"), False),
+    ],
+)
+def test_is_retryable_error(error, expected):
+    assert is_retryable_error(error) is expected
+
+
+class TestBackgroundNotifier:
+    def test_sends_notifications_in_background(self):
+        send = mock.Mock(return_value="message-id")
+        with BackgroundNotifier() as notifier:
+            future = notifier.submit(send, "a@example.gov", organization_id=1)
+            assert future.result(timeout=5) == "message-id"
+        send.assert_called_once_with("a@example.gov", organization_id=1)
+
+    def test_runs_in_copy_of_submitter_context(self):
+        test_var.set("submitter")
+        with BackgroundNotifier() as notifier:
+            future = notifier.submit(test_var.get)
+            assert future.result(timeout=5) == "submitter"
+
+    def test_retries_retryable_errors_with_backoff(self):
+        send = mock.Mock(
+            side_effect=[client_error("Throttling"), client_error("Throttling"), "id"]
+        )
+        with (
+            BackgroundNotifier(max_attempts=3, backoff_seconds=0.5) as notifier,
+            mock.patch("time.sleep") as mock_sleep,
+        ):
+            assert notifier.submit(send).result(timeout=5) == "id"
+        assert send.call_count == 3
+        assert mock_sleep.call_count == 2
+        assert all(0 <= call.args[0] <= 1 for call in mock_sleep.call_args_list)
+
+    def test_fails_after_max_attempts(self):
+        error = client_error("Throttling")
+        send = mock.Mock(side_effect=error)
+        with BackgroundNotifier(max_attempts=2, backoff_seconds=0) as notifier:
+            future = notifier.submit(send)
+            assert future.exception(timeout=5) is error
+        assert send.call_count == 2
+
+    def test_does_not_retry_other_errors(self):
+        error = client_error("MessageRejected")
+        send = mock.Mock(side_effect=error)
+        with BackgroundNotifier(max_attempts=5, backoff_seconds=0) as notifier:
+            assert notifier.submit(send).exception(timeout=5) is error
+        assert send.call_count == 1
+
+    def test_close_sends_pending_notifications(self):
+        release = threading.Event()
+        sent = []
+
+        def send(i):
+            release.wait(5)
+            sent.append(i)
+
+        notifier = BackgroundNotifier(max_pending=10)
+        notifier.start()
+        futures = [notifier.submit(send, i) for i in range(5)]
+        release.set()
+        notifier.close()
+        assert all(future.done() for future in futures)
+        assert sent == list(range(5))
+        with pytest.raises(RuntimeError):
+            notifier.submit(send, 5)
+
+    def test_get_backoff_seconds(self):
+        notifier = BackgroundNotifier(backoff_seconds=1, max_backoff_seconds=3)
+        with mock.patch("random.uniform", side_effect=lambda a, b: b):
+            assert [notifier.get_backoff_seconds(i) for i in (1, 2, 3, 4)] == [
+                1,
+                2,
+                3,
+                3,
+            ]
+
+
+def test_when_all_done():
+    with BackgroundNotifier(workers=2) as notifier:
+        release = threading.Event()
+        futures = [notifier.submit(release.wait, 5) for _ in range(3)]
+        callback = mock.Mock()
+        when_all_done(futures, callback)
+        assert not callback.called
+        release.set()
+    callback.assert_called_once_with(futures)
+
+
+def test_when_all_done_without_futures():
+    callback = mock.Mock()
+    when_all_done([], callback)
+    callback.assert_called_once_with([])
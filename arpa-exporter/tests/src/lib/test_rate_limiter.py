@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from src.lib.rate_limiter import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        with self.lock:
+            self.now += seconds
+
+
+class TestTokenBucket:
+    def test_requires_positive_rate(self):
+        with pytest.raises(ValueError):
+            TokenBucket(0)
+
+    def test_paces_bursts_at_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=1, clock=clock, sleep=lambda _: None)
+        assert [bucket.acquire() for _ in range(4)] == [0, 0.5, 1.0, 1.5]
+
+    def test_allows_bursts_up_to_capacity_after_idling(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, capacity=3, clock=clock, sleep=clock.sleep)
+        clock.now = 100
+        assert [bucket.acquire() for _ in range(4)] == [0, 0, 0, 1]
+
+    def test_waits_for_tokens_to_accrue(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=1, clock=clock, sleep=clock.sleep)
+        for _ in range(11):
+            bucket.acquire()
+        assert clock.now == pytest.approx(1.0)
+
+    def test_shared_between_threads(self):
+        clock = FakeClock()
+        waits = []
+        bucket = TokenBucket(rate=4, capacity=1, clock=clock, sleep=lambda _: None)
+        threads = [
+            threading.Thread(target=lambda: waits.append(bucket.acquire()))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(waits) == [i / 4 for i in range(8)]
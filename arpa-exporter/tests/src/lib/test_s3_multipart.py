@@ -0,0 +1,218 @@
+import io
+import os
+import zipfile
+from unittest import mock
+
+import pytest
+from botocore.exceptions import ClientError
+from structlog.testing import capture_logs
+
+from src.lib import s3_multipart
+
+
+@pytest.mark.parametrize(
+    ("size", "max_part_size", "expected"),
+    (
+        (0, 10, []),
+        (10, 10, [(0, 9)]),
+        (11, 10, [(0, 5), (6, 10)]),
+        (25, 10, [(0, 8), (9, 17), (18, 24)]),
+    ),
+)
+def test_split_range(size, max_part_size, expected):
+    assert s3_multipart.split_range(size, max_part_size) == expected
+
+
+class TestUploadAppendedObject:
+    BUCKET_NAME = "test-s3-multipart"
+    KEY = "archive.zip"
+
+    @pytest.fixture(scope="function")
+    def original_data(self, s3):
+        data = os.urandom(s3_multipart.MIN_PART_SIZE + 1024)
+        s3.create_bucket(
+            Bucket=self.BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+        s3.put_object(Bucket=self.BUCKET_NAME, Key=self.KEY, Body=data)
+        yield data
+
+    def test_copies_unchanged_data_and_uploads_remainder(self, s3, original_data):
+        etag = s3.head_object(Bucket=self.BUCKET_NAME, Key=self.KEY)["ETag"]
+        appended_data = os.urandom(1024)
+        # Overwrite the last few original bytes, as when replacing a central directory
+        unchanged_size = len(original_data) - 100
+        new_data = original_data[:unchanged_size] + appended_data
+
+        with mock.patch.object(s3, "upload_part", wraps=s3.upload_part) as upload_part:
+            uploaded_etag = s3_multipart.upload_appended_object(
+                s3,
+                io.BytesIO(new_data),
+                self.BUCKET_NAME,
+                self.KEY,
+                source_etag=etag,
+                unchanged_size=unchanged_size,
+                extra_args={"ServerSideEncryption": "AES256"},
+            )
+
+        assert upload_part.call_count == 1
+        assert upload_part.call_args.kwargs["Body"] == appended_data
+        response = s3.get_object(Bucket=self.BUCKET_NAME, Key=self.KEY)
+        assert response["ETag"] == uploaded_etag
+        assert response["Body"].read() == new_data
+        assert response["ServerSideEncryption"] == "AES256"
+
+    def test_fails_when_unchanged_size_is_too_small(self, s3, original_data):
+        with pytest.raises(ValueError):
+            s3_multipart.upload_appended_object(
+                s3,
+                io.BytesIO(original_data),
+                self.BUCKET_NAME,
+                self.KEY,
+                source_etag="does not matter",
+                unchanged_size=s3_multipart.MIN_PART_SIZE - 1,
+            )
+
+    def test_aborts_upload_on_error(self, s3, original_data):
+        etag = s3.head_object(Bucket=self.BUCKET_NAME, Key=self.KEY)["ETag"]
+        upload_error = ValueError("nope")
+        with mock.patch.object(s3, "upload_part", side_effect=upload_error):
+            with pytest.raises(ValueError) as raised:
+                s3_multipart.upload_appended_object(
+                    s3,
+                    io.BytesIO(original_data + b"more data"),
+                    self.BUCKET_NAME,
+                    self.KEY,
+                    source_etag=etag,
+                    unchanged_size=len(original_data),
+                )
+        assert raised.value is upload_error
+        uploads = s3.list_multipart_uploads(Bucket=self.BUCKET_NAME)
+        assert uploads.get("Uploads", []) == []
+        response = s3.get_object(Bucket=self.BUCKET_NAME, Key=self.KEY)
+        assert response["Body"].read() == original_data
+
+    def test_raises_original_error_when_abort_fails(self, s3, original_data):
+        etag = s3.head_object(Bucket=self.BUCKET_NAME, Key=self.KEY)["ETag"]
+        upload_error = ValueError("nope")
+        abort_error = ClientError(
+            {"Error": {"Code": "AccessDenied", "Message": "denied"}},
+            "AbortMultipartUpload",
+        )
+        with (
+            mock.patch.object(s3, "upload_part", side_effect=upload_error),
+            mock.patch.object(s3, "abort_multipart_upload", side_effect=abort_error),
+        ):
+            with pytest.raises(ValueError) as raised:
+                s3_multipart.upload_appended_object(
+                    s3,
+                    io.BytesIO(original_data + b"more data"),
+                    self.BUCKET_NAME,
+                    self.KEY,
+                    source_etag=etag,
+                    unchanged_size=len(original_data),
+                )
+        assert raised.value is upload_error
+
+
+class TestMultipartUploadWriter:
+    BUCKET_NAME = "test-s3-multipart"
+    KEY = "streamed.zip"
+
+    @pytest.fixture(scope="function", autouse=True)
+    def make_test_bucket(self, s3):
+        s3.create_bucket(
+            Bucket=self.BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+
+    def get_object_data(self, s3):
+        return s3.get_object(Bucket=self.BUCKET_NAME, Key=self.KEY)["Body"].read()
+
+    def test_uploads_written_data_in_parts(self, s3):
+        data = os.urandom(2 * s3_multipart.MIN_PART_SIZE + 1024)
+        with s3_multipart.MultipartUploadWriter(
+            s3,
+            self.BUCKET_NAME,
+            self.KEY,
+            part_size=s3_multipart.MIN_PART_SIZE,
+            extra_args={"ServerSideEncryption": "AES256"},
+        ) as writer:
+            for offset in range(0, len(data), 1000):
+                writer.write(data[offset : offset + 1000])
+            assert writer.tell() == len(data)
+
+        assert len(writer.parts) == 3
+        assert self.get_object_data(s3) == data
+        assert (
+            writer.etag == s3.head_object(Bucket=self.BUCKET_NAME, Key=self.KEY)["ETag"]
+        )
+
+    def test_streams_zip_archive(self, s3):
+        entry_data = os.urandom(1024)
+        with s3_multipart.MultipartUploadWriter(
+            s3, self.BUCKET_NAME, self.KEY
+        ) as writer:
+            with zipfile.ZipFile(writer, "w") as archive:
+                archive.writestr("a.bin", entry_data)
+                archive.writestr("b.bin", entry_data)
+
+        with zipfile.ZipFile(io.BytesIO(self.get_object_data(s3))) as archive:
+            assert archive.testzip() is None
+            assert archive.read("b.bin") == entry_data
+
+    def test_creates_empty_object_when_nothing_written(self, s3):
+        with s3_multipart.MultipartUploadWriter(s3, self.BUCKET_NAME, self.KEY):
+            pass
+        assert self.get_object_data(s3) == b""
+
+    def test_aborts_upload_on_error(self, s3):
+        expect_error = ValueError("oh no")
+        with pytest.raises(ValueError) as raised:
+            with s3_multipart.MultipartUploadWriter(
+                s3, self.BUCKET_NAME, self.KEY
+            ) as writer:
+                writer.write(os.urandom(s3_multipart.MIN_PART_SIZE + 1))
+                raise expect_error
+        assert raised.value is expect_error
+        assert (
+            s3.list_multipart_uploads(Bucket=self.BUCKET_NAME).get("Uploads", []) == []
+        )
+        assert s3.list_objects_v2(Bucket=self.BUCKET_NAME).get("Contents", []) == []
+
+    def test_fails_when_part_upload_fails(self, s3):
+        upload_error = ValueError("nope")
+        with mock.patch.object(s3, "upload_part", side_effect=upload_error):
+            with pytest.raises(ValueError) as raised:
+                with s3_multipart.MultipartUploadWriter(
+                    s3, self.BUCKET_NAME, self.KEY
+                ) as writer:
+                    writer.write(b"some data")
+        assert raised.value is upload_error
+        assert (
+            s3.list_multipart_uploads(Bucket=self.BUCKET_NAME).get("Uploads", []) == []
+        )
+
+    def test_explicit_abort_creates_no_object(self, s3):
+        with s3_multipart.MultipartUploadWriter(
+            s3, self.BUCKET_NAME, self.KEY
+        ) as writer:
+            writer.write(b"some data")
+            writer.abort()
+        assert s3.list_objects_v2(Bucket=self.BUCKET_NAME).get("Contents", []) == []
+        with pytest.raises(ValueError):
+            writer.write(b"more data")
+
+    def test_explicit_abort_logs_abort_errors(self, s3):
+        abort_error = ClientError(
+            {"Error": {"Code": "AccessDenied", "Message": "denied"}},
+            "AbortMultipartUpload",
+        )
+        with mock.patch.object(s3, "abort_multipart_upload", side_effect=abort_error):
+            with capture_logs() as logs:
+                with s3_multipart.MultipartUploadWriter(
+                    s3, self.BUCKET_NAME, self.KEY
+                ) as writer:
+                    writer.abort()
+        assert s3.list_objects_v2(Bucket=self.BUCKET_NAME).get("Contents", []) == []
+        assert "error aborting multipart upload" in [log["event"] for log in logs]
@@ -0,0 +1,111 @@
+import io
+import os
+import zipfile
+
+import botocore.exceptions
+import pytest
+
+from src.lib.s3_object_reader import (
+    DEFAULT_BUFFER_SIZE,
+    S3ObjectReader,
+    S3ObjectStreamReader,
+)
+
+
+class TestS3ObjectReader:
+    BUCKET_NAME = "test-s3-object-reader"
+    KEY = "some/object"
+    DATA = bytes(range(256)) * 1024
+
+    @pytest.fixture(scope="function", autouse=True)
+    def make_test_object(self, s3):
+        s3.create_bucket(
+            Bucket=self.BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+        s3.put_object(Bucket=self.BUCKET_NAME, Key=self.KEY, Body=self.DATA)
+
+    def test_reads_ranges_of_object(self, s3):
+        reader = S3ObjectReader(s3, self.BUCKET_NAME, self.KEY)
+        assert reader.size == len(self.DATA)
+
+        reader.seek(1000)
+        assert reader.read(24) == self.DATA[1000:1024]
+        reader.seek(-10, os.SEEK_END)
+        assert reader.read(100) == self.DATA[-10:]
+        assert reader.read(100) == b""
+        assert reader.requests_made == 2
+        assert reader.bytes_requested == 34
+
+    def test_reads_zip_central_directory_without_reading_entry_data(self, s3):
+        entry_data = os.urandom(1024 * 1024)
+        with io.BytesIO() as fh:
+            with zipfile.ZipFile(fh, "w") as archive:
+                for i in range(10):
+                    archive.writestr(f"entry-{i}.bin", entry_data)
+            s3.put_object(Bucket=self.BUCKET_NAME, Key="a.zip", Body=fh.getvalue())
+
+        reader = S3ObjectReader(s3, self.BUCKET_NAME, "a.zip")
+        with io.BufferedReader(reader, DEFAULT_BUFFER_SIZE) as buffered_reader:
+            with zipfile.ZipFile(buffered_reader, "r") as archive:
+                assert len(archive.namelist()) == 10
+                assert archive.read("entry-9.bin") == entry_data
+        assert reader.bytes_requested < 2 * len(entry_data)
+
+    def test_fails_when_object_is_replaced(self, s3):
+        reader = S3ObjectReader(s3, self.BUCKET_NAME, self.KEY)
+        s3.put_object(Bucket=self.BUCKET_NAME, Key=self.KEY, Body=b"replaced")
+        with pytest.raises(botocore.exceptions.ClientError) as raised:
+            reader.read(10)
+        assert raised.value.response["Error"]["Code"] == "PreconditionFailed"
+
+    def test_fails_when_object_does_not_exist(self, s3):
+        with pytest.raises(botocore.exceptions.ClientError) as raised:
+            S3ObjectReader(s3, self.BUCKET_NAME, "does-not-exist")
+        assert raised.value.response["Error"]["Code"] == "404"
+
+
+class TestS3ObjectStreamReader:
+    BUCKET_NAME = "test-s3-object-stream-reader"
+    KEY = "some/object"
+    DATA = os.urandom(100 * 1024 + 1)
+
+    @pytest.fixture(scope="function", autouse=True)
+    def make_test_object(self, s3):
+        s3.create_bucket(
+            Bucket=self.BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+        self.etag = s3.put_object(
+            Bucket=self.BUCKET_NAME, Key=self.KEY, Body=self.DATA
+        )["ETag"]
+
+    def make_reader(self, s3, **kwargs):
+        return S3ObjectStreamReader(
+            s3, self.BUCKET_NAME, self.KEY, len(self.DATA), self.etag, **kwargs
+        )
+
+    @pytest.mark.parametrize("max_concurrency", [1, 4])
+    def test_reads_object_in_concurrent_parts(self, s3, max_concurrency):
+        with self.make_reader(
+            s3, part_size=10 * 1024, max_concurrency=max_concurrency
+        ) as reader:
+            chunks = []
+            while chunk := reader.read(3000):
+                chunks.append(chunk)
+        assert b"".join(chunks) == self.DATA
+        assert reader.requests_made == 11
+        assert reader.bytes_requested == len(self.DATA)
+
+    def test_reads_empty_object(self, s3):
+        etag = s3.put_object(Bucket=self.BUCKET_NAME, Key="empty", Body=b"")["ETag"]
+        with S3ObjectStreamReader(s3, self.BUCKET_NAME, "empty", 0, etag) as reader:
+            assert reader.read() == b""
+        assert reader.requests_made == 0
+
+    def test_fails_when_object_is_replaced(self, s3):
+        s3.put_object(Bucket=self.BUCKET_NAME, Key=self.KEY, Body=b"replaced")
+        with self.make_reader(s3) as reader:
+            with pytest.raises(botocore.exceptions.ClientError) as raised:
+                reader.read(10)
+        assert raised.value.response["Error"]["Code"] == "PreconditionFailed"
@@ -0,0 +1,152 @@
+import io
+import os
+from unittest import mock
+
+import botocore.exceptions
+import pytest
+import structlog
+
+from src.lib import s3_transfer
+from src.lib.s3_multipart import MAX_PART_SIZE, MIN_PART_SIZE
+from src.lib.s3_transfer import TransferSettings
+
+MiB = 1024**2
+GiB = 1024**3
+
+
+class TestTransferSettings:
+    @pytest.mark.parametrize(
+        ("size", "expected_part_size"),
+        [
+            (0, s3_transfer.AUTO_MIN_PART_SIZE),
+            (100 * MiB, s3_transfer.AUTO_MIN_PART_SIZE),
+            (4 * GiB, 103 * MiB),
+            (100 * GiB, s3_transfer.AUTO_MAX_PART_SIZE),
+            # Large enough that the maximum part size would need too many parts
+            (6000 * GiB, 615 * MiB),
+        ],
+    )
+    def test_chooses_part_size_from_object_size(self, size, expected_part_size):
+        settings = TransferSettings(max_concurrency=10)
+        part_size = settings.choose_part_size(size)
+        assert part_size == pytest.approx(expected_part_size, abs=MiB)
+        assert size / part_size <= s3_transfer.MAX_PARTS
+
+    @pytest.mark.parametrize(
+        ("part_size", "expected_part_size"),
+        [(16 * MiB, 16 * MiB), (1, MIN_PART_SIZE), (10 * GiB, MAX_PART_SIZE)],
+    )
+    def test_uses_configured_part_size_within_limits(
+        self, part_size, expected_part_size
+    ):
+        settings = TransferSettings(part_size=part_size)
+        assert settings.choose_part_size(GiB) == expected_part_size
+
+    def test_config_for_object_size(self):
+        config = TransferSettings(
+            part_size=16 * MiB, max_concurrency=3, threshold=32 * MiB
+        ).config_for(GiB)
+        assert config.multipart_chunksize == 16 * MiB
+        assert config.multipart_threshold == 32 * MiB
+        assert config.max_concurrency == 3
+
+
+class TestTransfers:
+    BUCKET_NAME = "test-s3-transfer"
+    KEY = "archive.zip"
+    DATA = os.urandom(12 * MiB)
+
+    @pytest.fixture(scope="function", autouse=True)
+    def make_test_bucket(self, s3):
+        s3.create_bucket(
+            Bucket=self.BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+
+    @pytest.fixture
+    def settings(self):
+        return TransferSettings(part_size=MIN_PART_SIZE, max_concurrency=2)
+
+    def test_uploads_and_downloads_in_parts_and_logs_throughput(self, s3, settings):
+        with structlog.testing.capture_logs() as logs:
+            etag = s3_transfer.upload_fileobj(
+                s3,
+                io.BytesIO(self.DATA),
+                self.BUCKET_NAME,
+                self.KEY,
+                len(self.DATA),
+                settings,
+                extra_args={"ServerSideEncryption": "AES256"},
+            )
+            with io.BytesIO() as fh:
+                s3_transfer.download_fileobj(
+                    s3, self.BUCKET_NAME, self.KEY, fh, len(self.DATA), settings
+                )
+                assert fh.getvalue() == self.DATA
+
+        response = s3.head_object(Bucket=self.BUCKET_NAME, Key=self.KEY)
+        assert response["ServerSideEncryption"] == "AES256"
+        # Multipart ETags end with the number of parts
+        assert response["ETag"] == etag
+        assert etag.endswith('-3"')
+        transfer_logs = [log for log in logs if log["event"] == "completed s3 transfer"]
+        assert [log["transfer_operation"] for log in transfer_logs] == [
+            "upload",
+            "download",
+        ]
+        for log in transfer_logs:
+            assert log["transfer_bytes"] == len(self.DATA)
+            assert log["part_size"] == MIN_PART_SIZE
+            assert log["transfer_bytes_per_second"] > 0
+
+    def test_uploads_small_object_in_one_request(self, s3, settings):
+        with mock.patch.object(
+            s3, "create_multipart_upload", wraps=s3.create_multipart_upload
+        ) as mock_create_multipart_upload:
+            etag = s3_transfer.upload_fileobj(
+                s3,
+                io.BytesIO(b"small"),
+                self.BUCKET_NAME,
+                self.KEY,
+                5,
+                settings,
+                extra_args={"ServerSideEncryption": "AES256"},
+            )
+        mock_create_multipart_upload.assert_not_called()
+        response = s3.get_object(Bucket=self.BUCKET_NAME, Key=self.KEY)
+        assert response["Body"].read() == b"small"
+        assert response["ETag"] == etag
+        assert response["ServerSideEncryption"] == "AES256"
+
+    def test_downloads_known_version_without_looking_it_up(self, s3, settings):
+        etag = s3.put_object(Bucket=self.BUCKET_NAME, Key=self.KEY, Body=self.DATA)[
+            "ETag"
+        ]
+        with mock.patch.object(s3, "head_object") as mock_head_object:
+            with io.BytesIO() as fh:
+                s3_transfer.download_fileobj(
+                    s3,
+                    self.BUCKET_NAME,
+                    self.KEY,
+                    fh,
+                    len(self.DATA),
+                    settings,
+                    etag=etag,
+                )
+                assert fh.getvalue() == self.DATA
+        mock_head_object.assert_not_called()
+
+        s3.put_object(Bucket=self.BUCKET_NAME, Key=self.KEY, Body=b"replaced")
+        with pytest.raises(botocore.exceptions.ClientError) as raised:
+            s3_transfer.download_fileobj(
+                s3, self.BUCKET_NAME, self.KEY, io.BytesIO(), 8, settings, etag=etag
+            )
+        assert raised.value.response["Error"]["Code"] == "PreconditionFailed"
+
+    def test_does_not_log_failed_transfer(self, s3, settings):
+        with structlog.testing.capture_logs() as logs:
+            with pytest.raises(botocore.exceptions.ClientError):
+                s3_transfer.download_fileobj(
+                    s3, self.BUCKET_NAME, "does-not-exist", io.BytesIO(), 1, settings
+                )
+        assert logs == []
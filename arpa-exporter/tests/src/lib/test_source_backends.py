@@ -0,0 +1,86 @@
+import datetime
+import os
+import stat
+
+import pytest
+
+from src.lib.source_backends import LocalSourceBackend, S3SourceBackend
+
+
+class TestLocalSourceBackend:
+    def test_reads_source_files_from_directory(self, tmp_path):
+        (tmp_path / "a.xlsm").write_bytes(b"a" * 10)
+        backend = LocalSourceBackend(str(tmp_path))
+
+        assert backend.exists("a.xlsm")
+        assert not backend.exists("b.xlsm")
+        assert backend.getsize("a.xlsm") == 10
+        assert backend.getmtime("a.xlsm") == os.path.getmtime(tmp_path / "a.xlsm")
+        assert backend.location("a.xlsm") == str(tmp_path / "a.xlsm")
+        with backend.get("a.xlsm").open() as fh:
+            assert fh.read() == b"a" * 10
+
+
+class TestS3SourceBackend:
+    BUCKET_NAME = "test-source-backend"
+    PREFIX = "uploads/"
+
+    @pytest.fixture(scope="function", autouse=True)
+    def make_test_bucket(self, s3):
+        s3.create_bucket(
+            Bucket=self.BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+        s3.put_object(Bucket=self.BUCKET_NAME, Key="uploads/a.xlsm", Body=b"a" * 100)
+        s3.put_object(Bucket=self.BUCKET_NAME, Key="uploads/empty.xlsm", Body=b"")
+        s3.put_object(Bucket=self.BUCKET_NAME, Key="uploads/nested/b.xlsm", Body=b"b")
+        s3.put_object(Bucket=self.BUCKET_NAME, Key="c.xlsm", Body=b"c")
+
+    @pytest.fixture
+    def backend(self, s3):
+        return S3SourceBackend(
+            s3, self.BUCKET_NAME, self.PREFIX, part_size=16, max_concurrency=2
+        )
+
+    def test_lists_objects_directly_under_prefix_once(self, s3, backend):
+        assert backend.exists("a.xlsm")
+        assert backend.exists("empty.xlsm")
+        assert not backend.exists("nested/b.xlsm")
+        assert not backend.exists("c.xlsm")
+        assert backend.getsize("a.xlsm") == 100
+        assert backend.getmtime("a.xlsm") == (
+            s3.head_object(Bucket=self.BUCKET_NAME, Key="uploads/a.xlsm")[
+                "LastModified"
+            ].timestamp()
+        )
+        assert backend.location("a.xlsm") == "s3://test-source-backend/uploads/a.xlsm"
+
+        s3.delete_object(Bucket=self.BUCKET_NAME, Key="uploads/a.xlsm")
+        assert backend.exists("a.xlsm")
+
+    def test_treats_prefix_without_trailing_slash_as_directory(self, s3):
+        backend = S3SourceBackend(s3, self.BUCKET_NAME, "uploads")
+        assert backend.exists("a.xlsm")
+        assert not backend.exists("nested/b.xlsm")
+        assert backend.location("a.xlsm") == "s3://test-source-backend/uploads/a.xlsm"
+
+    def test_fails_for_missing_source_file(self, backend):
+        with pytest.raises(FileNotFoundError):
+            backend.getsize("missing.xlsm")
+
+    def test_reads_source_file_data(self, backend):
+        source = backend.get("a.xlsm")
+        with source.open() as fh:
+            assert fh.read() == b"a" * 100
+        assert source.read_head(10) == b"a" * 10
+        assert source.read_head(1000) == b"a" * 100
+        assert backend.get("empty.xlsm").read_head(10) == b""
+
+    def test_describes_source_file_as_zip_entry(self, backend):
+        source = backend.get("a.xlsm")
+        zinfo = source.zipinfo("dir/a.xlsm")
+        assert zinfo.filename == "dir/a.xlsm"
+        assert zinfo.file_size == 100
+        assert stat.S_ISREG(zinfo.external_attr >> 16)
+        assert zinfo.date_time == source.last_modified.astimezone().timetuple()[:6]
+        assert isinstance(source.last_modified, datetime.datetime)
@@ -0,0 +1,57 @@
+import os
+import zipfile
+from unittest import mock
+
+import pytest
+
+from src.lib.source_directory import SourceDirectory, normalize_entry_path
+
+
+@pytest.mark.parametrize(
+    "path_in_zip",
+    [
+        "Quarterly 1/Final Treasury/report--1234.xlsm",
+        "/leading/slash.xlsm",
+        "//double//slashes//report.xlsm",
+        "dir/./other/../report.xlsm",
+        "C:/drive/report.xlsm",
+        "null\x00byte.xlsm",
+        "with, comma/report.xlsm",
+    ],
+)
+def test_normalize_entry_path_matches_zipinfo_from_file(tmp_path, path_in_zip):
+    source_path = tmp_path / "source.xlsm"
+    source_path.write_bytes(b"data")
+    assert (
+        normalize_entry_path(path_in_zip)
+        == zipfile.ZipInfo.from_file(source_path, path_in_zip).filename
+    )
+
+
+class TestSourceDirectory:
+    @pytest.fixture
+    def directory(self, tmp_path):
+        (tmp_path / "a.xlsm").write_bytes(b"a" * 10)
+        (tmp_path / "b.xlsm").write_bytes(b"b" * 20)
+        (tmp_path / "subdirectory.xlsm").mkdir()
+        return tmp_path
+
+    def test_lists_directory_once(self, directory):
+        source_directory = SourceDirectory(str(directory))
+        with mock.patch("os.scandir", wraps=os.scandir) as mock_scandir:
+            assert source_directory.exists(str(directory / "a.xlsm"))
+            assert source_directory.exists(str(directory / "b.xlsm"))
+            assert not source_directory.exists(str(directory / "missing.xlsm"))
+            assert source_directory.getsize(str(directory / "b.xlsm")) == 20
+        mock_scandir.assert_called_once_with(str(directory))
+
+    def test_excludes_entries_that_are_not_regular_files(self, directory):
+        source_directory = SourceDirectory(str(directory))
+        assert not source_directory.exists(str(directory / "subdirectory.xlsm"))
+        with pytest.raises(FileNotFoundError):
+            source_directory.getsize(str(directory / "subdirectory.xlsm"))
+
+    def test_does_not_list_directory_until_needed(self, tmp_path):
+        source_directory = SourceDirectory(str(tmp_path / "does-not-exist"))
+        with pytest.raises(FileNotFoundError):
+            source_directory.exists("anything.xlsm")
@@ -0,0 +1,123 @@
+import time
+from unittest import mock
+
+import botocore.exceptions
+import pytest
+
+from src.lib.shutdown_handler import ShutdownHandler
+from src.lib.visibility_heartbeat import VisibilityHeartbeat
+
+
+class TestVisibilityHeartbeat:
+    @pytest.fixture
+    def queue_url(self, sqs):
+        yield sqs.create_queue(QueueName="heartbeat-queue")["QueueUrl"]
+
+    @pytest.fixture
+    def receipt_handle(self, sqs, queue_url):
+        sqs.send_message(QueueUrl=queue_url, MessageBody="{}")
+        response = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=1)
+        yield response["Messages"][0]["ReceiptHandle"]
+
+    @pytest.mark.timeout(5)
+    def test_extends_visibility_until_stopped(self, sqs, queue_url, receipt_handle):
+        with mock.patch.object(
+            sqs,
+            "change_message_visibility_batch",
+            wraps=sqs.change_message_visibility_batch,
+        ) as mock_change_message_visibility:
+            with VisibilityHeartbeat(
+                sqs,
+                queue_url,
+                [receipt_handle],
+                interval_seconds=0.01,
+                visibility_timeout_seconds=30,
+            ) as heartbeat:
+                while heartbeat.extensions_count < 3:
+                    time.sleep(0.01)
+            calls_when_stopped = mock_change_message_visibility.call_count
+            time.sleep(0.05)
+
+        assert calls_when_stopped >= 3
+        assert mock_change_message_visibility.call_count == calls_when_stopped
+        mock_change_message_visibility.assert_called_with(
+            QueueUrl=queue_url,
+            Entries=[
+                {
+                    "Id": "0",
+                    "ReceiptHandle": receipt_handle,
+                    "VisibilityTimeout": 30,
+                }
+            ],
+        )
+
+    @pytest.mark.timeout(5)
+    def test_stops_when_processing_fails(self, sqs, queue_url, receipt_handle):
+        heartbeat = VisibilityHeartbeat(
+            sqs,
+            queue_url,
+            [receipt_handle],
+            interval_seconds=0.01,
+            visibility_timeout_seconds=30,
+        )
+        with pytest.raises(ValueError):
+            with heartbeat:
+                raise ValueError("processing failed")
+        assert heartbeat._thread is None
+
+    @pytest.mark.timeout(5)
+    def test_stops_when_shutdown_requested(self, sqs, queue_url, receipt_handle):
+        mock_shutdown_handler = mock.Mock(spec=ShutdownHandler)
+        mock_shutdown_handler.is_shutdown_requested.side_effect = [False, True]
+        with mock.patch.object(
+            sqs, "change_message_visibility_batch", return_value={"Successful": []}
+        ) as mock_change:
+            heartbeat = VisibilityHeartbeat(
+                sqs,
+                queue_url,
+                [receipt_handle],
+                interval_seconds=0.01,
+                visibility_timeout_seconds=30,
+                shutdown_handler=mock_shutdown_handler,
+            )
+            heartbeat.start()
+            heartbeat._thread.join()
+            heartbeat.stop()
+        assert mock_change.call_count == 1
+        assert heartbeat.extensions_count == 1
+
+    @pytest.mark.timeout(5)
+    def test_retries_after_error_extending_visibility(self, sqs, queue_url):
+        error = botocore.exceptions.ClientError(
+            {"Error": {"Code": "InternalError", "Message": "try again"}},
+            "ChangeMessageVisibilityBatch",
+        )
+        responses = [
+            error,
+            {"Successful": [], "Failed": [{"Id": "0", "Code": "InternalError"}]},
+        ]
+
+        def change_message_visibility_batch(**kwargs):
+            if not responses:
+                return {"Successful": [{"Id": "0"}], "Failed": []}
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        with mock.patch.object(
+            sqs,
+            "change_message_visibility_batch",
+            side_effect=change_message_visibility_batch,
+        ) as mock_change:
+            with VisibilityHeartbeat(
+                sqs,
+                queue_url,
+                ["receipt-handle"],
+                interval_seconds=0.01,
+                visibility_timeout_seconds=30,
+            ) as heartbeat:
+                while heartbeat.extensions_count < 1:
+                    time.sleep(0.01)
+        assert mock_change.call_count >= 3
+        assert heartbeat.extensions_count >= 1
@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from src.lib.worker_pool import WorkerPool
+
+
+class TestWorkerPool:
+    def test_reserves_up_to_free_workers(self):
+        with WorkerPool(3) as pool:
+            assert pool.reserve(2) == 2
+            assert pool.reserve(5) == 1
+            assert pool.reserve(1, timeout=0.01) == 0
+            pool.release(2)
+            assert pool.reserve(10) == 2
+
+    def test_frees_worker_when_job_finishes(self):
+        started = threading.Event()
+        finish = threading.Event()
+
+        def job():
+            started.set()
+            finish.wait(timeout=5)
+
+        with WorkerPool(1) as pool:
+            assert pool.reserve(1) == 1
+            future = pool.submit(job)
+            assert started.wait(timeout=5)
+            assert pool.reserve(1, timeout=0.01) == 0
+            finish.set()
+            assert pool.reserve(1, timeout=5) == 1
+        assert future.done()
+
+    def test_close_waits_for_submitted_jobs(self):
+        finished = threading.Event()
+        with WorkerPool(2) as pool:
+            pool.reserve(1)
+            pool.submit(lambda: finished.wait(timeout=0.1) or finished.set())
+        assert finished.is_set()
+
+    def test_raises_first_job_error_on_next_reserve(self):
+        error = ValueError("nope")
+
+        def fail():
+            raise error
+
+        with WorkerPool(2) as pool:
+            pool.reserve(1)
+            future = pool.submit(fail)
+            assert future.exception(timeout=5) is error
+            with pytest.raises(ValueError) as raised:
+                pool.reserve(1, timeout=5)
+        assert raised.value is error
@@ -0,0 +1,203 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from src.lib.zip_entries import (
+    CompressionPolicy,
+    compress_file,
+    parse_extensions,
+    read_raw_entry,
+    write_compressed_entry,
+    write_source_entry,
+)
+
+
+class UnseekableWriter(io.RawIOBase):
+    """Write-only stream that (like a network upload) cannot seek."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+    def tell(self):
+        return len(self.data)
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "source.txt"
+    path.write_bytes(b"some highly compressible text\n" * 100_000)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "compress_type",
+    [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA],
+)
+def test_compress_file(source_file, compress_type):
+    entry = compress_file(source_file, "dir/entry.txt", compress_type)
+    assert entry.zinfo.filename == "dir/entry.txt"
+    assert entry.zinfo.file_size == os.path.getsize(source_file)
+    assert entry.zinfo.compress_size == sum(len(c) for c in entry.chunks)
+    if compress_type != zipfile.ZIP_STORED:
+        assert entry.zinfo.compress_size < entry.zinfo.file_size / 10
+
+
+@pytest.mark.parametrize(
+    "compress_type",
+    [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA],
+)
+def test_write_compressed_entry_appends_to_archive(source_file, compress_type):
+    with open(source_file, "rb") as fh:
+        expected_data = fh.read()
+    with io.BytesIO() as fh:
+        with zipfile.ZipFile(fh, "w") as archive:
+            archive.writestr("existing.txt", b"existing")
+        with zipfile.ZipFile(fh, "a") as archive:
+            write_compressed_entry(
+                archive, compress_file(source_file, "new.txt", compress_type)
+            )
+            archive.writestr("after.txt", b"after")
+
+        with zipfile.ZipFile(fh, "r") as archive:
+            assert archive.testzip() is None
+            assert archive.namelist() == ["existing.txt", "new.txt", "after.txt"]
+            assert archive.getinfo("new.txt").compress_type == compress_type
+            assert archive.read("new.txt") == expected_data
+
+
+def test_write_compressed_entry_to_unseekable_stream(source_file):
+    with open(source_file, "rb") as fh:
+        expected_data = fh.read()
+    stream = UnseekableWriter()
+    with zipfile.ZipFile(stream, "w") as archive:
+        write_compressed_entry(
+            archive, compress_file(source_file, "new.txt", zipfile.ZIP_DEFLATED)
+        )
+
+    with zipfile.ZipFile(io.BytesIO(stream.data), "r") as archive:
+        assert archive.testzip() is None
+        # No data descriptor is needed when sizes are known before writing
+        assert not archive.getinfo("new.txt").flag_bits & 0x08
+        assert archive.read("new.txt") == expected_data
+
+
+@pytest.mark.parametrize(
+    ("compress_type", "compress_level"),
+    [(None, None), (zipfile.ZIP_DEFLATED, None), (zipfile.ZIP_DEFLATED, 9)],
+)
+def test_write_source_entry_matches_zipfile_write(
+    source_file, compress_type, compress_level
+):
+    with io.BytesIO() as expected, io.BytesIO() as actual:
+        with zipfile.ZipFile(expected, "w") as archive:
+            archive.write(source_file, "entry.txt", compress_type, compress_level)
+        with zipfile.ZipFile(actual, "w") as archive:
+            write_source_entry(
+                archive, source_file, "entry.txt", compress_type, compress_level
+            )
+        assert actual.getvalue() == expected.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("", frozenset()),
+        (".csv,.txt", frozenset([".csv", ".txt"])),
+        (" CSV, .Txt ,,xlsx,", frozenset([".csv", ".txt", ".xlsx"])),
+    ],
+)
+def test_parse_extensions(value, expected):
+    assert parse_extensions(value) == expected
+
+
+class TestCompressionPolicy:
+    @pytest.fixture
+    def policy(self):
+        return CompressionPolicy(zipfile.ZIP_DEFLATED)
+
+    @pytest.mark.parametrize(
+        ("arcname", "expected_compress_type"),
+        [
+            ("report.XLSM", zipfile.ZIP_STORED),
+            ("report.xlsx", zipfile.ZIP_STORED),
+            ("data.csv", zipfile.ZIP_DEFLATED),
+        ],
+    )
+    def test_chooses_by_extension_without_reading_file(
+        self, policy, arcname, expected_compress_type
+    ):
+        assert (
+            policy.choose_compress_type("does-not-exist", arcname)
+            == expected_compress_type
+        )
+
+    def test_compresses_unknown_extension_when_probe_is_compressible(
+        self, policy, source_file
+    ):
+        assert (
+            policy.choose_compress_type(source_file, "notes.unknown")
+            == zipfile.ZIP_DEFLATED
+        )
+
+    def test_stores_unknown_extension_when_probe_is_incompressible(
+        self, policy, tmp_path
+    ):
+        path = tmp_path / "random.bin"
+        path.write_bytes(os.urandom(256 * 1024))
+        assert (
+            policy.choose_compress_type(str(path), "random.bin") == zipfile.ZIP_STORED
+        )
+        entry = policy.compress(str(path), "random.bin")
+        assert entry.zinfo.compress_type == zipfile.ZIP_STORED
+        assert entry.zinfo.compress_size == entry.zinfo.file_size
+
+
+@pytest.mark.parametrize("source_seekable", [True, False])
+def test_read_raw_entry_copies_and_renames_entry(source_file, source_seekable):
+    with open(source_file, "rb") as fh:
+        expected_data = fh.read()
+    source_stream = io.BytesIO() if source_seekable else UnseekableWriter()
+    with zipfile.ZipFile(source_stream, "w") as archive:
+        archive.writestr("other.txt", b"other")
+        archive.write(source_file, "old/name.txt", zipfile.ZIP_DEFLATED)
+    source_data = (
+        source_stream.getvalue()
+        if isinstance(source_stream, io.BytesIO)
+        else bytes(source_stream.data)
+    )
+
+    with io.BytesIO(source_data) as source_fh, io.BytesIO() as dest_fh:
+        with zipfile.ZipFile(source_fh, "r") as source_archive:
+            zinfo = source_archive.getinfo("old/name.txt")
+            with zipfile.ZipFile(dest_fh, "w") as dest_archive:
+                write_compressed_entry(
+                    dest_archive, read_raw_entry(source_fh, zinfo, "new/name.txt")
+                )
+
+        with zipfile.ZipFile(dest_fh, "r") as dest_archive:
+            assert dest_archive.testzip() is None
+            assert dest_archive.namelist() == ["new/name.txt"]
+            copied = dest_archive.getinfo("new/name.txt")
+            assert copied.compress_type == zipfile.ZIP_DEFLATED
+            assert copied.compress_size == zinfo.compress_size
+            assert dest_archive.read("new/name.txt") == expected_data
+
+
+def test_read_raw_entry_fails_for_bad_header_offset(source_file):
+    with io.BytesIO() as fh:
+        with zipfile.ZipFile(fh, "w") as archive:
+            archive.write(source_file, "name.txt")
+        with zipfile.ZipFile(fh, "r") as archive:
+            zinfo = archive.getinfo("name.txt")
+            zinfo.header_offset += 1
+            with pytest.raises(zipfile.BadZipFile):
+                read_raw_entry(fh, zinfo)
@@ -1,17 +1,27 @@
+import concurrent.futures
 import csv
 import io
 import json
 import os
 import tempfile
+import threading
 import zipfile
 import zlib
 from unittest import mock
 
 import pydantic
 import pytest
+import structlog
 
 from src import worker
+from src.lib import s3_transfer
+from src.lib.job_metrics import JobMetrics
+from src.lib.notifier import BackgroundNotifier
+from src.lib.s3_transfer import TransferSettings
 from src.lib.shutdown_handler import ShutdownHandler
+from src.lib.source_backends import S3SourceBackend
+from src.lib.worker_pool import WorkerPool
+from src.lib.zip_entries import CompressionPolicy
 
 SAMPLE_METADATA_1_CSV_PATH = os.path.join(
     os.environ["DATA_DIR"], "sample_metadata_1.csv"
@@ -25,6 +35,56 @@ def sample_metadata_1_UploadInfo():
         yield [worker.UploadInfo(**row) for row in reader]
 
 
+def upload_source_files(s3, bucket, prefix, uploads):
+    """Copies the source files of ``uploads`` from ``DATA_DIR`` to S3 objects."""
+    for upload in uploads:
+        with open(worker.get_source_path(upload), "rb") as fh:
+            s3.upload_fileobj(fh, bucket, f"{prefix}{worker.get_source_name(upload)}")
+
+
+def enqueue_request(sqs, queue_url: str, **overrides) -> None:
+    """Sends a message requesting an export to an SQS queue. Fields of the
+    ``MessageSchema`` that are not overridden have placeholder values.
+    """
+    fields = {
+        "s3": worker.S3Schema(
+            bucket="does-not-matter",
+            zip_key="does-not-matter.zip",
+            metadata_key="does-not-matter.csv",
+        ),
+        "organization_id": 1234,
+        "user_email": "fake@example.gov",
+        "recreate_archive": False,
+        **overrides,
+    }
+    sqs.send_message(
+        QueueUrl=queue_url,
+        MessageBody=worker.MessageSchema(**fields).model_dump_json(),
+    )
+
+
+def make_previous_entry_data(upload: worker.UploadInfo) -> bytes:
+    """Returns placeholder data that is distinguishable from an upload's source file
+    but has the same size, so that it can be reused as a previous archive entry.
+    """
+    source_path, _ = worker.get_entry_paths(upload)
+    return f"previous data for {upload.upload_id}".encode().ljust(
+        os.path.getsize(source_path), b"."
+    )
+
+
+def make_previous_entry_info(
+    upload: worker.UploadInfo, arcname: str, compress_type: int = zipfile.ZIP_STORED
+) -> zipfile.ZipInfo:
+    """Returns a ``ZipInfo`` for an entry named ``arcname`` that records the last
+    modification time of an upload's source file, like an entry written from it.
+    """
+    source_path, _ = worker.get_entry_paths(upload)
+    zinfo = zipfile.ZipInfo.from_file(source_path, arcname)
+    zinfo.compress_type = compress_type
+    return zinfo
+
+
 class TestBuildZip:
     def test_build_zip_result(self, sample_metadata_1_UploadInfo):
         with tempfile.NamedTemporaryFile() as tmp:
@@ -47,6 +107,231 @@ class TestBuildZip:
                         source_file_checksum = zlib.crc32(source_fh.read())
                         assert source_file_checksum == zipped_file_checksum
 
+    @pytest.mark.parametrize("prefetch_workers", [0, 2])
+    def test_build_zip_records_metrics(
+        self, sample_metadata_1_UploadInfo, prefetch_workers
+    ):
+        metrics = JobMetrics()
+        with tempfile.NamedTemporaryFile() as tmp:
+            worker.build_zip(
+                tmp,
+                iter(sample_metadata_1_UploadInfo),
+                prefetch_workers=prefetch_workers,
+                metrics=metrics,
+            )
+            worker.build_zip(tmp, iter(sample_metadata_1_UploadInfo), metrics=metrics)
+            with zipfile.ZipFile(tmp, "r") as archive:
+                entries_size = sum(zinfo.file_size for zinfo in archive.infolist())
+        count = len(sample_metadata_1_UploadInfo)
+        assert metrics.get("diff").counts == {
+            "entries_checked": 2 * count,
+            "entries_existing": count,
+        }
+        writes = metrics.get("entry_writes")
+        assert writes.counts == {
+            "entries_added": count,
+            "compressed_bytes": entries_size,
+        }
+        assert writes.bytes == entries_size
+        assert writes.seconds > 0
+
+    @pytest.mark.parametrize("compress_workers", [1, 3])
+    def test_build_zip_compresses_entries_in_metadata_order(
+        self, sample_metadata_1_UploadInfo, compress_workers
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            updated = worker.build_zip(
+                tmp,
+                (_ for _ in sample_metadata_1_UploadInfo),
+                compression=CompressionPolicy(
+                    zipfile.ZIP_DEFLATED, stored_extensions=frozenset(), probe_size=0
+                ),
+                compress_workers=compress_workers,
+            )
+            assert updated is True
+
+            with zipfile.ZipFile(tmp, "r") as archive:
+                assert archive.testzip() is None
+                assert archive.namelist() == [
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                ]
+                for ui in sample_metadata_1_UploadInfo:
+                    zinfo = archive.getinfo(ui.path_in_zip)
+                    assert zinfo.compress_type == zipfile.ZIP_DEFLATED
+                    source_path, _ = worker.get_entry_paths(ui)
+                    with open(source_path, "rb") as source_fh:
+                        assert zlib.crc32(source_fh.read()) == zinfo.CRC
+
+    @pytest.mark.parametrize(
+        ("max_pending_bytes", "expected_prefetched_count"),
+        [(1024**3, 4), (0, 0)],
+    )
+    def test_build_zip_prefetches_source_files_within_budget(
+        self, sample_metadata_1_UploadInfo, max_pending_bytes, expected_prefetched_count
+    ):
+        with (
+            tempfile.NamedTemporaryFile() as tmp,
+            mock.patch.object(
+                worker, "compress_file", wraps=worker.compress_file
+            ) as mock_compress_file,
+        ):
+            updated = worker.build_zip(
+                tmp,
+                (_ for _ in sample_metadata_1_UploadInfo),
+                prefetch_workers=2,
+                max_pending_bytes=max_pending_bytes,
+            )
+            assert updated is True
+            assert mock_compress_file.call_count == expected_prefetched_count
+
+            with zipfile.ZipFile(tmp, "r") as archive:
+                assert archive.testzip() is None
+                assert archive.namelist() == [
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                ]
+                for ui in sample_metadata_1_UploadInfo:
+                    zinfo = archive.getinfo(ui.path_in_zip)
+                    assert zinfo.compress_type == zipfile.ZIP_STORED
+                    source_path, _ = worker.get_entry_paths(ui)
+                    with open(source_path, "rb") as source_fh:
+                        assert zlib.crc32(source_fh.read()) == zinfo.CRC
+
+    @pytest.mark.parametrize(
+        "build_options",
+        [
+            {},
+            {"prefetch_workers": 2},
+            {
+                "compression": CompressionPolicy(zipfile.ZIP_DEFLATED),
+                "compress_workers": 2,
+            },
+            {
+                "compression": CompressionPolicy(zipfile.ZIP_DEFLATED, probe_size=0),
+                "max_pending_bytes": 0,
+            },
+        ],
+    )
+    def test_build_zip_reads_source_files_from_s3(
+        self, s3, sample_metadata_1_UploadInfo, build_options
+    ):
+        s3.create_bucket(
+            Bucket="test-source-files",
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+        upload_source_files(
+            s3, "test-source-files", "uploads/", sample_metadata_1_UploadInfo
+        )
+        source_backend = S3SourceBackend(
+            s3, "test-source-files", "uploads/", part_size=64 * 1024
+        )
+
+        with (
+            tempfile.NamedTemporaryFile() as tmp,
+            mock.patch("builtins.open", wraps=open) as mock_open,
+        ):
+            assert worker.build_zip(
+                tmp,
+                (_ for _ in sample_metadata_1_UploadInfo),
+                source_backend=source_backend,
+                **build_options,
+            )
+            assert not any(
+                str(call.args[0]).startswith(os.environ["DATA_DIR"])
+                for call in mock_open.call_args_list
+            )
+
+            with zipfile.ZipFile(tmp, "r") as archive:
+                assert archive.testzip() is None
+                assert archive.namelist() == [
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                ]
+                for ui in sample_metadata_1_UploadInfo:
+                    with open(worker.get_source_path(ui), "rb") as source_fh:
+                        assert archive.read(ui.path_in_zip) == source_fh.read()
+
+    @pytest.mark.parametrize(
+        ("compression", "reused_compress_type"),
+        [
+            (None, zipfile.ZIP_STORED),
+            (
+                CompressionPolicy(
+                    compress_type=zipfile.ZIP_DEFLATED,
+                    stored_extensions=frozenset(),
+                    compressed_extensions=frozenset([".xlsm"]),
+                ),
+                zipfile.ZIP_DEFLATED,
+            ),
+        ],
+    )
+    def test_copies_entries_from_previous_archive(
+        self, sample_metadata_1_UploadInfo, compression, reused_compress_type
+    ):
+        reused, recompressed, modified, resized = sample_metadata_1_UploadInfo[:4]
+        other_compress_type = (
+            zipfile.ZIP_DEFLATED
+            if reused_compress_type == zipfile.ZIP_STORED
+            else zipfile.ZIP_STORED
+        )
+        with (
+            tempfile.NamedTemporaryFile() as previous,
+            tempfile.NamedTemporaryFile() as tmp,
+        ):
+            with zipfile.ZipFile(previous, "w") as previous_archive:
+                previous_archive.writestr(
+                    make_previous_entry_info(
+                        reused,
+                        f"Old Path/{os.path.basename(reused.path_in_zip)}",
+                        reused_compress_type,
+                    ),
+                    make_previous_entry_data(reused),
+                )
+                # Entries compressed differently than new entries are not reused
+                previous_archive.writestr(
+                    make_previous_entry_info(
+                        recompressed, recompressed.path_in_zip, other_compress_type
+                    ),
+                    make_previous_entry_data(recompressed),
+                )
+                # Nor are entries for source files modified since they were written
+                zinfo = make_previous_entry_info(
+                    modified, modified.path_in_zip, reused_compress_type
+                )
+                zinfo.date_time = (2000, 1, 1, 0, 0, 0)
+                previous_archive.writestr(zinfo, make_previous_entry_data(modified))
+                # Nor entries whose size differs from the source file
+                previous_archive.writestr(
+                    make_previous_entry_info(
+                        resized, resized.path_in_zip, reused_compress_type
+                    ),
+                    b"wrong size",
+                )
+                previous_archive.writestr("Old Path/stale.xlsm", b"stale")
+
+            with zipfile.ZipFile(previous, "r") as previous_archive:
+                updated = worker.build_zip(
+                    tmp,
+                    (_ for _ in sample_metadata_1_UploadInfo),
+                    mode="w",
+                    compression=compression,
+                    previous_archive=previous_archive,
+                )
+            assert updated is True
+
+            with zipfile.ZipFile(tmp, "r") as archive:
+                assert archive.testzip() is None
+                assert archive.namelist() == [
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                ]
+                assert archive.read(reused.path_in_zip) == make_previous_entry_data(
+                    reused
+                )
+                for ui in sample_metadata_1_UploadInfo[1:]:
+                    zinfo = archive.getinfo(ui.path_in_zip)
+                    assert zinfo.compress_type == reused_compress_type
+                    source_path, _ = worker.get_entry_paths(ui)
+                    with open(source_path, "rb") as source_fh:
+                        assert zlib.crc32(source_fh.read()) == zinfo.CRC
+
     def test_skips_source_file_when_present_in_zip(self, sample_metadata_1_UploadInfo):
         extant_file_data = b"this is some test data"
         extant_file_entry_path = sample_metadata_1_UploadInfo[0].path_in_zip
@@ -91,6 +376,17 @@ class TestBuildZip:
                 # Ensure the zip contains no additional (duplicate) entries
                 assert len(archive.namelist()) == len(sample_metadata_1_UploadInfo)
 
+    def test_adds_one_entry_when_metadata_repeats_path_in_zip(
+        self, sample_metadata_1_UploadInfo
+    ):
+        repeated = sample_metadata_1_UploadInfo + sample_metadata_1_UploadInfo[:2]
+
+        with tempfile.NamedTemporaryFile() as tmp:
+            updated = worker.build_zip(tmp, (_ for _ in repeated))
+            assert updated is True
+            with zipfile.ZipFile(tmp, "r") as archive:
+                assert len(archive.namelist()) == len(sample_metadata_1_UploadInfo)
+
     def test_returns_False_without_modifying_zip_when_source_files_is_empty(self):
         with tempfile.NamedTemporaryFile() as tmp:
             updated = worker.build_zip(tmp, (_ for _ in []))
@@ -105,8 +401,13 @@ class TestBuildZip:
             with zipfile.ZipFile(tmp, "w") as archive:
                 for u in sample_metadata_1_UploadInfo:
                     archive.writestr(u.path_in_zip, "does not matter")
-            updated = worker.build_zip(tmp, (_ for _ in sample_metadata_1_UploadInfo))
+            # Skipped entries are not looked up in the source directory
+            with mock.patch.object(zipfile.ZipInfo, "from_file") as mock_from_file:
+                updated = worker.build_zip(
+                    tmp, (_ for _ in sample_metadata_1_UploadInfo)
+                )
             assert updated is False
+            mock_from_file.assert_not_called()
             with zipfile.ZipFile(tmp, "r") as archive:
                 assert len(archive.namelist()) == len(sample_metadata_1_UploadInfo)
 
@@ -128,6 +429,38 @@ class TestBuildZip:
                 )
 
 
+class TestPreflightSourceUploads:
+    def test_returns_all_uploads_when_source_files_exist(
+        self, sample_metadata_1_UploadInfo
+    ):
+        assert (
+            worker.preflight_source_uploads(iter(sample_metadata_1_UploadInfo))
+            == sample_metadata_1_UploadInfo
+        )
+
+    def test_fails_naming_every_missing_source_file(self, sample_metadata_1_UploadInfo):
+        sample_metadata_1_UploadInfo[0].upload_id = "missing-1"
+        sample_metadata_1_UploadInfo[-1].upload_id = "missing-2"
+        with pytest.raises(FileNotFoundError) as raised:
+            worker.preflight_source_uploads(iter(sample_metadata_1_UploadInfo))
+        assert "2 of 4 source files are missing" in str(raised.value)
+        assert "missing-1.xlsm" in str(raised.value)
+        assert "missing-2.xlsm" in str(raised.value)
+
+    def test_logs_location_of_source_backend(self, s3, sample_metadata_1_UploadInfo):
+        s3.create_bucket(
+            Bucket="source-bucket",
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+        with structlog.testing.capture_logs() as logs:
+            with pytest.raises(FileNotFoundError):
+                worker.preflight_source_uploads(
+                    iter(sample_metadata_1_UploadInfo),
+                    S3SourceBackend(s3, "source-bucket", "uploads"),
+                )
+        assert logs[0]["source_location"] == "s3://source-bucket/uploads/"
+
+
 class TestLoadSourceUploadsFromCSV:
     BUCKET_NAME = "test-apra-audit-reports"
 
@@ -192,6 +525,140 @@ class TestLoadSourceUploadsFromCSV:
             next(gen)
 
 
+@pytest.mark.parametrize(
+    ("path_in_zip", "expected_upload_id"),
+    [
+        ("Quarterly 1/Final Treasury/Workbook--abc-123.xlsm", "abc-123"),
+        ("Workbook -- with--dashes--abc-123.xlsx", "abc-123"),
+        ("Workbook--abc-123", "abc-123"),
+        ("Workbook.xlsm", None),
+        ("Workbook--.xlsm", None),
+    ],
+)
+def test_get_upload_id_from_entry_path(path_in_zip, expected_upload_id):
+    assert worker.get_upload_id_from_entry_path(path_in_zip) == expected_upload_id
+
+
+class TestRemoteArchiveIsComplete:
+    BUCKET_NAME = "test-apra-audit-reports"
+
+    @pytest.fixture
+    def s3_data(self):
+        yield worker.S3Schema(
+            bucket=self.BUCKET_NAME,
+            zip_key="archive-in-s3.zip",
+            metadata_key="metadata.csv",
+        )
+
+    @pytest.fixture(scope="function", autouse=True)
+    def make_test_bucket(self, s3, s3_data):
+        s3.create_bucket(
+            Bucket=self.BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+        with open(SAMPLE_METADATA_1_CSV_PATH, "rb") as fh:
+            s3.upload_fileobj(fh, Bucket=s3_data.bucket, Key=s3_data.metadata_key)
+
+    def upload_archive(self, s3, s3_data, entry_names):
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                for name in entry_names:
+                    archive.writestr(name, b"some placeholder content")
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, s3_data.bucket, s3_data.zip_key)
+
+    def test_true_when_all_entries_present(
+        self, s3, s3_data, sample_metadata_1_UploadInfo
+    ):
+        self.upload_archive(
+            s3,
+            s3_data,
+            [ui.path_in_zip for ui in sample_metadata_1_UploadInfo] + ["extra.xlsm"],
+        )
+        assert worker.remote_archive_is_complete(s3, s3_data) is True
+
+    def test_false_when_entries_missing(
+        self, s3, s3_data, sample_metadata_1_UploadInfo
+    ):
+        self.upload_archive(
+            s3, s3_data, [ui.path_in_zip for ui in sample_metadata_1_UploadInfo[1:]]
+        )
+        assert worker.remote_archive_is_complete(s3, s3_data) is False
+
+    def test_false_when_archive_does_not_exist(self, s3, s3_data):
+        assert worker.remote_archive_is_complete(s3, s3_data) is False
+
+    def test_false_when_archive_is_not_a_zip_file(self, s3, s3_data):
+        s3.put_object(
+            Bucket=s3_data.bucket, Key=s3_data.zip_key, Body=b"not a zip file"
+        )
+        assert worker.remote_archive_is_complete(s3, s3_data) is False
+
+    def test_fails_when_bucket_does_not_exist(self, s3, s3_data):
+        s3_data.bucket = "does-not-exist"
+        with pytest.raises(s3.exceptions.ClientError):
+            worker.remote_archive_is_complete(s3, s3_data)
+
+    def test_uses_current_manifest_without_reading_zip_file(
+        self, s3, s3_data, sample_metadata_1_UploadInfo
+    ):
+        self.upload_archive(s3, s3_data, [])
+        etag = s3.head_object(Bucket=s3_data.bucket, Key=s3_data.zip_key)["ETag"]
+        manifest = worker.ArchiveManifest(
+            archive_etag=etag,
+            central_directory_offset=0,
+            entries=[
+                worker.ManifestEntry(
+                    name=ui.path_in_zip,
+                    upload_id=ui.upload_id,
+                    header_offset=0,
+                    compress_type=zipfile.ZIP_STORED,
+                    compress_size=0,
+                    file_size=0,
+                    crc=0,
+                )
+                for ui in sample_metadata_1_UploadInfo
+            ],
+        )
+        worker.write_archive_manifest(s3, s3_data, manifest)
+
+        with mock.patch.object(worker, "open_remote_archive") as mock_open:
+            assert worker.remote_archive_is_complete(s3, s3_data) is True
+        mock_open.assert_not_called()
+
+    @pytest.mark.parametrize("manifest_body", [None, b"not json", "stale"])
+    def test_rebuilds_missing_or_inconsistent_manifest(
+        self, s3, s3_data, sample_metadata_1_UploadInfo, manifest_body
+    ):
+        entry_names = [ui.path_in_zip for ui in sample_metadata_1_UploadInfo]
+        self.upload_archive(s3, s3_data, entry_names)
+        if manifest_body == "stale":
+            worker.write_archive_manifest(
+                s3,
+                s3_data,
+                worker.ArchiveManifest(
+                    archive_etag='"stale"', central_directory_offset=0, entries=[]
+                ),
+            )
+        elif manifest_body is not None:
+            s3.put_object(
+                Bucket=s3_data.bucket, Key=s3_data.manifest_key, Body=manifest_body
+            )
+
+        assert worker.remote_archive_is_complete(s3, s3_data) is True
+
+        manifest = worker.read_archive_manifest(s3, s3_data)
+        assert manifest is not None
+        assert (
+            manifest.archive_etag
+            == s3.head_object(Bucket=s3_data.bucket, Key=s3_data.zip_key)["ETag"]
+        )
+        assert [entry.name for entry in manifest.entries] == entry_names
+        assert [entry.upload_id for entry in manifest.entries] == [
+            ui.upload_id for ui in sample_metadata_1_UploadInfo
+        ]
+
+
 class TestNotifyUser:
     @mock.patch("src.worker.API_DOMAIN", new="https://api.example.org")
     def test_sends_email_with_download_urls(self, ses, ses_sent_messages):
@@ -309,6 +776,110 @@ class TestProcessSQSMessageRequest:
 
                 assert expected_namelist == set(actual_namelist)
 
+    @pytest.mark.parametrize("recreate_archive", [True, False])
+    def test_writes_manifest_for_uploaded_zip(
+        self, s3, ses, sqs_message, sample_metadata_1_UploadInfo, recreate_archive
+    ):
+        sqs_message.recreate_archive = recreate_archive
+        with (
+            mock.patch.object(s3, "head_object", wraps=s3.head_object) as head_object,
+            tempfile.NamedTemporaryFile() as tmp,
+        ):
+            worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        # The zip file is only looked up before it is built, not after uploading it
+        assert [
+            c.kwargs["Key"]
+            for c in head_object.call_args_list
+            if c.kwargs["Key"] == sqs_message.s3.zip_key
+        ] == [sqs_message.s3.zip_key]
+        assert sqs_message.s3.manifest_key == "archive-in-s3.manifest.json"
+        manifest = worker.read_archive_manifest(s3, sqs_message.s3)
+        assert manifest is not None
+        assert (
+            manifest.archive_etag
+            == s3.head_object(Bucket=self.BUCKET_NAME, Key=sqs_message.s3.zip_key)[
+                "ETag"
+            ]
+        )
+        assert (
+            manifest.metadata_etag
+            == s3.head_object(Bucket=self.BUCKET_NAME, Key=sqs_message.s3.metadata_key)[
+                "ETag"
+            ]
+        )
+        with tempfile.NamedTemporaryFile() as tmp:
+            s3.download_fileobj(self.BUCKET_NAME, sqs_message.s3.zip_key, tmp)
+            with zipfile.ZipFile(tmp, "r") as archive:
+                assert manifest.central_directory_offset == archive.start_dir
+                assert [
+                    (entry.name, entry.header_offset, entry.compress_size, entry.crc)
+                    for entry in manifest.entries
+                ] == [
+                    (
+                        zinfo.filename,
+                        zinfo.header_offset,
+                        zinfo.compress_size,
+                        zinfo.CRC,
+                    )
+                    for zinfo in archive.infolist()
+                ]
+
+    def test_skips_to_notification_when_metadata_unchanged_since_build(
+        self, s3, ses, sqs_message, ses_sent_messages
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+        metadata_etag = s3.head_object(
+            Bucket=self.BUCKET_NAME, Key=sqs_message.s3.metadata_key
+        )["ETag"]
+        assert (
+            s3.head_object(Bucket=self.BUCKET_NAME, Key=sqs_message.s3.zip_key)[
+                "Metadata"
+            ][worker.ZIP_METADATA_ETAG_KEY]
+            == metadata_etag
+        )
+
+        with (
+            mock.patch.object(s3, "get_object", wraps=s3.get_object) as mock_get_object,
+            mock.patch("src.worker.download_fileobj") as mock_download_fileobj,
+            mock.patch("src.worker.upload_fileobj") as mock_upload_fileobj,
+        ):
+            with tempfile.NamedTemporaryFile() as tmp:
+                worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        # Only the CSV metadata is read (for preflight checks), not the zip file
+        assert [c.kwargs["Key"] for c in mock_get_object.call_args_list] == [
+            sqs_message.s3.metadata_key
+        ]
+        assert mock_download_fileobj.called is False
+        assert mock_upload_fileobj.called is False
+        assert len(ses_sent_messages) == 2
+
+    def test_rebuilds_when_metadata_changed_since_build(
+        self, s3, ses, sqs_message, sample_metadata_1_UploadInfo
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                archive.writestr("extra.xlsm", b"some placeholder content")
+            tmp.seek(0)
+            s3.upload_fileobj(
+                tmp,
+                self.BUCKET_NAME,
+                sqs_message.s3.zip_key,
+                ExtraArgs={"Metadata": {worker.ZIP_METADATA_ETAG_KEY: '"stale"'}},
+            )
+
+        with tempfile.NamedTemporaryFile() as tmp:
+            worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        with tempfile.NamedTemporaryFile() as tmp:
+            s3.download_fileobj(self.BUCKET_NAME, sqs_message.s3.zip_key, tmp)
+            with zipfile.ZipFile(tmp, "r") as resulting_archive:
+                assert set(resulting_archive.namelist()) == {"extra.xlsm"} | {
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                }
+
     def test_skips_upload_when_no_files_added_to_zip(
         self,
         s3,
@@ -323,12 +894,402 @@ class TestProcessSQSMessageRequest:
             tmp.seek(0)
             s3.upload_fileobj(tmp, self.BUCKET_NAME, sqs_message.s3.zip_key)
 
-        with mock.patch.object(s3, "upload_fileobj") as mock_upload_file_object:
+        with mock.patch("src.worker.upload_fileobj") as mock_upload_file_object:
             with tempfile.NamedTemporaryFile() as tmp:
                 worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
 
         assert mock_upload_file_object.called is False
 
+    def test_skips_download_when_remote_archive_is_complete(
+        self,
+        s3,
+        ses,
+        sqs_message,
+        sample_metadata_1_UploadInfo,
+        ses_sent_messages,
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                for ui in sample_metadata_1_UploadInfo:
+                    archive.writestr(ui.path_in_zip, b"some placeholder content")
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, self.BUCKET_NAME, sqs_message.s3.zip_key)
+
+        with mock.patch("src.worker.download_fileobj") as mock_download_fileobj:
+            with tempfile.NamedTemporaryFile() as tmp:
+                worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        assert mock_download_fileobj.called is False
+        assert len(ses_sent_messages) == 1
+
+    @pytest.mark.parametrize("remote_plan_enabled", [True, False])
+    def test_downloads_when_remote_archive_is_incomplete(
+        self,
+        s3,
+        ses,
+        sqs_message,
+        sample_metadata_1_UploadInfo,
+        remote_plan_enabled,
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                for ui in sample_metadata_1_UploadInfo[:-1]:
+                    archive.writestr(ui.path_in_zip, b"some placeholder content")
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, self.BUCKET_NAME, sqs_message.s3.zip_key)
+
+        with (
+            mock.patch("src.worker.REMOTE_PLAN_ENABLED", remote_plan_enabled),
+            mock.patch(
+                "src.worker.download_fileobj", wraps=worker.download_fileobj
+            ) as mock_download_fileobj,
+            tempfile.NamedTemporaryFile() as tmp,
+        ):
+            worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        assert mock_download_fileobj.called is True
+        with tempfile.NamedTemporaryFile() as tmp:
+            s3.download_fileobj(self.BUCKET_NAME, sqs_message.s3.zip_key, tmp)
+            with zipfile.ZipFile(tmp, "r") as resulting_archive:
+                assert set(resulting_archive.namelist()) == {
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                }
+
+    def test_looks_up_existing_zip_once_before_downloading_it(
+        self, s3, ses, sqs_message, sample_metadata_1_UploadInfo
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                for ui in sample_metadata_1_UploadInfo[:-1]:
+                    archive.writestr(ui.path_in_zip, b"some placeholder content")
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, self.BUCKET_NAME, sqs_message.s3.zip_key)
+
+        requests = []
+        head_object = s3.head_object
+
+        def record_head_object(**kwargs):
+            requests.append(("head", kwargs["Key"]))
+            return head_object(**kwargs)
+
+        def record_download(s3, bucket, key, *args, **kwargs):
+            requests.append(("download", key))
+            return s3_transfer.download_fileobj(s3, bucket, key, *args, **kwargs)
+
+        with (
+            mock.patch("src.worker.REMOTE_PLAN_ENABLED", True),
+            mock.patch("src.worker.SKIP_UNCHANGED_METADATA_ENABLED", True),
+            mock.patch.object(s3, "head_object", side_effect=record_head_object),
+            mock.patch("src.worker.download_fileobj", side_effect=record_download),
+            tempfile.NamedTemporaryFile() as tmp,
+        ):
+            worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        zip_key = sqs_message.s3.zip_key
+        downloaded_at = requests.index(("download", zip_key))
+        assert requests[:downloaded_at].count(("head", zip_key)) == 1
+
+    def test_uses_cached_zip_from_previous_request(
+        self,
+        s3,
+        ses,
+        sqs_message,
+        sample_metadata_1_UploadInfo,
+        tmp_path,
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                for ui in sample_metadata_1_UploadInfo[:-1]:
+                    archive.writestr(ui.path_in_zip, b"some placeholder content")
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, self.BUCKET_NAME, sqs_message.s3.zip_key)
+
+        archive_cache = worker.ArchiveCache(str(tmp_path / "cache"), 1024**3)
+        with (
+            mock.patch("src.worker.REMOTE_PLAN_ENABLED", False),
+            mock.patch("src.worker.SKIP_UNCHANGED_METADATA_ENABLED", False),
+            mock.patch("src.worker.get_archive_cache", return_value=archive_cache),
+            mock.patch(
+                "src.lib.archive_cache.download_fileobj", wraps=worker.download_fileobj
+            ) as mock_download_fileobj,
+        ):
+            with tempfile.NamedTemporaryFile() as tmp:
+                worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+            assert mock_download_fileobj.call_count == 1
+            assert archive_cache.size > 0
+
+            with tempfile.NamedTemporaryFile() as tmp:
+                worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+                with zipfile.ZipFile(tmp, "r") as cached_archive:
+                    assert set(cached_archive.namelist()) == {
+                        ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                    }
+            assert mock_download_fileobj.call_count == 1
+
+    def test_compacts_zip_with_stale_entries(
+        self,
+        s3,
+        ses,
+        sqs_message,
+        sample_metadata_1_UploadInfo,
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                archive.writestr("Old Path/stale.xlsm", b"stale")
+                for ui in sample_metadata_1_UploadInfo[:-1]:
+                    archive.writestr(
+                        make_previous_entry_info(
+                            ui, f"Old Path/{os.path.basename(ui.path_in_zip)}"
+                        ),
+                        make_previous_entry_data(ui),
+                    )
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, self.BUCKET_NAME, sqs_message.s3.zip_key)
+
+        with (
+            mock.patch("src.worker.ARCHIVE_COMPACTION_ENABLED", True),
+            mock.patch("src.worker.upload_fileobj") as mock_upload_fileobj,
+            tempfile.NamedTemporaryFile() as tmp,
+        ):
+            worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        assert mock_upload_fileobj.called is False
+        with tempfile.NamedTemporaryFile() as tmp:
+            s3.download_fileobj(self.BUCKET_NAME, sqs_message.s3.zip_key, tmp)
+            with zipfile.ZipFile(tmp, "r") as resulting_archive:
+                assert resulting_archive.testzip() is None
+                assert resulting_archive.namelist() == [
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                ]
+                for ui in sample_metadata_1_UploadInfo[:-1]:
+                    assert resulting_archive.read(
+                        ui.path_in_zip
+                    ) == make_previous_entry_data(ui)
+
+    def test_copies_unchanged_prefix_when_appending_to_large_zip(
+        self,
+        s3,
+        ses,
+        sqs_message,
+        sample_metadata_1_UploadInfo,
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                for ui in sample_metadata_1_UploadInfo[:-1]:
+                    source_path, _ = worker.get_entry_paths(ui)
+                    archive.write(source_path, ui.path_in_zip)
+                # Ensure the zip exceeds the minimum size for copying a part
+                archive.writestr("padding.bin", os.urandom(worker.MIN_PART_SIZE))
+            assert tmp.tell() >= worker.MIN_PART_SIZE
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, self.BUCKET_NAME, sqs_message.s3.zip_key)
+
+        with (
+            mock.patch("src.worker.upload_fileobj") as mock_upload_fileobj,
+            mock.patch(
+                "src.worker.upload_appended_object",
+                wraps=worker.upload_appended_object,
+            ) as mock_upload_appended_object,
+            tempfile.NamedTemporaryFile() as tmp,
+        ):
+            worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        assert mock_upload_fileobj.called is False
+        assert mock_upload_appended_object.called is True
+        with tempfile.NamedTemporaryFile() as tmp:
+            s3.download_fileobj(self.BUCKET_NAME, sqs_message.s3.zip_key, tmp)
+            with zipfile.ZipFile(tmp, "r") as resulting_archive:
+                assert resulting_archive.testzip() is None
+                assert set(resulting_archive.namelist()) == {
+                    "padding.bin",
+                    *(ui.path_in_zip for ui in sample_metadata_1_UploadInfo),
+                }
+
+    def test_streams_recreated_zip_to_s3_without_local_file(
+        self, s3, ses, sqs_message, sample_metadata_1_UploadInfo
+    ):
+        sqs_message.recreate_archive = True
+        local_file = mock.Mock()
+        with mock.patch("src.worker.upload_fileobj") as mock_upload_fileobj:
+            worker.process_sqs_message_request(s3, ses, sqs_message, local_file)
+
+        assert mock_upload_fileobj.called is False
+        assert local_file.method_calls == []
+        with tempfile.NamedTemporaryFile() as tmp:
+            s3.download_fileobj(self.BUCKET_NAME, sqs_message.s3.zip_key, tmp)
+            with zipfile.ZipFile(tmp, "r") as resulting_archive:
+                assert resulting_archive.testzip() is None
+                assert set(resulting_archive.namelist()) == {
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                }
+
+    @pytest.mark.parametrize("reuse_entries_enabled", [True, False])
+    def test_streaming_recreate_reuses_entries_from_existing_zip(
+        self, s3, ses, sqs_message, sample_metadata_1_UploadInfo, reuse_entries_enabled
+    ):
+        sqs_message.recreate_archive = True
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                archive.writestr("Old Path/stale.xlsm", b"stale")
+                for ui in sample_metadata_1_UploadInfo[:-1]:
+                    archive.writestr(
+                        make_previous_entry_info(
+                            ui, f"Old Path/{os.path.basename(ui.path_in_zip)}"
+                        ),
+                        make_previous_entry_data(ui),
+                    )
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, self.BUCKET_NAME, sqs_message.s3.zip_key)
+
+        with (
+            mock.patch(
+                "src.worker.RECREATE_REUSE_ENTRIES_ENABLED", reuse_entries_enabled
+            ),
+            mock.patch("src.worker.download_fileobj") as mock_download_fileobj,
+            tempfile.NamedTemporaryFile() as tmp,
+        ):
+            worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        assert mock_download_fileobj.called is False
+        with tempfile.NamedTemporaryFile() as tmp:
+            s3.download_fileobj(self.BUCKET_NAME, sqs_message.s3.zip_key, tmp)
+            with zipfile.ZipFile(tmp, "r") as resulting_archive:
+                assert resulting_archive.testzip() is None
+                assert resulting_archive.namelist() == [
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                ]
+                for ui in sample_metadata_1_UploadInfo[:-1]:
+                    reused = resulting_archive.read(
+                        ui.path_in_zip
+                    ) == make_previous_entry_data(ui)
+                    assert reused is reuse_entries_enabled
+
+    def test_streaming_recreate_leaves_existing_zip_when_no_entries(
+        self, s3, ses, sqs_message
+    ):
+        sqs_message.recreate_archive = True
+        s3.put_object(
+            Bucket=self.BUCKET_NAME, Key=sqs_message.s3.zip_key, Body=b"unchanged"
+        )
+        s3.put_object(
+            Bucket=self.BUCKET_NAME,
+            Key=sqs_message.s3.metadata_key,
+            Body=b"upload_id,path_in_zip\n",
+        )
+        with tempfile.NamedTemporaryFile() as tmp:
+            worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        response = s3.get_object(Bucket=self.BUCKET_NAME, Key=sqs_message.s3.zip_key)
+        assert response["Body"].read() == b"unchanged"
+        uploads = s3.list_multipart_uploads(Bucket=self.BUCKET_NAME)
+        assert uploads.get("Uploads", []) == []
+
+    def test_fails_before_downloading_zip_when_source_files_are_missing(
+        self, s3, ses, sqs_message, ses_sent_messages
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                archive.writestr("extra.xlsm", b"some placeholder content")
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, self.BUCKET_NAME, sqs_message.s3.zip_key)
+        s3.put_object(
+            Bucket=self.BUCKET_NAME,
+            Key=sqs_message.s3.metadata_key,
+            Body=b"upload_id,path_in_zip\nmissing,Quarterly 1/missing.xlsm\n",
+        )
+
+        with (
+            mock.patch(
+                "src.worker.head_remote_archive", wraps=worker.head_remote_archive
+            ) as mock_head_remote_archive,
+            mock.patch("src.worker.download_fileobj") as mock_download_fileobj,
+            mock.patch.object(worker, "build_zip") as mock_build_zip,
+        ):
+            metrics = JobMetrics()
+            with tempfile.NamedTemporaryFile() as tmp:
+                with pytest.raises(FileNotFoundError):
+                    worker.process_sqs_message_request(
+                        s3, ses, sqs_message, tmp, metrics=metrics
+                    )
+
+        assert mock_head_remote_archive.called is False
+        assert mock_download_fileobj.called is False
+        assert mock_build_zip.called is False
+        assert len(ses_sent_messages) == 0
+        assert metrics.failed_stage == "preflight"
+
+    def test_reads_csv_metadata_once(
+        self, s3, ses, sqs_message, sample_metadata_1_UploadInfo
+    ):
+        with tempfile.NamedTemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w") as archive:
+                archive.writestr(
+                    sample_metadata_1_UploadInfo[0].path_in_zip, b"placeholder"
+                )
+            tmp.seek(0)
+            s3.upload_fileobj(tmp, self.BUCKET_NAME, sqs_message.s3.zip_key)
+
+        with (
+            mock.patch(
+                "src.worker.load_source_uploads_from_csv",
+                wraps=worker.load_source_uploads_from_csv,
+            ) as mock_load_source_uploads_from_csv,
+            mock.patch(
+                "src.worker.remote_archive_is_complete",
+                wraps=worker.remote_archive_is_complete,
+            ) as mock_remote_archive_is_complete,
+            tempfile.NamedTemporaryFile() as tmp,
+        ):
+            worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        assert mock_remote_archive_is_complete.call_count == 1
+        assert mock_load_source_uploads_from_csv.call_count == 1
+        with tempfile.NamedTemporaryFile() as tmp:
+            s3.download_fileobj(self.BUCKET_NAME, sqs_message.s3.zip_key, tmp)
+            with zipfile.ZipFile(tmp, "r") as archive:
+                assert set(archive.namelist()) == {
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                }
+
+    def test_records_failure_while_planning(self, s3, ses, sqs_message):
+        expect_error = ValueError("oh no")
+        metrics = JobMetrics()
+        with mock.patch.object(worker, "head_remote_archive", side_effect=expect_error):
+            with tempfile.NamedTemporaryFile() as tmp:
+                with pytest.raises(ValueError) as raised:
+                    worker.process_sqs_message_request(
+                        s3,
+                        ses,
+                        sqs_message.model_copy(update={"recreate_archive": False}),
+                        tmp,
+                        metrics=metrics,
+                    )
+        assert raised.value is expect_error
+        assert metrics.failed_stage == "plan"
+
+    def test_builds_zip_from_source_files_in_s3(
+        self, s3, ses, sqs_message, sample_metadata_1_UploadInfo
+    ):
+        upload_source_files(
+            s3, self.BUCKET_NAME, "uploads/", sample_metadata_1_UploadInfo
+        )
+        with (
+            mock.patch("src.worker.SOURCE_BACKEND", "s3"),
+            mock.patch("src.worker.SOURCE_S3_BUCKET", self.BUCKET_NAME),
+            mock.patch("src.worker.SOURCE_S3_PREFIX", "uploads/"),
+            mock.patch("src.worker.DATA_DIR", "/does-not-exist"),
+        ):
+            with tempfile.NamedTemporaryFile() as tmp:
+                worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
+
+        with tempfile.NamedTemporaryFile() as tmp:
+            s3.download_fileobj(self.BUCKET_NAME, sqs_message.s3.zip_key, tmp)
+            with zipfile.ZipFile(tmp, "r") as resulting_archive:
+                assert resulting_archive.testzip() is None
+                assert set(resulting_archive.namelist()) == {
+                    ui.path_in_zip for ui in sample_metadata_1_UploadInfo
+                }
+
     def test_fails_when_csv_cannot_load(self, s3, ses, sqs_message):
         sqs_message.s3.metadata_key = "does-not-exist"
         with tempfile.NamedTemporaryFile() as tmp:
@@ -339,7 +1300,7 @@ class TestProcessSQSMessageRequest:
     def test_fails_without_sending_email_when_upload_fails(
         self, s3, ses, sqs_message, ses_sent_messages
     ):
-        with mock.patch.object(s3, "upload_fileobj") as mock_upload_fileobj:
+        with mock.patch("src.worker.upload_fileobj") as mock_upload_fileobj:
             upload_error = ValueError("you shall not pass")
             mock_upload_fileobj.side_effect = upload_error
             with tempfile.NamedTemporaryFile() as tmp:
@@ -348,12 +1309,66 @@ class TestProcessSQSMessageRequest:
             assert raised.value == upload_error
             assert len(ses_sent_messages) == 0
 
+    def test_notifies_each_of_user_emails(
+        self, s3, ses, sqs_message, ses_sent_messages
+    ):
+        user_emails = ["a@example.gov", "b@example.gov"]
+        with tempfile.NamedTemporaryFile() as tmp:
+            worker.process_sqs_message_request(
+                s3, ses, sqs_message, tmp, user_emails=user_emails
+            )
+        assert [m.destinations["ToAddresses"] for m in ses_sent_messages] == [
+            ["a@example.gov"],
+            ["b@example.gov"],
+        ]
+
     def test_fails_when_error_notifying_user(self, s3, ses, sqs_message):
         sqs_message.user_email = "invalid"
         with tempfile.NamedTemporaryFile() as tmp:
             with pytest.raises(ses.exceptions.ClientError):
                 worker.process_sqs_message_request(s3, ses, sqs_message, tmp)
 
+    def test_records_stage_metrics(self, s3, ses, sqs_message):
+        metrics = JobMetrics()
+        with (
+            tempfile.NamedTemporaryFile() as tmp,
+            mock.patch("src.worker.get_statsd") as mock_get_statsd,
+        ):
+            worker.process_sqs_message_request(
+                s3, ses, sqs_message, tmp, metrics=metrics
+            )
+        summary = metrics.summary()
+        mock_get_statsd.return_value.distribution.assert_called_once_with(
+            "archive.bytes",
+            summary["upload_bytes"],
+            tags=[f"organization_id:{sqs_message.organization_id}"],
+        )
+        assert summary["csv_stream_uploads"] > 0
+        assert summary["entry_writes_entries_added"] == summary["csv_stream_uploads"]
+        assert summary["upload_bytes"] > summary["entry_writes_bytes"]
+        assert summary["notify_notifications"] == 1
+        assert {"plan_seconds", "diff_seconds", "notify_seconds"} <= set(summary)
+
+    def test_submits_notifications_to_notifier(
+        self, s3, ses, sqs_message, ses_sent_messages
+    ):
+        notifier = mock.Mock(spec=BackgroundNotifier)
+        with tempfile.NamedTemporaryFile() as tmp:
+            notifications = worker.process_sqs_message_request(
+                s3,
+                ses,
+                sqs_message,
+                tmp,
+                user_emails=["a@example.gov", "b@example.gov"],
+                notifier=notifier,
+            )
+        assert notifications == [notifier.submit.return_value] * 2
+        assert [call.args[2] for call in notifier.submit.call_args_list] == [
+            "a@example.gov",
+            "b@example.gov",
+        ]
+        assert len(ses_sent_messages) == 0
+
 
 class TestHandleWork:
     @pytest.fixture(scope="function", autouse=False)
@@ -367,11 +1382,17 @@ class TestHandleWork:
             worker.handle_work(sqs, s3, ses)
 
     def test_returns_early_when_queue_is_empty(self, s3, sqs, ses, create_sqs_queue):
-        with mock.patch(
-            "src.worker.process_sqs_message_request"
-        ) as mock_process_sqs_message_request:
+        with (
+            mock.patch(
+                "src.worker.process_sqs_message_request"
+            ) as mock_process_sqs_message_request,
+            mock.patch("src.worker.get_statsd") as mock_get_statsd,
+        ):
             assert worker.handle_work(sqs, s3, ses) is None
             assert mock_process_sqs_message_request.call_count == 0
+        mock_get_statsd.return_value.increment.assert_called_once_with(
+            "sqs.empty_polls"
+        )
 
     def test_resturns_early_when_message_is_not_valid_json(
         self, s3, sqs, ses, create_sqs_queue
@@ -472,8 +1493,379 @@ class TestHandleWork:
                 assert mock_process_sqs_message_request.called
                 assert mock_delete_message.called
 
+    @pytest.mark.parametrize("notification_fails", (False, True))
+    def test_deletes_sqs_message_once_notifications_are_sent(
+        self, s3, sqs, ses, create_sqs_queue, notification_fails
+    ):
+        enqueue_request(sqs, create_sqs_queue["QueueUrl"])
+        notification: concurrent.futures.Future = concurrent.futures.Future()
+        with (
+            mock.patch(
+                "src.worker.process_sqs_message_request", return_value=[notification]
+            ),
+            mock.patch("src.worker.VisibilityHeartbeat") as mock_heartbeat,
+            mock.patch.object(sqs, "delete_message") as mock_delete_message,
+        ):
+            worker.handle_work(sqs, s3, ses, notifier=mock.Mock(BackgroundNotifier))
+            assert not mock_delete_message.called
+            assert not mock_heartbeat.return_value.__exit__.called
+
+            if notification_fails:
+                notification.set_exception(ValueError("could not send"))
+            else:
+                notification.set_result("message-id")
+        assert mock_heartbeat.return_value.__exit__.called
+        assert mock_delete_message.called is not notification_fails
+
+    def test_logs_stage_metrics_summary(self, s3, sqs, ses, create_sqs_queue):
+        enqueue_request(sqs, create_sqs_queue["QueueUrl"])
+
+        def process(*args, metrics, **kwargs):
+            metrics.get("download").add(seconds=2, bytes=100)
+            raise ValueError("failed after download")
+
+        with (
+            mock.patch("src.worker.process_sqs_message_request", side_effect=process),
+            mock.patch(
+                "src.worker.emit_job_metrics", wraps=worker.emit_job_metrics
+            ) as mock_emit_job_metrics,
+            structlog.testing.capture_logs() as logs,
+            pytest.raises(ValueError),
+        ):
+            worker.handle_work(sqs, s3, ses)
+        mock_emit_job_metrics.assert_called_once_with(
+            mock.ANY, 1234, messages_count=1, seconds=mock.ANY, succeeded=False
+        )
+        summaries = [log for log in logs if log["event"] == "export job stage metrics"]
+        assert len(summaries) == 1
+        assert summaries[0]["organization_id"] == 1234
+        assert summaries[0]["succeeded"] is False
+        assert summaries[0]["download_bytes_per_second"] == 50
+
+    @pytest.mark.parametrize("interval_seconds", (0, 30))
+    def test_extends_visibility_while_processing(
+        self, s3, sqs, ses, create_sqs_queue, interval_seconds
+    ):
+        enqueue_request(sqs, create_sqs_queue["QueueUrl"])
+        with (
+            mock.patch(
+                "src.worker.VISIBILITY_HEARTBEAT_INTERVAL_SECONDS", interval_seconds
+            ),
+            mock.patch("src.worker.VisibilityHeartbeat") as mock_heartbeat,
+            mock.patch("src.worker.process_sqs_message_request"),
+        ):
+            worker.handle_work(sqs, s3, ses)
+
+        assert mock_heartbeat.called is (interval_seconds > 0)
+        if interval_seconds > 0:
+            assert mock_heartbeat.return_value.__enter__.called
+            assert mock_heartbeat.return_value.__exit__.called
+
+    def test_processes_message_batch_concurrently(self, s3, sqs, ses, create_sqs_queue):
+        for organization_id in range(5):
+            enqueue_request(
+                sqs, create_sqs_queue["QueueUrl"], organization_id=organization_id
+            )
+
+        receipt_handles_seen = []
+
+        def process(s3, ses, message_data, local_file, **kwargs):
+            log_context = structlog.contextvars.get_contextvars()
+            receipt_handles_seen.append(log_context["sqs_message_receipt_handle"])
+            if message_data.organization_id == 3:
+                raise ValueError("this one fails")
+
+        with (
+            mock.patch("src.worker.process_sqs_message_request", side_effect=process),
+            mock.patch.object(sqs, "delete_message") as mock_delete_message,
+        ):
+            with WorkerPool(5) as pool:
+                worker.handle_work(sqs, s3, ses, pool=pool)
+            with pytest.raises(ValueError):
+                pool.reserve(1)
+
+        assert len(set(receipt_handles_seen)) == 5
+        assert mock_delete_message.call_count == 4
+        assert (
+            "sqs_message_receipt_handle" not in structlog.contextvars.get_contextvars()
+        )
+
+    def test_receives_only_as_many_messages_as_free_workers(
+        self, s3, sqs, ses, create_sqs_queue
+    ):
+        for organization_id in range(3):
+            enqueue_request(
+                sqs, create_sqs_queue["QueueUrl"], organization_id=organization_id
+            )
+        finish = threading.Event()
+
+        def process(s3, ses, message_data, local_file, **kwargs):
+            finish.wait(timeout=5)
+
+        with (
+            mock.patch("src.worker.process_sqs_message_request", side_effect=process),
+            mock.patch.object(
+                sqs, "receive_message", wraps=sqs.receive_message
+            ) as mock_receive_message,
+            WorkerPool(3) as pool,
+        ):
+            assert pool.reserve(1) == 1
+            worker.handle_work(sqs, s3, ses, pool=pool)
+            assert mock_receive_message.call_args.kwargs["MaxNumberOfMessages"] == 2
+            # Messages that are still being handled do not block receiving more
+            pool.release(1)
+            worker.handle_work(sqs, s3, ses, pool=pool)
+            assert mock_receive_message.call_args.kwargs["MaxNumberOfMessages"] == 1
+            finish.set()
+
+    def test_coalesces_batch_of_messages_without_pool(
+        self, s3, sqs, ses, create_sqs_queue, ses_sent_messages
+    ):
+        bucket = "test-apra-audit-reports"
+        s3.create_bucket(
+            Bucket=bucket,
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]},
+        )
+        s3.put_object(
+            Bucket=bucket, Key="metadata.csv", Body=b"upload_id,path_in_zip\n"
+        )
+        for _ in range(3):
+            enqueue_request(
+                sqs,
+                create_sqs_queue["QueueUrl"],
+                s3=worker.S3Schema(
+                    bucket=bucket, zip_key="archive.zip", metadata_key="metadata.csv"
+                ),
+            )
+
+        with (
+            mock.patch("src.worker.COALESCE_MESSAGES_ENABLED", True),
+            mock.patch(
+                "src.worker.process_sqs_message_request",
+                wraps=worker.process_sqs_message_request,
+            ) as mock_process,
+        ):
+            worker.handle_work(sqs, s3, ses)
+
+        assert mock_process.call_count == 1
+        assert len(ses_sent_messages) == 1
+        remaining = sqs.get_queue_attributes(
+            QueueUrl=create_sqs_queue["QueueUrl"],
+            AttributeNames=["ApproximateNumberOfMessages"],
+        )
+        assert remaining["Attributes"]["ApproximateNumberOfMessages"] == "0"
+
+    def test_releases_messages_that_cannot_be_handled_yet(
+        self, s3, sqs, ses, create_sqs_queue
+    ):
+        for organization_id in (1, 2, 3):
+            enqueue_request(
+                sqs, create_sqs_queue["QueueUrl"], organization_id=organization_id
+            )
+        with (
+            mock.patch("src.worker.COALESCE_MESSAGES_ENABLED", True),
+            mock.patch("src.worker.process_sqs_message_request") as mock_process,
+            mock.patch.object(
+                sqs,
+                "change_message_visibility_batch",
+                wraps=sqs.change_message_visibility_batch,
+            ) as mock_change_visibility,
+        ):
+            worker.handle_work(sqs, s3, ses)
+
+        assert mock_process.call_count == 1
+        assert mock_process.call_args.args[2].organization_id == 1
+        entries = mock_change_visibility.call_args.kwargs["Entries"]
+        assert [entry["VisibilityTimeout"] for entry in entries] == [0, 0]
+        remaining = sqs.get_queue_attributes(
+            QueueUrl=create_sqs_queue["QueueUrl"],
+            AttributeNames=["ApproximateNumberOfMessages"],
+        )
+        assert remaining["Attributes"]["ApproximateNumberOfMessages"] == "2"
+
+    def test_stops_waiting_for_free_worker_on_shutdown(self, s3, sqs, ses):
+        shutdown_handler = mock.Mock(spec=ShutdownHandler)
+        shutdown_handler.is_shutdown_requested.return_value = True
+        with (
+            mock.patch.object(sqs, "receive_message") as mock_receive_message,
+            WorkerPool(1) as pool,
+        ):
+            assert pool.reserve(1) == 1
+            worker.handle_work(
+                sqs, s3, ses, pool=pool, shutdown_handler=shutdown_handler
+            )
+            pool.release(1)
+        assert mock_receive_message.call_count == 0
+
+    def test_coalesces_messages_requesting_same_export(
+        self, s3, sqs, ses, create_sqs_queue
+    ):
+        def send(organization_id, user_email, recreate_archive=False):
+            enqueue_request(
+                sqs,
+                create_sqs_queue["QueueUrl"],
+                s3=worker.S3Schema(
+                    bucket="does-not-matter",
+                    zip_key=f"org_{organization_id}/archive.zip",
+                    metadata_key=f"org_{organization_id}/metadata.csv",
+                ),
+                organization_id=organization_id,
+                user_email=user_email,
+                recreate_archive=recreate_archive,
+            )
+
+        send(1, "a@example.gov")
+        send(1, "b@example.gov", recreate_archive=True)
+        send(1, "a@example.gov")
+        send(2, "c@example.gov")
+
+        with (
+            mock.patch("src.worker.COALESCE_MESSAGES_ENABLED", True),
+            mock.patch("src.worker.process_sqs_message_request") as mock_process,
+            mock.patch.object(
+                sqs, "delete_message_batch", wraps=sqs.delete_message_batch
+            ) as mock_delete_message_batch,
+            mock.patch.object(
+                sqs, "delete_message", wraps=sqs.delete_message
+            ) as mock_delete_message,
+            WorkerPool(4) as pool,
+        ):
+            worker.handle_work(sqs, s3, ses, pool=pool)
+
+        assert mock_process.call_count == 2
+        calls = {c.args[2].organization_id: c for c in mock_process.call_args_list}
+        assert calls[1].args[2].recreate_archive is True
+        assert calls[1].kwargs["user_emails"] == ["a@example.gov", "b@example.gov"]
+        assert calls[2].args[2].recreate_archive is False
+        assert calls[2].kwargs["user_emails"] == ["c@example.gov"]
+        assert mock_delete_message_batch.call_count == 1
+        assert len(mock_delete_message_batch.call_args.kwargs["Entries"]) == 3
+        assert mock_delete_message.call_count == 1
+        remaining = sqs.get_queue_attributes(
+            QueueUrl=create_sqs_queue["QueueUrl"],
+            AttributeNames=["ApproximateNumberOfMessages"],
+        )
+        assert remaining["Attributes"]["ApproximateNumberOfMessages"] == "0"
+
+    def test_fails_when_coalesced_messages_cannot_be_deleted(
+        self, s3, sqs, ses, create_sqs_queue
+    ):
+        for _ in range(2):
+            enqueue_request(sqs, create_sqs_queue["QueueUrl"])
+        with (
+            mock.patch("src.worker.COALESCE_MESSAGES_ENABLED", True),
+            mock.patch("src.worker.process_sqs_message_request"),
+            mock.patch.object(
+                sqs,
+                "delete_message_batch",
+                return_value={
+                    "Successful": [{"Id": "0"}],
+                    "Failed": [{"Id": "1", "Code": "Oops", "SenderFault": False}],
+                },
+            ),
+        ):
+            with WorkerPool(2) as pool:
+                worker.handle_work(sqs, s3, ses, pool=pool)
+            with pytest.raises(RuntimeError):
+                pool.reserve(1)
+
+
+class TestEmitJobMetrics:
+    @pytest.mark.parametrize("failed_stage", (None, "upload"))
+    def test_emits_failures_by_stage(self, failed_stage):
+        metrics = JobMetrics()
+        metrics.get("upload").add(seconds=2)
+        metrics.failed_stage = failed_stage
+        with mock.patch("src.worker.get_statsd") as mock_get_statsd:
+            worker.emit_job_metrics(
+                metrics, 1234, messages_count=2, seconds=3, succeeded=False
+            )
+        statsd = mock_get_statsd.return_value
+        statsd.increment.assert_any_call(
+            "messages.processed",
+            2,
+            tags=["organization_id:1234", "status:failure"],
+        )
+        statsd.increment.assert_any_call(
+            "job.failures",
+            tags=["organization_id:1234", f"stage:{failed_stage or 'other'}"],
+        )
+        statsd.distribution.assert_any_call(
+            "job.duration", 3, tags=["organization_id:1234", "status:failure"]
+        )
+        statsd.distribution.assert_any_call(
+            "stage.duration", 2, tags=["organization_id:1234", "stage:upload"]
+        )
+
+    def test_emits_success(self):
+        with mock.patch("src.worker.get_statsd") as mock_get_statsd:
+            worker.emit_job_metrics(
+                JobMetrics(), 1, messages_count=1, seconds=1, succeeded=True
+            )
+        statsd = mock_get_statsd.return_value
+        assert [call.args[0] for call in statsd.increment.call_args_list] == [
+            "messages.processed"
+        ]
+
+
+class TestCoalesceMessages:
+    @staticmethod
+    def make_message(receipt_handle, organization_id, **overrides):
+        body = {
+            "s3": {
+                "bucket": "bucket",
+                "zip_key": f"org_{organization_id}/archive.zip",
+                "metadata_key": f"org_{organization_id}/metadata.csv",
+            },
+            "organization_id": organization_id,
+            "user_email": "fake@example.gov",
+            "recreate_archive": False,
+        }
+        body.update(overrides)
+        return {"ReceiptHandle": receipt_handle, "Body": json.dumps(body)}
+
+    def test_groups_by_organization_and_s3_keys(self):
+        messages = [
+            self.make_message("a", 1),
+            self.make_message("b", 2),
+            self.make_message("c", 1, recreate_archive=True),
+            self.make_message(
+                "d",
+                1,
+                s3={
+                    "bucket": "other-bucket",
+                    "zip_key": "org_1/archive.zip",
+                    "metadata_key": "org_1/metadata.csv",
+                },
+            ),
+        ]
+        groups = worker.coalesce_messages(messages)
+        assert [[m["ReceiptHandle"] for m in g] for g in groups] == [
+            ["a", "c"],
+            ["b"],
+            ["d"],
+        ]
+
+    def test_does_not_group_invalid_messages(self):
+        messages = [
+            {"ReceiptHandle": "a", "Body": "[in{validJSON!"},
+            {"ReceiptHandle": "b", "Body": "[in{validJSON!"},
+            {"ReceiptHandle": "c", "Body": json.dumps({"unexpected": "schema"})},
+        ]
+        groups = worker.coalesce_messages(messages)
+        assert [[m["ReceiptHandle"] for m in g] for g in groups] == [
+            ["a"],
+            ["b"],
+            ["c"],
+        ]
+
 
 class TestMain:
+    @pytest.fixture(autouse=True)
+    def reset_send_rate_limiter(self):
+        with mock.patch("src.lib.email.send_rate_limiter", None):
+            yield
+
     @mock.patch("src.worker.handle_work")
     def test_runs_until_shutdown_requested(self, mock_handle_work, mocked_aws):
         mock_ShutdownHandler = mock.Mock(spec=ShutdownHandler)
@@ -487,6 +1879,74 @@ class TestMain:
             worker.main()
         assert mock_handle_work.call_count == 3
 
+    @mock.patch("src.worker.handle_work")
+    def test_runs_in_consumer_root_span(self, mock_handle_work, mocked_aws):
+        root_spans = []
+        mock_handle_work.side_effect = lambda *args, **kwargs: root_spans.append(
+            worker.tracer.current_root_span()
+        )
+        mock_ShutdownHandler = mock.Mock(spec=ShutdownHandler)
+        mock_ShutdownHandler.return_value.is_shutdown_requested.side_effect = [
+            False,
+            True,
+        ]
+        with mock.patch("src.worker.ShutdownHandler", mock_ShutdownHandler):
+            worker.main()
+        assert [(span.name, span.span_type) for span in root_spans] == [
+            ("arpa_exporter.worker", "consumer")
+        ]
+
+    @pytest.mark.parametrize(("concurrency", "expect_pool"), ((1, False), (4, True)))
+    @mock.patch("src.worker.handle_work")
+    def test_uses_pool_when_concurrent(
+        self, mock_handle_work, mocked_aws, concurrency, expect_pool
+    ):
+        mock_ShutdownHandler = mock.Mock(spec=ShutdownHandler)
+        mock_ShutdownHandler.return_value.is_shutdown_requested.side_effect = [
+            False,
+            True,
+        ]
+        with (
+            mock.patch("src.worker.ShutdownHandler", mock_ShutdownHandler),
+            mock.patch("src.worker.WORKER_CONCURRENCY", concurrency),
+        ):
+            worker.main()
+        pool = mock_handle_work.call_args.kwargs["pool"]
+        assert (pool is not None) is expect_pool
+        if expect_pool:
+            assert pool.workers == concurrency
+
+    @mock.patch("src.worker.handle_work")
+    def test_sizes_client_connection_pools_for_concurrency(
+        self, mock_handle_work, mocked_aws
+    ):
+        mock_ShutdownHandler = mock.Mock(spec=ShutdownHandler)
+        mock_ShutdownHandler.return_value.is_shutdown_requested.side_effect = [
+            False,
+            True,
+        ]
+        with (
+            mock.patch("src.worker.ShutdownHandler", mock_ShutdownHandler),
+            mock.patch("src.worker.WORKER_CONCURRENCY", 8),
+            mock.patch("src.worker.S3_TRANSFER_SETTINGS", TransferSettings()),
+        ):
+            worker.main()
+        sqs, s3, ses = mock_handle_work.call_args.args
+        assert s3.meta.config.max_pool_connections == 8 * 10
+        assert sqs.meta.config.max_pool_connections == 10
+        assert ses.meta.config.max_pool_connections == 10
+        assert sqs.meta.config.read_timeout > worker.TASK_QUEUE_RECEIVE_TIMEOUT
+
+    @pytest.mark.parametrize("enabled", (False, True))
+    def test_get_notifier(self, enabled):
+        with mock.patch("src.worker.ASYNC_NOTIFICATIONS_ENABLED", enabled):
+            with worker.get_notifier() as notifier:
+                assert isinstance(notifier, BackgroundNotifier) is enabled
+
+    def test_uses_configured_max_pool_connections(self):
+        with mock.patch("src.worker.AWS_MAX_POOL_CONNECTIONS", 3):
+            assert worker.get_client_settings("s3").max_pool_connections == 3
+
 
 class TestBuildDownloadURL:
     @pytest.mark.parametrize(
@@ -286,6 +286,7 @@ data "aws_iam_policy_document" "arpa_audit_report_rw_reports_bucket" {
   statement {
     sid = "ReadWriteBucketObjects"
     actions = [
+      "s3:AbortMultipartUpload",
       "s3:GetObject",
       "s3:HeadObject",
       "s3:PutObject",
@@ -502,6 +503,7 @@ module "arpa_exporter" {
     NOTIFICATIONS_EMAIL           = "grants-notifications@${var.website_domain_name}"
     SES_CONFIGURATION_SET_DEFAULT = aws_sesv2_configuration_set.default.configuration_set_name
     WEBSITE_DOMAIN                = "https://${var.website_domain_name}"
+    ZIP_COMPRESS_WORKERS          = "1" # Match the task's vCPUs
   })
   datadog_environment_variables = var.default_datadog_environment_variables
   consumer_task_efs_volume_mounts = [{
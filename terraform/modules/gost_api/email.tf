@@ -43,7 +43,17 @@ module "send_emails_policy" {
               values   = [var.notifications_email_address]
             }
           ]
-        }
+        },
+        {
+          # Used to rate-limit sending to the account's maximum send rate.
+          # GetSendQuota does not support resource-level permissions.
+          sid    = "ReadSendQuota"
+          effect = "Allow"
+          actions = [
+            "SES:GetSendQuota",
+          ]
+          resources = ["*"]
+        },
       ]
     }
   ]
@@ -53,6 +53,7 @@ module "consume_sqs_messages_policy" {
         sid    = "AllowConsumeMessages"
         effect = "Allow"
         actions = [
+          "sqs:ChangeMessageVisibility",
           "sqs:DeleteMessage",
           "sqs:ReceiveMessage",
         ]